@@ -0,0 +1,331 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+音訊擷取快取
+每個來源檔案只執行一次 ffmpeg，同時輸出轉錄用的 16kHz 單聲道 float32 PCM、
+字幕編輯器播放用的音軌和燒錄字幕時直接複製的 AAC 音軌，
+以來源內容雜湊為鍵保存在磁碟上，超過大小上限時淘汰最久未使用的檔案
+"""
+
+import os
+import json
+import hashlib
+import subprocess
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Tuple, Optional, Callable, Iterable
+
+import numpy as np
+
+# Whisper 使用的取樣率
+SAMPLE_RATE = 16000
+
+# 預設快取位置（與 Whisper 模型的 ~/.cache/whisper 並列）
+DEFAULT_CACHE_DIR = os.path.expanduser("~/.cache/aisub/audio")
+
+# 預設快取大小上限（MB）
+DEFAULT_MAX_SIZE_MB = 8192
+
+# 各音軌的檔名和 ffmpeg 輸出參數
+#   asr: 轉錄用 16kHz 單聲道 float32 原始 PCM
+#   playback: 字幕編輯器 (pygame) 播放用，OGG Vorbis
+#   burn: 燒錄字幕時以 -acodec copy 併入 MP4 的 AAC 音軌
+TRACKS = {
+    "asr": {
+        "suffix": ".f32",
+        "args": ["-vn", "-ac", "1", "-ar", str(SAMPLE_RATE), "-f", "f32le", "-acodec", "pcm_f32le"],
+    },
+    "playback": {
+        "suffix": ".playback.ogg",
+        "args": ["-vn", "-ac", "2", "-ar", "44100", "-f", "ogg", "-acodec", "libvorbis", "-q:a", "5"],
+    },
+    "burn": {
+        "suffix": ".burn.m4a",
+        "args": ["-vn", "-ac", "2", "-f", "mp4", "-acodec", "aac", "-b:a", "192k"],
+    },
+}
+
+# ffmpeg 不含 libvorbis 時播放音軌改用 WAV（pygame 都能播放）
+PLAYBACK_FALLBACK = {
+    "suffix": ".playback.wav",
+    "args": ["-vn", "-ac", "2", "-ar", "44100", "-f", "wav", "-acodec", "pcm_s16le"],
+}
+
+
+class AudioCache:
+    """來源音訊擷取結果的磁碟快取"""
+
+    def __init__(self,
+                 cache_dir: Optional[str] = None,
+                 max_open_buffers: int = 4,
+                 max_size_mb: float = DEFAULT_MAX_SIZE_MB):
+        self.cache_dir = cache_dir or DEFAULT_CACHE_DIR
+        self.max_open_buffers = max_open_buffers
+        self.max_size_mb = max_size_mb
+        # (路徑, 大小, 修改時間) -> 內容雜湊，避免同一個檔案重複計算雜湊
+        self._fingerprints: Dict[Tuple[str, int, int], str] = {}
+        self._index_loaded = False
+        # 內容雜湊 -> 已映射的 PCM 陣列，讓同一個工作的所有轉錄共用同一個緩衝區
+        self._buffers: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._lock = threading.RLock()
+
+    def index_path(self) -> str:
+        """跨程序保存的 (路徑, 大小, 修改時間) -> 雜湊索引"""
+        return os.path.join(self.cache_dir, "index.json")
+
+    def _load_index(self):
+        if self._index_loaded:
+            return
+        self._index_loaded = True
+        try:
+            with open(self.index_path(), 'r', encoding='utf-8') as f:
+                entries = json.load(f)
+        except (OSError, ValueError):
+            return
+        for entry in entries:
+            try:
+                self._fingerprints[(entry["path"], entry["size"], entry["mtime_ns"])] = entry["hash"]
+            except (KeyError, TypeError):
+                continue
+
+    def _save_index(self):
+        # 只保留最近的紀錄，避免索引無限增長
+        items = list(self._fingerprints.items())[-2000:]
+        entries = [{"path": path, "size": size, "mtime_ns": mtime_ns, "hash": file_hash}
+                   for (path, size, mtime_ns), file_hash in items]
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            temp_path = f"{self.index_path()}.{os.getpid()}.tmp"
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump(entries, f)
+            os.replace(temp_path, self.index_path())
+        except OSError:
+            pass
+
+    def file_hash(self, file_path: str) -> str:
+        """計算檔案內容雜湊（檔案的大小和修改時間未變時直接使用上次的結果）"""
+        stat = os.stat(file_path)
+        key = (os.path.abspath(file_path), stat.st_size, stat.st_mtime_ns)
+        with self._lock:
+            self._load_index()
+            cached = self._fingerprints.get(key)
+        if cached:
+            return cached
+
+        digest = hashlib.blake2b(digest_size=20)
+        with open(file_path, 'rb') as f:
+            for block in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(block)
+        file_hash = digest.hexdigest()
+
+        with self._lock:
+            self._fingerprints[key] = file_hash
+            self._save_index()
+        return file_hash
+
+    def track_path(self, file_hash: str, track: str) -> str:
+        """取得音軌快取檔案路徑（播放音軌可能是 OGG 或備用的 WAV）"""
+        path = os.path.join(self.cache_dir, f"{file_hash}{TRACKS[track]['suffix']}")
+        if track == "playback" and not os.path.exists(path):
+            fallback = os.path.join(self.cache_dir, f"{file_hash}{PLAYBACK_FALLBACK['suffix']}")
+            if os.path.exists(fallback):
+                return fallback
+        return path
+
+    def pcm_path(self, file_hash: str) -> str:
+        """取得快取 PCM 檔案路徑"""
+        return self.track_path(file_hash, "asr")
+
+    def _run_ffmpeg(self, input_file: str, outputs: List[Tuple[Dict, str]]):
+        """執行一次 ffmpeg，同時寫出多個音軌"""
+        cmd = ["ffmpeg", "-nostdin", "-threads", "0", "-y", "-i", input_file]
+        for spec, path in outputs:
+            cmd.extend(spec["args"])
+            cmd.append(path)
+        result = subprocess.run(cmd, capture_output=True)
+        if result.returncode != 0:
+            error = result.stderr.decode('utf-8', errors='replace').strip().splitlines()
+            raise RuntimeError(f"ffmpeg 解碼失敗: {error[-1] if error else result.returncode}")
+
+    def decode_tracks(self, input_file: str, file_hash: str, tracks: Iterable[str]):
+        """以單次 ffmpeg 產生指定的音軌（先寫入暫存檔再替換）"""
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tracks = list(tracks)
+
+        def plan(playback_spec):
+            outputs = []
+            for track in tracks:
+                spec = playback_spec if track == "playback" else TRACKS[track]
+                final_path = os.path.join(self.cache_dir, f"{file_hash}{spec['suffix']}")
+                outputs.append((spec, final_path, f"{final_path}.{os.getpid()}.tmp"))
+            return outputs
+
+        attempts = [plan(TRACKS["playback"])]
+        if "playback" in tracks:
+            attempts.append(plan(PLAYBACK_FALLBACK))
+
+        for attempt, outputs in enumerate(attempts):
+            try:
+                self._run_ffmpeg(input_file, [(spec, temp_path) for spec, _, temp_path in outputs])
+                for _, final_path, temp_path in outputs:
+                    os.replace(temp_path, final_path)
+                break
+            except RuntimeError:
+                if attempt == len(attempts) - 1:
+                    raise
+            finally:
+                for _, _, temp_path in outputs:
+                    if os.path.exists(temp_path):
+                        os.remove(temp_path)
+
+        self.evict(keep=file_hash)
+
+    def extract(self,
+                input_file: str,
+                tracks: Iterable[str] = ("asr", "playback"),
+                log: Optional[Callable[[str], None]] = None) -> Dict[str, str]:
+        """
+        取得來源檔案的音軌，缺少的音軌以單次 ffmpeg 一起產生
+
+        Args:
+            input_file: 影片或音訊檔案路徑
+            tracks: 需要的音軌（asr / playback / burn）
+            log: 日誌函數
+
+        Returns:
+            音軌名稱 -> 快取檔案路徑
+        """
+        log = log or print
+        file_hash = self.file_hash(input_file)
+
+        with self._lock:
+            missing = [track for track in tracks if not os.path.exists(self.track_path(file_hash, track))]
+            if missing:
+                log(f"🎧 擷取音訊 ({', '.join(missing)})，每個檔案只需一次...")
+                self.decode_tracks(input_file, file_hash, missing)
+
+            paths = {}
+            for track in tracks:
+                paths[track] = self.track_path(file_hash, track)
+                # 以修改時間記錄最近使用時間，作為淘汰依據
+                try:
+                    os.utime(paths[track])
+                except OSError:
+                    pass
+            return paths
+
+    def duration(self, input_file: str) -> float:
+        """由 ASR 音軌大小計算音訊長度（秒）"""
+        pcm_path = self.extract(input_file, ("asr",), log=lambda message: None)["asr"]
+        return os.path.getsize(pcm_path) / 4 / SAMPLE_RATE
+
+    def load(self,
+             input_file: str,
+             log: Optional[Callable[[str], None]] = None,
+             extra_tracks: Iterable[str] = ()) -> np.ndarray:
+        """
+        取得檔案的 16kHz 單聲道 float32 PCM
+
+        Args:
+            input_file: 影片或音訊檔案路徑
+            log: 日誌函數
+            extra_tracks: 需要解碼時一併產生的其他音軌（例如之後編輯器要用的 playback）
+
+        Returns:
+            記憶體映射的 PCM 陣列（寫入時複製，不會修改快取檔案）
+        """
+        log = log or print
+        file_hash = self.file_hash(input_file)
+
+        with self._lock:
+            buffer = self._buffers.get(file_hash)
+            if buffer is not None:
+                self._buffers.move_to_end(file_hash)
+                return buffer
+
+            if os.path.exists(self.pcm_path(file_hash)):
+                log(f"♻️ 使用已解碼的音訊快取: {os.path.basename(self.pcm_path(file_hash))}")
+            pcm_path = self.extract(input_file, ["asr"] + list(extra_tracks), log=log)["asr"]
+
+            if os.path.getsize(pcm_path) == 0:
+                buffer = np.zeros(0, dtype=np.float32)
+            else:
+                buffer = np.memmap(pcm_path, dtype=np.float32, mode="c")
+
+            self._buffers[file_hash] = buffer
+            while len(self._buffers) > self.max_open_buffers:
+                self._buffers.popitem(last=False)
+
+            log(f"📊 音訊長度: {len(buffer) / SAMPLE_RATE:.1f} 秒")
+            return buffer
+
+    def entries(self) -> List[Dict]:
+        """列出快取的音軌檔案（依最近使用時間由舊到新）"""
+        if not os.path.isdir(self.cache_dir):
+            return []
+        suffixes = tuple(spec["suffix"] for spec in TRACKS.values()) + (PLAYBACK_FALLBACK["suffix"],)
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith(suffixes):
+                continue
+            path = os.path.join(self.cache_dir, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append({"hash": name.split(".", 1)[0], "path": path,
+                            "size": stat.st_size, "last_used": stat.st_mtime})
+        entries.sort(key=lambda entry: entry["last_used"])
+        return entries
+
+    def evict(self, max_size_mb: Optional[float] = None, keep: Optional[str] = None) -> int:
+        """
+        刪除最久未使用的音軌直到總大小低於上限
+
+        Args:
+            max_size_mb: 大小上限（預設使用 self.max_size_mb）
+            keep: 不可刪除的來源雜湊（例如剛擷取完成的檔案）
+
+        Returns:
+            刪除的檔案數
+        """
+        limit = (self.max_size_mb if max_size_mb is None else max_size_mb) * 1024 * 1024
+        with self._lock:
+            entries = self.entries()
+            total = sum(entry["size"] for entry in entries)
+            removed = 0
+            for entry in entries:
+                if total <= limit:
+                    break
+                # 目前仍被映射使用中的 PCM 不刪除
+                if entry["hash"] == keep or entry["hash"] in self._buffers:
+                    continue
+                try:
+                    os.remove(entry["path"])
+                except OSError:
+                    continue
+                total -= entry["size"]
+                removed += 1
+            return removed
+
+
+# 全域實例
+audio_cache = AudioCache()
+
+def load_audio_pcm(input_file: str,
+                   log: Optional[Callable[[str], None]] = None,
+                   extra_tracks: Iterable[str] = ()) -> np.ndarray:
+    """
+    取得共用 PCM 緩衝區的便捷函數
+    """
+    return audio_cache.load(input_file, log=log, extra_tracks=extra_tracks)
+
+
+def extract_audio_tracks(input_file: str,
+                         tracks: Iterable[str] = ("asr", "playback"),
+                         log: Optional[Callable[[str], None]] = None) -> Dict[str, str]:
+    """
+    取得來源檔案音軌路徑的便捷函數
+    """
+    return audio_cache.extract(input_file, tracks=tracks, log=log)
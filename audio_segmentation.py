@@ -0,0 +1,338 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+音訊切割工具
+以短時能量尋找安靜的位置，將長音訊切成可以獨立轉錄的片段
+"""
+
+import difflib
+from typing import Dict, List, Any, Optional
+
+import numpy as np
+
+# Whisper 使用的取樣率
+SAMPLE_RATE = 16000
+
+
+def frame_energy_db(audio: np.ndarray,
+                    sample_rate: int = SAMPLE_RATE,
+                    frame_seconds: float = 0.02) -> np.ndarray:
+    """
+    計算每個音框的 RMS 能量（dBFS）
+
+    Args:
+        audio: 16kHz 單聲道 PCM
+        sample_rate: 取樣率
+        frame_seconds: 音框長度（秒）
+
+    Returns:
+        每個音框的能量陣列
+    """
+    frame_size = max(1, int(sample_rate * frame_seconds))
+    n_frames = len(audio) // frame_size
+    if n_frames == 0:
+        return np.zeros(0, dtype=np.float32)
+
+    energy = np.empty(n_frames, dtype=np.float32)
+    # 分塊計算，避免長音訊一次產生大型暫存陣列
+    block_frames = 3000
+    for start in range(0, n_frames, block_frames):
+        end = min(n_frames, start + block_frames)
+        frames = np.asarray(audio[start * frame_size:end * frame_size], dtype=np.float32)
+        frames = frames.reshape(end - start, frame_size)
+        rms = np.sqrt(np.mean(frames * frames, axis=1) + 1e-12)
+        energy[start:end] = 20 * np.log10(rms + 1e-10)
+    return energy
+
+
+def smooth_energy(energy: np.ndarray, width: int) -> np.ndarray:
+    """以移動平均平滑能量曲線"""
+    if width <= 1 or len(energy) < width:
+        return energy
+    kernel = np.ones(width, dtype=np.float32) / width
+    return np.convolve(energy, kernel, mode="same")
+
+
+def find_split_points(audio: np.ndarray,
+                      sample_rate: int = SAMPLE_RATE,
+                      target_chunk_seconds: float = 120.0,
+                      search_seconds: float = 10.0,
+                      frame_seconds: float = 0.02) -> List[int]:
+    """
+    在每個目標長度附近尋找能量最低的位置作為切點
+
+    Args:
+        audio: 16kHz 單聲道 PCM
+        sample_rate: 取樣率
+        target_chunk_seconds: 目標片段長度（秒）
+        search_seconds: 在目標位置前後搜尋安靜處的範圍（秒）
+        frame_seconds: 音框長度（秒）
+
+    Returns:
+        切點的取樣位置（不含開頭和結尾）
+    """
+    duration = len(audio) / sample_rate
+    if duration <= target_chunk_seconds + search_seconds:
+        return []
+
+    # 以約 0.3 秒的平滑能量尋找較長的停頓，而不是單一音框的瞬間低點
+    energy = smooth_energy(frame_energy_db(audio, sample_rate, frame_seconds),
+                           max(1, int(0.3 / frame_seconds)))
+
+    split_points = []
+    position = 0.0
+    while duration - position > target_chunk_seconds + search_seconds:
+        target = position + target_chunk_seconds
+        lo = max(0, int((target - search_seconds) / frame_seconds))
+        hi = min(len(energy), int((target + search_seconds) / frame_seconds))
+        if hi <= lo:
+            break
+        best_frame = lo + int(np.argmin(energy[lo:hi]))
+        cut_seconds = (best_frame + 0.5) * frame_seconds
+        if cut_seconds <= position:
+            cut_seconds = target
+        split_points.append(int(cut_seconds * sample_rate))
+        position = cut_seconds
+
+    return split_points
+
+
+def split_audio_on_silence(audio: np.ndarray,
+                           sample_rate: int = SAMPLE_RATE,
+                           target_chunk_seconds: float = 120.0,
+                           search_seconds: float = 10.0,
+                           overlap_seconds: float = 1.0) -> List[Dict[str, Any]]:
+    """
+    將音訊在安靜處切成片段，每個片段前後保留少量重疊
+
+    Returns:
+        片段列表，每個片段包含:
+            start/end: 不重疊的名義範圍（取樣位置）
+            padded_start/padded_end: 實際送去轉錄的範圍（含重疊）
+    """
+    total = len(audio)
+    boundaries = [0] + find_split_points(audio, sample_rate, target_chunk_seconds,
+                                         search_seconds) + [total]
+    overlap = int(overlap_seconds * sample_rate)
+
+    chunks = []
+    for index in range(len(boundaries) - 1):
+        start, end = boundaries[index], boundaries[index + 1]
+        if end <= start:
+            continue
+        chunks.append({
+            "index": len(chunks),
+            "start": start,
+            "end": end,
+            "padded_start": max(0, start - overlap),
+            "padded_end": min(total, end + overlap),
+        })
+    return chunks
+
+
+def offset_segments(segments: List[Dict[str, Any]], offset: float) -> List[Dict[str, Any]]:
+    """將片段（及詞級）時間戳平移到原始音訊的時間軸"""
+    shifted = []
+    for segment in segments:
+        segment = dict(segment)
+        segment["start"] = segment.get("start", 0) + offset
+        segment["end"] = segment.get("end", 0) + offset
+        if segment.get("words"):
+            segment["words"] = [
+                dict(word, start=word["start"] + offset, end=word["end"] + offset)
+                for word in segment["words"]
+            ]
+        shifted.append(segment)
+    return shifted
+
+
+def detect_speech_regions(audio: np.ndarray,
+                          sample_rate: int = SAMPLE_RATE,
+                          threshold_db: float = -45.0,
+                          margin_db: float = 10.0,
+                          min_speech_seconds: float = 0.3,
+                          min_silence_seconds: float = 0.8,
+                          padding_seconds: float = 0.3,
+                          frame_seconds: float = 0.02) -> List[Dict[str, float]]:
+    """
+    以能量偵測有聲音的區段（簡易 VAD）
+
+    閾值取絕對閾值與「背景噪音 + 邊界值」之中較高者，
+    過短的停頓會被合併，過短的聲音會被忽略。
+
+    Args:
+        audio: 16kHz 單聲道 PCM
+        sample_rate: 取樣率
+        threshold_db: 絕對能量閾值（dBFS）
+        margin_db: 高於背景噪音多少 dB 才視為有聲音
+        min_speech_seconds: 最短有聲區段（秒）
+        min_silence_seconds: 短於此長度的停頓會被合併（秒）
+        padding_seconds: 每個區段前後保留的長度（秒）
+        frame_seconds: 音框長度（秒）
+
+    Returns:
+        有聲區段列表，每個區段包含 start 和 end（秒）
+    """
+    energy = frame_energy_db(audio, sample_rate, frame_seconds)
+    if len(energy) == 0:
+        return []
+
+    noise_floor = float(np.percentile(energy, 10))
+    threshold = max(threshold_db, noise_floor + margin_db)
+    active = smooth_energy(energy, max(1, int(0.1 / frame_seconds))) > threshold
+
+    # 找出連續的有聲音框
+    regions = []
+    edges = np.diff(active.astype(np.int8))
+    starts = list(np.where(edges == 1)[0] + 1)
+    ends = list(np.where(edges == -1)[0] + 1)
+    if active[0]:
+        starts.insert(0, 0)
+    if active[-1]:
+        ends.append(len(active))
+    for start, end in zip(starts, ends):
+        regions.append([start * frame_seconds, end * frame_seconds])
+
+    # 合併短停頓
+    merged = []
+    for region in regions:
+        if merged and region[0] - merged[-1][1] < min_silence_seconds:
+            merged[-1][1] = region[1]
+        else:
+            merged.append(region)
+
+    duration = len(audio) / sample_rate
+    speech_regions = []
+    for start, end in merged:
+        if end - start < min_speech_seconds:
+            continue
+        start = max(0.0, start - padding_seconds)
+        end = min(duration, end + padding_seconds)
+        if speech_regions and start <= speech_regions[-1]["end"]:
+            speech_regions[-1]["end"] = end
+        else:
+            speech_regions.append({"start": start, "end": end})
+    return speech_regions
+
+
+def group_speech_regions(regions: List[Dict[str, float]],
+                         max_clip_seconds: float = 30.0,
+                         max_gap_seconds: float = 10.0) -> List[Dict[str, float]]:
+    """
+    將相鄰的有聲區段合併為不超過 max_clip_seconds 的片段
+
+    Whisper 每個 clip 都會補齊到 30 秒後編碼，短區段逐一送入時每段都要執行一次完整的編碼器；
+    合併後區段之間的短暫靜音一起解碼（其中的幻覺輸出由 clamp_segments_to_regions 移除），
+    只在合併後會超過 max_clip_seconds 或停頓超過 max_gap_seconds 時分開
+
+    Args:
+        regions: 有聲區段（依時間排序）
+        max_clip_seconds: 合併後片段的最大長度（秒，與 Whisper 的解碼窗一致）
+        max_gap_seconds: 超過此長度的停頓一定分開（秒）
+
+    Returns:
+        合併後的區段
+    """
+    groups = []
+    for region in regions:
+        if (groups and region["start"] - groups[-1]["end"] <= max_gap_seconds
+                and region["end"] - groups[-1]["start"] <= max_clip_seconds):
+            groups[-1]["end"] = region["end"]
+        else:
+            groups.append({"start": region["start"], "end": region["end"]})
+    return groups
+
+
+def regions_to_clip_timestamps(regions: List[Dict[str, float]],
+                               max_clip_seconds: float = 30.0,
+                               max_gap_seconds: float = 10.0) -> List[float]:
+    """將有聲區段轉換為 Whisper 的 clip_timestamps 參數（相鄰區段先以 group_speech_regions 合併）"""
+    clip_timestamps = []
+    for region in group_speech_regions(regions, max_clip_seconds, max_gap_seconds):
+        clip_timestamps.extend([round(region["start"], 3), round(region["end"], 3)])
+    return clip_timestamps
+
+
+def clip_timestamps_for_range(clip_timestamps: List[float], start: float, end: float) -> List[float]:
+    """
+    取出落在 [start, end) 範圍內的 clip_timestamps，並換算為相對於 start 的時間
+
+    Returns:
+        相對時間的 clip_timestamps，範圍內沒有聲音時為空列表
+    """
+    relative = []
+    for i in range(0, len(clip_timestamps) - 1, 2):
+        clip_start = max(clip_timestamps[i], start)
+        clip_end = min(clip_timestamps[i + 1], end)
+        if clip_end > clip_start:
+            relative.extend([round(clip_start - start, 3), round(clip_end - start, 3)])
+    return relative
+
+
+def clamp_segments_to_regions(segments: List[Dict[str, Any]],
+                              regions: List[Dict[str, float]]) -> List[Dict[str, Any]]:
+    """移除中點不在任何有聲區段內的片段（靜音中的幻覺輸出）"""
+    if not regions:
+        return segments
+    kept = []
+    for segment in segments:
+        midpoint = (segment["start"] + segment["end"]) / 2
+        if any(region["start"] <= midpoint <= region["end"] for region in regions):
+            kept.append(segment)
+    return kept
+
+
+def is_overlap_duplicate(previous: Dict[str, Any], current: Dict[str, Any],
+                         threshold: float = 0.8) -> bool:
+    """判斷相鄰片段是否為重疊區被兩個片段重複轉錄的同一句話"""
+    if current["start"] >= previous["end"]:
+        return False
+    prev_text = previous.get("text", "").strip().lower()
+    curr_text = current.get("text", "").strip().lower()
+    if not prev_text or not curr_text:
+        return False
+    if prev_text in curr_text or curr_text in prev_text:
+        return True
+    return difflib.SequenceMatcher(None, prev_text, curr_text).ratio() > threshold
+
+
+def place_chunk_segments(chunk: Dict[str, Any],
+                         segments: List[Dict[str, Any]],
+                         previous: Optional[Dict[str, Any]] = None,
+                         sample_rate: int = SAMPLE_RATE) -> List[Dict[str, Any]]:
+    """
+    將單一片段的轉錄結果平移回原始時間軸
+
+    只保留中點落在片段名義範圍內的句子，並移除與前一句重複的重疊區句子。
+
+    Args:
+        chunk: split_audio_on_silence 產生的片段
+        segments: 該片段的轉錄結果（相對於 padded_start 的時間）
+        previous: 前一個片段最後保留的句子
+    """
+    nominal_start = chunk["start"] / sample_rate
+    nominal_end = chunk["end"] / sample_rate
+    placed = []
+    for segment in offset_segments(segments, chunk["padded_start"] / sample_rate):
+        midpoint = (segment["start"] + segment["end"]) / 2
+        if not (nominal_start <= midpoint < nominal_end):
+            continue
+        last = placed[-1] if placed else previous
+        if last is not None and is_overlap_duplicate(last, segment):
+            continue
+        placed.append(segment)
+    return placed
+
+
+def stitch_chunk_results(chunk_results: List[Dict[str, Any]],
+                         sample_rate: int = SAMPLE_RATE) -> List[Dict[str, Any]]:
+    """將各片段的轉錄結果依順序平移回原始時間軸並拼接"""
+    stitched = []
+    for chunk_result in sorted(chunk_results, key=lambda r: r["chunk"]["index"]):
+        stitched.extend(place_chunk_segments(chunk_result["chunk"], chunk_result["segments"],
+                                             stitched[-1] if stitched else None, sample_rate))
+
+    for i, segment in enumerate(stitched):
+        segment["id"] = i
+    return stitched
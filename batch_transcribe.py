@@ -0,0 +1,380 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+批次字幕生成工具（無介面）
+整個批次只載入一次模型，依工作清單逐一轉錄，
+完成的項目記錄在清單檔中，中斷後重新執行會從未完成的項目繼續
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import warnings
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from pathlib import Path
+from typing import Dict, List, Any, Optional
+
+from transcription_pipeline import TranscriptionPipeline, DEFAULT_SETTINGS
+
+warnings.filterwarnings("ignore")
+
+# 與 GUI 檔案選擇對話框相同的影音副檔名
+MEDIA_EXTENSIONS = {
+    ".mp4", ".avi", ".mov", ".mkv", ".wmv", ".flv", ".webm", ".m4v",
+    ".wav", ".mp3", ".flac", ".m4a", ".aac", ".ogg",
+}
+
+MANIFEST_VERSION = 1
+
+
+def collect_jobs(inputs: List[str], list_file: Optional[str] = None, recursive: bool = False) -> List[str]:
+    """
+    整理工作清單
+
+    Args:
+        inputs: 檔案或資料夾
+        list_file: 每行一個路徑的工作清單檔（# 開頭為註解）
+        recursive: 是否搜尋子資料夾
+
+    Returns:
+        去除重複後的絕對路徑列表（保持原本順序）
+    """
+    paths = list(inputs)
+    if list_file:
+        with open(list_file, 'r', encoding='utf-8') as f:
+            paths.extend(line.strip() for line in f if line.strip() and not line.strip().startswith("#"))
+
+    jobs = []
+    for path in paths:
+        path = Path(path)
+        if path.is_dir():
+            pattern = "**/*" if recursive else "*"
+            jobs.extend(str(p) for p in sorted(path.glob(pattern))
+                        if p.is_file() and p.suffix.lower() in MEDIA_EXTENSIONS)
+        elif path.is_file():
+            jobs.append(str(path))
+        else:
+            print(f"⚠️ 找不到檔案，略過: {path}")
+
+    seen = set()
+    unique = []
+    for job in jobs:
+        job = os.path.abspath(job)
+        if job not in seen:
+            seen.add(job)
+            unique.append(job)
+    return unique
+
+
+class BatchManifest:
+    """批次進度清單，每完成一個項目就寫回磁碟"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.items: Dict[str, Dict[str, Any]] = {}
+        if os.path.exists(path):
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+                if data.get("version") == MANIFEST_VERSION:
+                    self.items = data.get("items", {})
+            except (OSError, ValueError) as e:
+                print(f"⚠️ 無法讀取清單檔，將重新開始: {e}")
+
+    def is_done(self, input_file: str, output_srt: str) -> bool:
+        """檔案未變動且字幕仍存在時視為已完成"""
+        item = self.items.get(input_file)
+        if not item or item.get("status") != "done":
+            return False
+        if item.get("output_srt") != output_srt or not os.path.exists(output_srt):
+            return False
+        stat = os.stat(input_file)
+        return item.get("size") == stat.st_size and item.get("mtime") == stat.st_mtime
+
+    def record(self, input_file: str, **fields: Any):
+        """記錄項目狀態並立即保存"""
+        stat = os.stat(input_file)
+        self.items[input_file] = dict(fields, size=stat.st_size, mtime=stat.st_mtime,
+                                      finished_at=time.strftime("%Y-%m-%d %H:%M:%S"))
+        self.save()
+
+    def save(self):
+        """以暫存檔寫入後替換，避免中斷時留下損壞的清單"""
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        temp_path = f"{self.path}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump({"version": MANIFEST_VERSION, "items": self.items}, f, indent=2, ensure_ascii=False)
+        os.replace(temp_path, self.path)
+
+
+def output_path_for(input_file: str, output_dir: Optional[str]) -> str:
+    """字幕輸出路徑（未指定輸出資料夾時與輸入檔案放在一起）"""
+    name = f"{Path(input_file).stem}.srt"
+    return os.path.abspath(os.path.join(output_dir, name) if output_dir else str(Path(input_file).with_name(name)))
+
+
+def preload_model(settings: Dict[str, Any]) -> str:
+    """批次開始前先載入模型，之後每個項目都從登錄表取得同一個模型，返回使用的設備"""
+    from whisper_model_manager import model_registry
+
+    device = "cpu"
+    if settings["use_gpu"]:
+        try:
+            import torch
+            if torch.cuda.is_available():
+                device = "cuda"
+        except ImportError:
+            pass
+
+    start_time = time.time()
+    model_registry.set_memory_budget(settings["model_cache_mb"])
+    model_registry.get_model(settings["model"], device=device, download_root=settings["download_root"],
+                             quantize=settings["cpu_quantization"])
+    print(f"✅ 模型 {settings['model']} 已載入 (設備: {device}, {time.time() - start_time:.1f} 秒)")
+    return device
+
+
+def transcribe_item(input_file: str, output_srt: str, settings: Dict[str, Any], verbose: bool = False) -> Dict[str, Any]:
+    """轉錄單一項目（同時執行多個工作時在子程序中執行）"""
+    log = print if verbose else (lambda message: None)
+    start_time = time.time()
+    pipeline = TranscriptionPipeline(settings, log=log)
+    try:
+        success = pipeline.run(input_file, output_srt)
+        error = None if success else "轉錄失敗"
+    except Exception as e:
+        success = False
+        error = str(e)
+    return {"success": success, "error": error, "summary": pipeline.summary,
+            "elapsed": time.time() - start_time}
+
+
+def run_batch(jobs: List[str],
+              settings: Dict[str, Any],
+              manifest: BatchManifest,
+              output_dir: Optional[str] = None,
+              retry_failed: bool = False,
+              verbose: bool = False,
+              concurrent_jobs: int = 1) -> Dict[str, Any]:
+    """
+    轉錄工作清單
+
+    Args:
+        concurrent_jobs: 同時執行的工作數（大於 1 時以 fork 的子程序共用已載入的模型）
+                        批次時間窗解碼時改為以執行緒同時處理與批次大小相同數量的檔案
+
+    Returns:
+        批次統計（完成、略過、失敗數和處理量）
+    """
+    summary = {"done": 0, "skipped": 0, "failed": 0, "audio_seconds": 0.0, "wall_seconds": 0.0}
+    batch_start = time.time()
+
+    pending = []
+    for index, input_file in enumerate(jobs, 1):
+        output_srt = output_path_for(input_file, output_dir)
+        prefix = f"[{index}/{len(jobs)}]"
+
+        if manifest.is_done(input_file, output_srt):
+            print(f"{prefix} ⏭️ 已完成，略過: {input_file}")
+            summary["skipped"] += 1
+            continue
+        if not retry_failed and manifest.items.get(input_file, {}).get("status") == "failed":
+            print(f"{prefix} ⏭️ 上次失敗，略過（使用 --retry-failed 重試）: {input_file}")
+            summary["skipped"] += 1
+            continue
+        pending.append((prefix, input_file, output_srt))
+
+    def finish(prefix: str, input_file: str, output_srt: str, outcome: Dict[str, Any]):
+        if outcome["success"]:
+            audio_seconds = outcome["summary"].get("audio_seconds") or 0.0
+            subtitle_count = outcome["summary"].get("subtitle_count", 0)
+            summary["done"] += 1
+            summary["audio_seconds"] += audio_seconds
+            manifest.record(input_file, status="done", output_srt=output_srt,
+                            elapsed=round(outcome["elapsed"], 2), audio_seconds=round(audio_seconds, 2),
+                            subtitle_count=subtitle_count)
+            print(f"{prefix} ✅ {subtitle_count} 句字幕, {outcome['elapsed']:.1f} 秒 → {output_srt}")
+        else:
+            summary["failed"] += 1
+            manifest.record(input_file, status="failed", output_srt=output_srt,
+                            elapsed=round(outcome["elapsed"], 2), error=outcome["error"])
+            print(f"{prefix} ❌ {outcome['error']}")
+
+    def run_pool(executor):
+        futures = {}
+        for prefix, input_file, output_srt in pending:
+            print(f"{prefix} 🎤 {input_file}")
+            future = executor.submit(transcribe_item, input_file, output_srt, settings, verbose)
+            futures[future] = (prefix, input_file, output_srt)
+        for future in as_completed(futures):
+            try:
+                outcome = future.result()
+            except Exception as e:
+                outcome = {"success": False, "error": str(e), "summary": {}, "elapsed": 0.0}
+            finish(*futures[future], outcome)
+
+    concurrent_jobs = max(1, min(concurrent_jobs, len(pending)))
+    batch_threads = max(1, min(settings.get("batched_windows", 0), len(pending)))
+    if batch_threads > 1:
+        # 各執行緒的時間窗進入同一個批次解碼器，短檔案的時間窗也能湊滿批次
+        with ThreadPoolExecutor(max_workers=batch_threads) as executor:
+            run_pool(executor)
+    elif concurrent_jobs > 1 and "fork" in multiprocessing.get_all_start_methods():
+        with ProcessPoolExecutor(max_workers=concurrent_jobs,
+                                 mp_context=multiprocessing.get_context("fork")) as executor:
+            run_pool(executor)
+    else:
+        for prefix, input_file, output_srt in pending:
+            print(f"{prefix} 🎤 {input_file}")
+            finish(prefix, input_file, output_srt, transcribe_item(input_file, output_srt, settings, verbose))
+
+    summary["wall_seconds"] = time.time() - batch_start
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="批次生成字幕（無介面）")
+    parser.add_argument("inputs", nargs="*", help="影音檔案或資料夾")
+    parser.add_argument("--list", dest="list_file", default=None, help="工作清單檔（每行一個路徑）")
+    parser.add_argument("--recursive", "-r", action="store_true", help="搜尋子資料夾")
+    parser.add_argument("--output-dir", "-o", default=None, help="字幕輸出資料夾（預設與輸入檔案相同）")
+    parser.add_argument("--manifest", default="batch_manifest.json", help="進度清單檔")
+    parser.add_argument("--retry-failed", action="store_true", help="重試上次失敗的項目")
+    parser.add_argument("--config", default=None, help="讀取 GUI 設定檔 (whisper_config.json) 作為預設值")
+    parser.add_argument("--model", "-m", default=None, help="Whisper 模型")
+    parser.add_argument("--language", "-l", default=None, help="語言代碼（auto 為自動偵測）")
+    parser.add_argument("--content-type", choices=["auto", "speech", "music", "mixed"], default=None, help="內容類型")
+    parser.add_argument("--quality", choices=["auto", "fast", "balanced", "high", "ultra"], default=None, help="品質等級")
+    parser.add_argument("--multi-pass", choices=["off", "whole", "window"], default=None, help="多次通過轉錄策略")
+    parser.add_argument("--cascade", default=None, metavar="FAST_MODEL",
+                        help="模型串接：先以 FAST_MODEL 轉錄，品質不足的片段再以 --model 重新轉錄")
+    parser.add_argument("--vad", action="store_true", help="跳過靜音 (VAD)")
+    parser.add_argument("--parallel", type=int, default=None, metavar="WORKERS",
+                        help="CPU 分段平行轉錄的程序數（0 為自動）")
+    parser.add_argument("--parallel-passes", action="store_true",
+                        help="CPU 上多次通過轉錄的各溫度同時執行")
+    parser.add_argument("--early-stop", action="store_true",
+                        help="多次通過轉錄逐窗執行各溫度，已有足夠好的結果時停止其餘溫度（會改變解碼結果）")
+    parser.add_argument("--batch-windows", type=int, default=None, metavar="N",
+                        help="批次時間窗解碼：每次前向計算 N 個 30 秒時間窗，短檔案會同時處理以湊滿批次")
+    parser.add_argument("--cpu", action="store_true", help="強制使用 CPU")
+    parser.add_argument("--int8", action="store_true", help="CPU 上使用 int8 動態量化模型")
+    parser.add_argument("--jobs", "-j", type=int, default=0, help="CPU 上同時執行的工作數（0 為依規劃自動決定）")
+    parser.add_argument("--threads", type=int, default=0, help="每個工作的 torch 執行緒數（0 為依規劃自動決定）")
+    parser.add_argument("--lazy-word-timestamps", action="store_true",
+                        help="轉錄時不計算字詞時間戳，只對需要合併的片段補算（合併片段的時間以字詞為準）")
+    parser.add_argument("--encoder-cache", action="store_true",
+                        help="編碼器輸出保存到磁碟，之後以其他解碼參數重新轉錄相同檔案時不需要編碼")
+    parser.add_argument("--no-loop-guard", action="store_true",
+                        help="音樂內容解碼時不偵測重複迴圈（預設偵測到時提前結束時間窗）")
+    parser.add_argument("--no-phrase-suppression", action="store_true",
+                        help="解碼時不抑制製作資訊和無意義短語（只在後處理過濾）")
+    parser.add_argument("--checkpoint", action="store_true",
+                        help="長檔案逐窗轉錄並保存進度，中斷後可從最後完成的時間窗繼續")
+    parser.add_argument("--model-dir", default=None, help="模型目錄")
+    parser.add_argument("--verbose", "-v", action="store_true", help="顯示每個檔案的詳細日誌")
+
+    args = parser.parse_args()
+
+    settings = dict(DEFAULT_SETTINGS)
+    if args.config:
+        with open(args.config, 'r', encoding='utf-8') as f:
+            config = json.load(f)
+        settings.update({key: value for key, value in config.items() if key in settings})
+        if config.get("use_custom_model_dir") and config.get("custom_model_dir"):
+            settings["download_root"] = config["custom_model_dir"]
+
+    overrides = {
+        "model": args.model,
+        "language": args.language,
+        "content_type": args.content_type,
+        "quality_level": args.quality,
+        "download_root": args.model_dir,
+    }
+    settings.update({key: value for key, value in overrides.items() if value is not None})
+    if args.multi_pass is not None:
+        settings["multi_pass_mode"] = args.multi_pass != "off"
+        if args.multi_pass != "off":
+            settings["multi_pass_strategy"] = args.multi_pass
+    if args.cascade:
+        settings["cascade_mode"] = True
+        settings["cascade_fast_model"] = args.cascade
+    if args.vad:
+        settings["use_vad"] = True
+    if args.parallel is not None:
+        settings["parallel_chunks"] = True
+        settings["parallel_workers"] = args.parallel
+    if args.parallel_passes:
+        settings["parallel_passes"] = True
+    if args.early_stop:
+        settings["multi_pass_early_stop"] = True
+    if args.batch_windows is not None:
+        settings["batched_windows"] = args.batch_windows
+    if args.cpu:
+        settings["use_gpu"] = False
+    if args.int8:
+        settings["cpu_quantization"] = True
+    if args.lazy_word_timestamps:
+        settings["lazy_word_timestamps"] = True
+    if args.checkpoint:
+        settings["checkpoint_long_files"] = True
+    if args.encoder_cache:
+        settings["encoder_disk_cache"] = True
+    if args.no_loop_guard:
+        settings["loop_guard"] = False
+    if args.no_phrase_suppression:
+        settings["phrase_suppression"] = False
+    # 批次模式沒有即時顯示，串流輸出只會增加負擔
+    settings["stream_output"] = False
+
+    jobs = collect_jobs(args.inputs, args.list_file, args.recursive)
+    if not jobs:
+        print("沒有可處理的檔案")
+        sys.exit(1)
+
+    manifest = BatchManifest(args.manifest)
+    pending = [job for job in jobs if not manifest.is_done(job, output_path_for(job, args.output_dir))]
+    print(f"📋 共 {len(jobs)} 個檔案，{len(jobs) - len(pending)} 個已完成，清單檔: {args.manifest}")
+    concurrent_jobs = 1
+    if pending:
+        try:
+            device = preload_model(settings)
+        except Exception as e:
+            print(f"❌ 模型載入失敗: {e}")
+            sys.exit(1)
+
+        if settings["batched_windows"] > 1:
+            # 批次解碼在同一個程序中以執行緒同時處理多個檔案，由解碼器合併各檔案的時間窗
+            settings["cpu_threads"] = args.threads
+            print(f"🧩 批次時間窗解碼: 每批 {settings['batched_windows']} 個時間窗")
+        elif device == "cpu":
+            # 依核心數、模型大小和記憶體決定每個工作的執行緒數和同時工作數
+            from cpu_planner import plan_cpu_execution
+            plan = plan_cpu_execution(settings["model"], quantize=settings["cpu_quantization"],
+                                      max_jobs=args.jobs or len(pending))
+            concurrent_jobs = args.jobs or plan["concurrent_jobs"]
+            settings["cpu_threads"] = args.threads or max(1, plan["cores"] // concurrent_jobs)
+            print(f"🧵 CPU 規劃: {concurrent_jobs} 個工作 × {settings['cpu_threads']} 執行緒 "
+                  f"(依據: {plan['source']})")
+
+    summary = run_batch(jobs, settings, manifest, args.output_dir, args.retry_failed, args.verbose,
+                        concurrent_jobs)
+
+    audio_hours = summary["audio_seconds"] / 3600
+    wall_hours = summary["wall_seconds"] / 3600
+    print("")
+    print(f"🏁 完成 {summary['done']}，略過 {summary['skipped']}，失敗 {summary['failed']}")
+    print(f"⏱️ 音訊 {audio_hours:.2f} 小時，耗時 {wall_hours:.2f} 小時")
+    if wall_hours > 0:
+        print(f"🚀 處理量: {audio_hours / wall_hours:.2f} 音訊小時 / 實際小時")
+    sys.exit(1 if summary["failed"] else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,368 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+批次時間窗解碼
+model.transcribe 一次只送一個 30 秒時間窗進編碼器；這裡把長音訊在安靜處切成不超過 30 秒的
+時間窗，和其他同時轉錄的檔案的時間窗一起組成批次，一次前向計算完成編碼和解碼，
+最後依檔案拼接回與 model.transcribe 相同格式的片段
+"""
+
+import json
+import time
+import queue
+import threading
+import warnings
+from typing import Dict, List, Any, Optional, Callable
+
+import numpy as np
+
+from audio_segmentation import SAMPLE_RATE, split_audio_on_silence, stitch_chunk_results, clip_timestamps_for_range
+from decoding_guard import active_guards, decoding_guards
+
+# 切割時間窗的目標長度和搜尋範圍：最長 24 + 5 秒，加上前後重疊也不超過 Whisper 的 30 秒輸入
+WINDOW_TARGET_SECONDS = 24.0
+WINDOW_SEARCH_SECONDS = 5.0
+WINDOW_OVERLAP_SECONDS = 0.5
+
+# 時間戳 token 的精度（秒）和 mel 音框的取樣數
+TIME_PRECISION = 0.02
+HOP_LENGTH = 160
+
+
+def decoding_options(params: Dict[str, Any], temperature: float, device: str) -> Dict[str, Any]:
+    """
+    將 model.transcribe 的參數轉換為 DecodingOptions 的參數
+
+    與 transcribe 相同：溫度為 0 時使用 beam search，大於 0 時使用 best_of 取樣
+    """
+    options = {
+        "task": params.get("task", "transcribe"),
+        "language": params.get("language"),
+        "temperature": temperature,
+        "prompt": params.get("initial_prompt"),
+        "suppress_tokens": params.get("suppress_tokens", "-1"),
+        "without_timestamps": params.get("without_timestamps", False),
+        "length_penalty": params.get("length_penalty"),
+        "fp16": device != "cpu",
+    }
+    if temperature > 0:
+        if params.get("best_of") is not None:
+            options["best_of"] = params["best_of"]
+    elif params.get("beam_size") is not None:
+        options["beam_size"] = params["beam_size"]
+        options["patience"] = params.get("patience")
+    return options
+
+
+def tokens_to_segments(tokens: List[int], tokenizer, window_seconds: float) -> List[Dict[str, Any]]:
+    """
+    依時間戳 token 將單一時間窗的解碼結果切成片段
+
+    Returns:
+        片段列表（時間相對於時間窗開頭），只含 start、end、tokens
+    """
+    timestamp_begin = tokenizer.timestamp_begin
+    pieces = []
+    start = None
+    text_tokens: List[int] = []
+    for token in tokens:
+        if token >= timestamp_begin:
+            timestamp = (token - timestamp_begin) * TIME_PRECISION
+            if text_tokens:
+                pieces.append({"start": start or 0.0, "end": timestamp, "tokens": text_tokens})
+                text_tokens = []
+                start = None
+            else:
+                start = timestamp
+        elif token < tokenizer.eot:
+            text_tokens.append(token)
+    if text_tokens:
+        # 最後一句沒有結束時間戳（或完全沒有時間戳）時延伸到時間窗結尾
+        pieces.append({"start": start or 0.0, "end": window_seconds, "tokens": text_tokens})
+
+    for piece in pieces:
+        piece["end"] = min(max(piece["end"], piece["start"]), window_seconds)
+    return pieces
+
+
+class _WindowRequest:
+    """等待批次解碼的單一時間窗"""
+
+    def __init__(self, clip: np.ndarray, params: Dict[str, Any], group_key: str, guards: List[Any]):
+        self.clip = clip
+        self.params = params
+        self.group_key = group_key
+        self.guards = guards
+        self.segments: List[Dict[str, Any]] = []
+        self.language: Optional[str] = None
+        self.error: Optional[BaseException] = None
+        self.done = threading.Event()
+
+
+class BatchedWindowDecoder:
+    """
+    共用一個模型的批次時間窗解碼器
+
+    多個執行緒（例如批次工作中同時處理的多個短檔案）呼叫 transcribe 時，
+    各自的時間窗進入同一個佇列，由收集執行緒組成批次解碼。
+    """
+
+    def __init__(self,
+                 model,
+                 batch_size: int = 8,
+                 max_wait_seconds: float = 0.05,
+                 log: Optional[Callable[[str], None]] = None):
+        """
+        Args:
+            model: 已載入的 Whisper 模型
+            batch_size: 每次前向計算的時間窗數
+            max_wait_seconds: 批次未滿時等待其他檔案時間窗的時間
+            log: 日誌函數
+        """
+        self.model = model
+        self.batch_size = max(1, batch_size)
+        self.max_wait_seconds = max_wait_seconds
+        self.log = log or print
+        self._queue: "queue.Queue[Optional[_WindowRequest]]" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self._tokenizer = None
+        self.stats = {"batches": 0, "windows": 0, "encoded_windows": 0}
+
+    def get_tokenizer(self):
+        """取得解碼文字用的分詞器（文字 token 的解碼與語言無關）"""
+        if self._tokenizer is None:
+            from whisper.tokenizer import get_tokenizer
+            try:
+                self._tokenizer = get_tokenizer(self.model.is_multilingual,
+                                                num_languages=self.model.num_languages, task="transcribe")
+            except (TypeError, AttributeError):
+                # 舊版 Whisper 的分詞器沒有 num_languages 參數
+                self._tokenizer = get_tokenizer(self.model.is_multilingual, task="transcribe")
+        return self._tokenizer
+
+    def split_windows(self, audio: np.ndarray, params: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """在安靜處將音訊切成不超過 30 秒的時間窗（VAD 判定完全沒有聲音的時間窗直接略過）"""
+        chunks = split_audio_on_silence(audio, SAMPLE_RATE, WINDOW_TARGET_SECONDS,
+                                        search_seconds=WINDOW_SEARCH_SECONDS,
+                                        overlap_seconds=WINDOW_OVERLAP_SECONDS)
+        if isinstance(params.get("clip_timestamps"), list):
+            chunks = [chunk for chunk in chunks
+                      if clip_timestamps_for_range(params["clip_timestamps"],
+                                                   chunk["padded_start"] / SAMPLE_RATE,
+                                                   chunk["padded_end"] / SAMPLE_RATE)]
+        return chunks
+
+    def transcribe(self, audio: np.ndarray, params: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        批次解碼整個音訊
+
+        Args:
+            audio: 16kHz 單聲道 PCM
+            params: 傳給 model.transcribe 的參數（temperature 可為單一值或回退列表）
+
+        Returns:
+            與 model.transcribe 相同格式的結果（附帶 batched 統計）
+        """
+        start_time = time.time()
+        chunks = self.split_windows(audio, params)
+        decode_params = {k: v for k, v in params.items() if k not in ("clip_timestamps", "verbose")}
+        # 解碼在收集執行緒中進行，呼叫端執行緒的檢查器隨時間窗一起傳遞；設定不同的檢查器不放在同一個批次
+        guards = active_guards(self.model)
+        group_key = json.dumps([decode_params, [guard.get_config() for guard in guards]],
+                               sort_keys=True, ensure_ascii=False, default=str)
+
+        requests = []
+        for chunk in chunks:
+            request = _WindowRequest(np.asarray(audio[chunk["padded_start"]:chunk["padded_end"]], dtype=np.float32),
+                                     decode_params, group_key, guards)
+            requests.append(request)
+        self._ensure_collector()
+        for request in requests:
+            self._queue.put(request)
+
+        chunk_results = []
+        languages = []
+        for chunk, request in zip(chunks, requests):
+            request.done.wait()
+            if request.error is not None:
+                raise request.error
+            seek = chunk["padded_start"] // HOP_LENGTH
+            for segment in request.segments:
+                segment["seek"] = seek
+            chunk_results.append({"chunk": chunk, "segments": request.segments})
+            if request.language:
+                languages.append(request.language)
+
+        segments = stitch_chunk_results(chunk_results)
+        elapsed = time.time() - start_time
+        return {
+            "text": "".join(segment["text"] for segment in segments),
+            "segments": segments,
+            "language": params.get("language") or (max(set(languages), key=languages.count) if languages else None),
+            "batched": {
+                "windows": len(chunks),
+                "batch_size": self.batch_size,
+                "wall_time": round(elapsed, 3),
+            },
+        }
+
+    def _ensure_collector(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._collect, daemon=True)
+                self._thread.start()
+
+    def close(self):
+        """停止收集執行緒（已在佇列中的時間窗會先解碼完）"""
+        self._queue.put(None)
+
+    def _collect(self):
+        """收集佇列中的時間窗，湊滿批次（或等待逾時）後解碼"""
+        running = True
+        while running:
+            first = self._queue.get()
+            if first is None:
+                break
+            batch = [first]
+            deadline = time.time() + self.max_wait_seconds
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.time()
+                try:
+                    request = (self._queue.get(timeout=remaining) if remaining > 0
+                               else self._queue.get_nowait())
+                except queue.Empty:
+                    break
+                if request is None:
+                    running = False
+                    break
+                batch.append(request)
+
+            # 解碼參數不同（例如不同語言）的時間窗不能放在同一個批次
+            groups: Dict[str, List[_WindowRequest]] = {}
+            for request in batch:
+                groups.setdefault(request.group_key, []).append(request)
+            for group in groups.values():
+                self.decode_requests(group)
+
+    def decode_requests(self, requests: List[_WindowRequest]):
+        """解碼同一組參數的時間窗，完成後通知等待中的呼叫者"""
+        try:
+            # 同一組的檢查器設定相同，使用第一個時間窗的檢查器（統計計入該工作）
+            with decoding_guards(self.model, requests[0].guards):
+                outcomes = self.decode_batch([request.clip for request in requests], requests[0].params)
+            for request, (segments, language) in zip(requests, outcomes):
+                request.segments = segments
+                request.language = language
+        except Exception as e:
+            for request in requests:
+                request.error = e
+        finally:
+            for request in requests:
+                request.done.set()
+
+    def decode_batch(self, clips: List[np.ndarray], params: Dict[str, Any]) -> List[Any]:
+        """
+        一次編碼和解碼多個時間窗，品質不足的時間窗以下一個溫度重新解碼
+
+        Returns:
+            每個時間窗的 (片段列表, 語言)，片段時間相對於時間窗開頭
+        """
+        import torch
+        import whisper
+        from whisper.audio import N_FRAMES, log_mel_spectrogram, pad_or_trim
+
+        model = self.model
+        device = str(model.device)
+        mel = torch.stack([pad_or_trim(log_mel_spectrogram(clip, model.dims.n_mels), N_FRAMES)
+                           for clip in clips]).to(model.device)
+
+        temperatures = params.get("temperature", 0.0)
+        if not isinstance(temperatures, (list, tuple)):
+            temperatures = [temperatures]
+        compression_threshold = params.get("compression_ratio_threshold")
+        logprob_threshold = params.get("logprob_threshold")
+        no_speech_threshold = params.get("no_speech_threshold")
+
+        # 編碼器輸出與溫度無關：整個批次只編碼一次，溫度回退時只重新執行解碼器
+        fp16 = decoding_options(params, 0.0, device)["fp16"]
+        with torch.no_grad():
+            audio_features = model.embed_audio(mel.half() if fp16 else mel)
+        self.stats["encoded_windows"] += len(clips)
+
+        decoded: List[Any] = [None] * len(clips)
+        used_temperature = [0.0] * len(clips)
+        pending = list(range(len(clips)))
+        for attempt, temperature in enumerate(temperatures):
+            options = whisper.DecodingOptions(**decoding_options(params, temperature, device))
+            with warnings.catch_warnings():
+                warnings.simplefilter("ignore")
+                results = whisper.decode(model, audio_features[pending], options)
+            self.stats["batches"] += 1
+            self.stats["windows"] += len(pending)
+
+            retry = []
+            for index, result in zip(pending, results):
+                decoded[index] = result
+                used_temperature[index] = temperature
+                needs_fallback = (
+                    (compression_threshold is not None and result.compression_ratio > compression_threshold)
+                    or (logprob_threshold is not None and result.avg_logprob < logprob_threshold)
+                )
+                if (no_speech_threshold is not None and result.no_speech_prob > no_speech_threshold
+                        and logprob_threshold is not None and result.avg_logprob < logprob_threshold):
+                    # 靜音時間窗不需要以更高溫度重試
+                    needs_fallback = False
+                if needs_fallback and attempt < len(temperatures) - 1:
+                    retry.append(index)
+            pending = retry
+            if not pending:
+                break
+
+        tokenizer = self.get_tokenizer()
+        outcomes = []
+        for clip, result, temperature in zip(clips, decoded, used_temperature):
+            if (no_speech_threshold is not None and result.no_speech_prob > no_speech_threshold
+                    and (logprob_threshold is None or result.avg_logprob < logprob_threshold)):
+                outcomes.append(([], result.language))
+                continue
+            segments = []
+            for piece in tokens_to_segments(result.tokens, tokenizer, len(clip) / SAMPLE_RATE):
+                text = tokenizer.decode(piece["tokens"])
+                if not text.strip():
+                    continue
+                segments.append({
+                    "start": round(piece["start"], 2),
+                    "end": round(piece["end"], 2),
+                    "text": text,
+                    "tokens": piece["tokens"],
+                    "temperature": temperature,
+                    "avg_logprob": result.avg_logprob,
+                    "compression_ratio": result.compression_ratio,
+                    "no_speech_prob": result.no_speech_prob,
+                })
+            outcomes.append((segments, result.language))
+        return outcomes
+
+
+# 同一個程序中所有執行緒共用一個解碼器，時間窗才能合併成批次（模型改變時重建）
+_SHARED: Dict[str, Optional[BatchedWindowDecoder]] = {"decoder": None}
+_SHARED_LOCK = threading.Lock()
+
+
+def get_batched_decoder(model,
+                        batch_size: int = 8,
+                        log: Optional[Callable[[str], None]] = None) -> BatchedWindowDecoder:
+    """
+    取得模型對應的批次解碼器的便捷函數
+    """
+    with _SHARED_LOCK:
+        decoder = _SHARED["decoder"]
+        if decoder is None or decoder.model is not model:
+            if decoder is not None:
+                decoder.close()
+            decoder = BatchedWindowDecoder(model, batch_size=batch_size, log=log)
+            _SHARED["decoder"] = decoder
+        decoder.batch_size = max(1, batch_size)
+        return decoder
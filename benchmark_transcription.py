@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+轉錄效能基準測試工具
+比較不同轉錄模式的速度，結果可輸出為 JSON
+"""
+
+import os
+import sys
+import json
+import time
+import difflib
+import argparse
+import warnings
+from typing import Dict, List, Any
+
+warnings.filterwarnings("ignore")
+
+
+def benchmark_parallel(input_file: str,
+                       model_name: str,
+                       worker_counts: List[int],
+                       chunk_seconds: float,
+                       language: str = None) -> Dict[str, Any]:
+    """
+    比較單一程序轉錄與分段平行轉錄的速度
+
+    Returns:
+        包含每個工作程序數的耗時、即時率和每核心加速比的報告
+    """
+    import torch
+    from audio_cache import load_audio_pcm
+    from whisper_model_manager import model_registry
+    from parallel_transcriber import ParallelChunkTranscriber
+
+    audio = load_audio_pcm(input_file)
+    audio_seconds = len(audio) / 16000
+    model = model_registry.get_model(model_name, device="cpu")
+    params = {"temperature": 0.0, "language": language, "condition_on_previous_text": False}
+
+    print(f"🎧 音訊長度: {audio_seconds:.1f} 秒, CPU 核心: {os.cpu_count()}")
+    print("⏱️ 基準: 單一程序完整轉錄...")
+    torch.set_num_threads(os.cpu_count() or 1)
+    start_time = time.time()
+    model.transcribe(audio, **params)
+    baseline = time.time() - start_time
+
+    report = {
+        "input_file": input_file,
+        "model": model_name,
+        "audio_seconds": round(audio_seconds, 2),
+        "cpu_count": os.cpu_count(),
+        "baseline_seconds": round(baseline, 3),
+        "baseline_rtf": round(baseline / audio_seconds, 4) if audio_seconds > 0 else 0.0,
+        "runs": [],
+    }
+
+    for workers in worker_counts:
+        print(f"⏱️ 分段平行轉錄: {workers} 個程序...")
+        transcriber = ParallelChunkTranscriber(model, model_name, workers=workers,
+                                               chunk_seconds=chunk_seconds, log=lambda message: None)
+        start_time = time.time()
+        result = transcriber.transcribe(audio, params)
+        elapsed = time.time() - start_time
+        speedup = baseline / elapsed if elapsed > 0 else 0.0
+        # 實際的程序數（不支援 fork 或可用記憶體不足時少於要求的數量）
+        used_workers = result["parallel"]["workers"]
+        report["runs"].append({
+            "workers": used_workers,
+            "requested_workers": workers,
+            "chunks": result["parallel"]["chunks"],
+            "seconds": round(elapsed, 3),
+            "rtf": round(elapsed / audio_seconds, 4) if audio_seconds > 0 else 0.0,
+            "speedup": round(speedup, 3),
+            "speedup_per_core": round(speedup / used_workers, 3),
+            "segments": len(result["segments"]),
+        })
+
+    print("")
+    print(f"{'程序數':>6} {'耗時(秒)':>10} {'即時率':>8} {'加速':>7} {'每核心加速':>10}")
+    print(f"{'base':>6} {baseline:>10.1f} {report['baseline_rtf']:>8.3f} {1.0:>7.2f} {'-':>10}")
+    for run in report["runs"]:
+        print(f"{run['workers']:>6} {run['seconds']:>10.1f} {run['rtf']:>8.3f} "
+              f"{run['speedup']:>7.2f} {run['speedup_per_core']:>10.2f}")
+    return report
+
+
+def transcript_agreement(reference: str, candidate: str) -> float:
+    """以字元序列相似度衡量兩份轉錄的一致程度（適用於不以空白分詞的中日文）"""
+    reference = " ".join(reference.split())
+    candidate = " ".join(candidate.split())
+    if not reference and not candidate:
+        return 1.0
+    return difflib.SequenceMatcher(None, reference, candidate, autojunk=False).ratio()
+
+
+def benchmark_quantization(input_file: str,
+                           model_name: str,
+                           quality_levels: List[str],
+                           content_type: str = "speech",
+                           language: str = None) -> Dict[str, Any]:
+    """
+    比較 fp32 與 int8 動態量化模型在 CPU 上的速度和轉錄一致性
+
+    Returns:
+        每個品質等級的耗時、即時率、加速比和與 fp32 轉錄的一致程度
+    """
+    import torch
+    from audio_cache import load_audio_pcm
+    from whisper_model_manager import model_registry
+    from whisper_accuracy_optimizer import WhisperAccuracyOptimizer
+
+    audio = load_audio_pcm(input_file)
+    audio_seconds = len(audio) / 16000
+    optimizer = WhisperAccuracyOptimizer()
+    torch.set_num_threads(os.cpu_count() or 1)
+
+    print(f"🎧 音訊長度: {audio_seconds:.1f} 秒, CPU 核心: {os.cpu_count()}")
+    models = {}
+    load_seconds = {}
+    for variant, quantize in (("fp32", False), ("int8", True)):
+        start_time = time.time()
+        models[variant] = model_registry.get_model(model_name, device="cpu", quantize=quantize)
+        load_seconds[variant] = round(time.time() - start_time, 3)
+
+    report = {
+        "input_file": input_file,
+        "model": model_name,
+        "content_type": content_type,
+        "audio_seconds": round(audio_seconds, 2),
+        "cpu_count": os.cpu_count(),
+        "load_seconds": load_seconds,
+        "runs": [],
+    }
+
+    for quality_level in quality_levels:
+        params = optimizer.optimize_whisper_params(content_type=content_type,
+                                                   language=language or "auto",
+                                                   quality_level=quality_level)
+        # 與轉錄流程的單次轉錄相同：只使用第一個溫度
+        temperature = params.get("temperature", [0.0])
+        if isinstance(temperature, list):
+            temperature = temperature[0]
+        whisper_params = {k: v for k, v in params.items() if k != "temperature" and v is not None}
+
+        run = {"quality_level": quality_level}
+        texts = {}
+        for variant, model in models.items():
+            print(f"⏱️ {quality_level}: {variant}...")
+            start_time = time.time()
+            result = model.transcribe(audio, temperature=temperature, **whisper_params)
+            elapsed = time.time() - start_time
+            texts[variant] = result.get("text", "")
+            run[f"{variant}_seconds"] = round(elapsed, 3)
+            run[f"{variant}_rtf"] = round(elapsed / audio_seconds, 4) if audio_seconds > 0 else 0.0
+            run[f"{variant}_segments"] = len(result.get("segments", []))
+
+        run["speedup"] = round(run["fp32_seconds"] / run["int8_seconds"], 3) if run["int8_seconds"] > 0 else 0.0
+        run["agreement"] = round(transcript_agreement(texts["fp32"], texts["int8"]), 4)
+        report["runs"].append(run)
+
+    print("")
+    print(f"📥 載入: fp32 {load_seconds['fp32']:.1f} 秒, int8 {load_seconds['int8']:.1f} 秒")
+    print(f"{'品質':>9} {'fp32 即時率':>11} {'int8 即時率':>11} {'加速':>7} {'一致程度':>9}")
+    for run in report["runs"]:
+        print(f"{run['quality_level']:>9} {run['fp32_rtf']:>11.3f} {run['int8_rtf']:>11.3f} "
+              f"{run['speedup']:>7.2f} {run['agreement'] * 100:>8.1f}%")
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Whisper 轉錄效能基準測試")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    parallel_parser = subparsers.add_parser("parallel", help="分段平行轉錄的加速比")
+    parallel_parser.add_argument("input", help="影片或音訊檔案")
+    parallel_parser.add_argument("--model", "-m", default="small", help="Whisper 模型")
+    parallel_parser.add_argument("--workers", "-w", default="1,2,4",
+                                 help="要測試的程序數，以逗號分隔")
+    parallel_parser.add_argument("--chunk-seconds", type=float, default=120.0, help="目標片段長度（秒）")
+    parallel_parser.add_argument("--language", "-l", default=None, help="語言代碼（預設自動偵測）")
+    parallel_parser.add_argument("--output", "-o", default=None, help="將報告寫入 JSON 檔案")
+
+    quantize_parser = subparsers.add_parser("quantize", help="int8 動態量化與 fp32 的速度和一致性")
+    quantize_parser.add_argument("input", help="影片或音訊檔案")
+    quantize_parser.add_argument("--model", "-m", default="small", help="Whisper 模型")
+    quantize_parser.add_argument("--quality", "-q", default="fast,balanced,high,ultra",
+                                 help="要測試的品質等級，以逗號分隔")
+    quantize_parser.add_argument("--content-type", default="speech", help="內容類型")
+    quantize_parser.add_argument("--language", "-l", default=None, help="語言代碼（預設自動偵測）")
+    quantize_parser.add_argument("--output", "-o", default=None, help="將報告寫入 JSON 檔案")
+
+    args = parser.parse_args()
+
+    if not os.path.exists(args.input):
+        print(f"檔案不存在: {args.input}")
+        sys.exit(1)
+
+    if args.command == "parallel":
+        worker_counts = [int(n) for n in args.workers.split(",") if n.strip()]
+        report = benchmark_parallel(args.input, args.model, worker_counts,
+                                    args.chunk_seconds, args.language)
+    elif args.command == "quantize":
+        quality_levels = [q.strip() for q in args.quality.split(",") if q.strip()]
+        report = benchmark_quantization(args.input, args.model, quality_levels,
+                                        args.content_type, args.language)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f"📊 報告已保存至: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
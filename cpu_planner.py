@@ -0,0 +1,321 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+CPU 執行規劃
+依核心數、模型大小和可用記憶體決定每個工作的 torch 執行緒數和同時執行的工作數，
+校準結果保存在磁碟上，之後同一台機器直接使用實測最佳的配置
+"""
+
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+import warnings
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Any, Optional, Callable, Tuple
+
+from whisper_model_manager import MODEL_SIZES_MB
+
+# 校準結果位置（與其他快取並列）
+DEFAULT_CALIBRATION_PATH = os.path.expanduser("~/.cache/aisub/cpu_plan.json")
+
+# 單一工作的執行緒數超過此值後加速有限（依模型大小），多出的核心改為同時執行更多工作
+THREAD_SWEET_SPOT = {
+    "tiny": 2,
+    "base": 2,
+    "small": 4,
+    "medium": 8,
+    "large": 8,
+    "large-v3": 8,
+    "turbo": 8,
+}
+
+# 每個工作除了模型以外的記憶體（音訊、mel、解碼快取）
+JOB_OVERHEAD_MB = 512
+
+# 父程序在 fork 之前設定，校準用的子程序共用模型
+_PARENT_STATE: Dict[str, Any] = {}
+
+
+def available_memory_mb() -> float:
+    """取得可用記憶體（MB），無法取得時返回 0"""
+    try:
+        import psutil
+        return psutil.virtual_memory().available / (1024 * 1024)
+    except ImportError:
+        pass
+    try:
+        with open("/proc/meminfo", 'r') as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    try:
+        return os.sysconf("SC_AVPHYS_PAGES") * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (ValueError, OSError, AttributeError):
+        return 0.0
+
+
+def can_fork_jobs() -> bool:
+    """是否能以 fork 同時執行多個共用模型權重的工作（Windows 不支援）"""
+    return "fork" in multiprocessing.get_all_start_methods()
+
+
+def machine_id() -> str:
+    """校準結果的機器識別（核心數和處理器改變時需要重新校準）"""
+    return f"{platform.machine()}-{platform.processor() or 'cpu'}-{os.cpu_count()}"
+
+
+def model_variant(model_name: str, quantize: bool = False) -> str:
+    """校準結果的模型鍵"""
+    return f"{model_name}-int8" if quantize else model_name
+
+
+def job_memory_mb(model_name: str, quantize: bool = False) -> float:
+    """預估單一工作所需記憶體（fp32 權重約為 fp16 檢查點的兩倍）"""
+    model_mb = MODEL_SIZES_MB.get(model_name, MODEL_SIZES_MB["medium"])
+    return model_mb * (1.0 if quantize else 2.0) + JOB_OVERHEAD_MB
+
+
+class CpuPlanner:
+    """CPU 執行緒與同時工作數規劃器"""
+
+    def __init__(self, calibration_path: Optional[str] = None):
+        self.calibration_path = calibration_path or DEFAULT_CALIBRATION_PATH
+
+    def load_calibration(self) -> Dict[str, Any]:
+        """讀取本機的校準結果"""
+        try:
+            with open(self.calibration_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        return data.get(machine_id(), {})
+
+    def save_calibration(self, variant: str, calibration: Dict[str, Any]):
+        """保存校準結果（依機器和模型分開保存）"""
+        try:
+            with open(self.calibration_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            data = {}
+        data.setdefault(machine_id(), {})[variant] = calibration
+
+        os.makedirs(os.path.dirname(self.calibration_path), exist_ok=True)
+        temp_path = f"{self.calibration_path}.{os.getpid()}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, indent=2, ensure_ascii=False)
+        os.replace(temp_path, self.calibration_path)
+
+    def plan(self,
+             model_name: str,
+             quantize: bool = False,
+             max_jobs: Optional[int] = None,
+             cores: Optional[int] = None,
+             memory_mb: Optional[float] = None) -> Dict[str, Any]:
+        """
+        決定每個工作的執行緒數和同時執行的工作數
+
+        Args:
+            model_name: 模型名稱
+            quantize: 是否使用 int8 量化模型
+            max_jobs: 最多同時執行的工作數（例如批次中剩餘的檔案數，GUI 為 1）
+            cores: CPU 核心數（預設自動偵測）
+            memory_mb: 可用記憶體（預設自動偵測）
+
+        Returns:
+            包含 threads_per_job、concurrent_jobs 及規劃依據的字典
+        """
+        cores = cores or os.cpu_count() or 1
+        memory_mb = available_memory_mb() if memory_mb is None else memory_mb
+        per_job_mb = job_memory_mb(model_name, quantize)
+
+        # fork 的子程序共用模型權重，但保守起見以每個工作各佔一份計算
+        memory_jobs = max(1, int(memory_mb * 0.8 // per_job_mb)) if memory_mb > 0 else 1
+        job_limit = max(1, min(memory_jobs, max_jobs or cores))
+        if not can_fork_jobs():
+            # 不支援 fork 時同時工作會各自載入模型，批次工具也只會依序執行
+            job_limit = 1
+
+        calibration = self.load_calibration().get(model_variant(model_name, quantize))
+        if calibration:
+            candidates = [run for run in calibration.get("runs", [])
+                          if run["concurrent_jobs"] <= job_limit
+                          and run["threads_per_job"] * run["concurrent_jobs"] <= cores]
+            if candidates:
+                best = max(candidates, key=lambda run: run["throughput"])
+                return {
+                    "threads_per_job": best["threads_per_job"],
+                    "concurrent_jobs": best["concurrent_jobs"],
+                    "cores": cores,
+                    "memory_mb": round(memory_mb),
+                    "job_memory_mb": round(per_job_mb),
+                    "source": "calibration",
+                }
+
+        sweet_spot = THREAD_SWEET_SPOT.get(model_name, 8)
+        concurrent_jobs = max(1, min(job_limit, cores // sweet_spot))
+        threads_per_job = max(1, cores // concurrent_jobs)
+        return {
+            "threads_per_job": threads_per_job,
+            "concurrent_jobs": concurrent_jobs,
+            "cores": cores,
+            "memory_mb": round(memory_mb),
+            "job_memory_mb": round(per_job_mb),
+            "source": "heuristic",
+        }
+
+    @staticmethod
+    def candidate_configs(cores: int, max_jobs: int) -> List[Tuple[int, int]]:
+        """校準要測試的 (執行緒數, 同時工作數) 組合，每個組合都用滿所有核心"""
+        configs = []
+        jobs = 1
+        while jobs <= min(cores, max_jobs):
+            configs.append((max(1, cores // jobs), jobs))
+            jobs *= 2
+        return configs
+
+    def calibrate(self,
+                  model_name: str,
+                  audio,
+                  quantize: bool = False,
+                  sample_seconds: float = 60.0,
+                  download_root: Optional[str] = None,
+                  log: Optional[Callable[[str], None]] = None) -> Dict[str, Any]:
+        """
+        實測各種執行緒/工作數組合的總處理量並保存最佳配置
+
+        Args:
+            model_name: 模型名稱
+            audio: 16kHz 單聲道 PCM（只使用開頭的 sample_seconds 秒）
+            quantize: 是否使用 int8 量化模型
+            sample_seconds: 每個工作轉錄的音訊長度（秒）
+            download_root: 模型目錄
+            log: 日誌函數
+
+        Returns:
+            校準結果（各組合的處理量和最佳配置）
+        """
+        from whisper_model_manager import model_registry
+
+        log = log or print
+        cores = os.cpu_count() or 1
+        sample = audio[:int(sample_seconds * 16000)]
+        sample_seconds = len(sample) / 16000
+        model = model_registry.get_model(model_name, device="cpu", download_root=download_root,
+                                         log=log, quantize=quantize)
+
+        memory_jobs = max(1, int(available_memory_mb() * 0.8 // job_memory_mb(model_name, quantize)))
+        if not can_fork_jobs():
+            log("ℹ️ 此平台不支援 fork，只校準單一工作的執行緒數")
+            memory_jobs = 1
+        runs = []
+        for threads, jobs in self.candidate_configs(cores, memory_jobs):
+            log(f"⏱️ 校準: {jobs} 個工作 × {threads} 執行緒...")
+            wall_time = run_concurrent_jobs(model, sample, threads, jobs)
+            throughput = jobs * sample_seconds / wall_time if wall_time > 0 else 0.0
+            runs.append({
+                "threads_per_job": threads,
+                "concurrent_jobs": jobs,
+                "wall_time": round(wall_time, 3),
+                "throughput": round(throughput, 3),
+            })
+            log(f"   總處理量: {throughput:.2f} 秒音訊 / 秒")
+
+        best = max(runs, key=lambda run: run["throughput"])
+        calibration = {
+            "runs": runs,
+            "best": best,
+            "sample_seconds": round(sample_seconds, 2),
+            "calibrated_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+        }
+        self.save_calibration(model_variant(model_name, quantize), calibration)
+        log(f"✅ 最佳配置: {best['concurrent_jobs']} 個工作 × {best['threads_per_job']} 執行緒 "
+            f"({best['throughput']:.2f} 秒音訊 / 秒)")
+        return calibration
+
+
+def _calibration_job(audio, threads: int) -> float:
+    """校準子程序：以指定執行緒數轉錄樣本"""
+    import torch
+    torch.set_num_threads(threads)
+    start_time = time.time()
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        _PARENT_STATE["model"].transcribe(audio, temperature=0.0, condition_on_previous_text=False)
+    return time.time() - start_time
+
+
+def run_concurrent_jobs(model, audio, threads: int, jobs: int) -> float:
+    """同時執行多個轉錄工作，返回全部完成的實際耗時"""
+    if jobs == 1:
+        _PARENT_STATE["model"] = model
+        try:
+            return _calibration_job(audio, threads)
+        finally:
+            _PARENT_STATE.clear()
+
+    # 以 fork 共用已載入的模型權重；不支援 fork 的平台只能測試單一工作
+    if not can_fork_jobs():
+        raise RuntimeError("此平台不支援 fork，無法同時執行多個工作")
+    _PARENT_STATE["model"] = model
+    try:
+        start_time = time.time()
+        with ProcessPoolExecutor(max_workers=jobs, mp_context=multiprocessing.get_context("fork")) as executor:
+            list(executor.map(_calibration_job, [audio] * jobs, [threads] * jobs))
+        return time.time() - start_time
+    finally:
+        _PARENT_STATE.clear()
+
+
+# 全域實例
+cpu_planner = CpuPlanner()
+
+
+def plan_cpu_execution(model_name: str,
+                       quantize: bool = False,
+                       max_jobs: Optional[int] = None) -> Dict[str, Any]:
+    """
+    取得 CPU 執行規劃的便捷函數
+    """
+    return cpu_planner.plan(model_name, quantize=quantize, max_jobs=max_jobs)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="CPU 執行緒與同時工作數規劃")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    plan_parser = subparsers.add_parser("plan", help="顯示目前的規劃")
+    plan_parser.add_argument("--model", "-m", default="medium", help="Whisper 模型")
+    plan_parser.add_argument("--int8", action="store_true", help="使用 int8 量化模型")
+    plan_parser.add_argument("--jobs", type=int, default=None, help="最多同時執行的工作數")
+
+    calibrate_parser = subparsers.add_parser("calibrate", help="實測並保存本機的最佳配置")
+    calibrate_parser.add_argument("input", help="用於校準的影片或音訊檔案")
+    calibrate_parser.add_argument("--model", "-m", default="medium", help="Whisper 模型")
+    calibrate_parser.add_argument("--int8", action="store_true", help="使用 int8 量化模型")
+    calibrate_parser.add_argument("--sample-seconds", type=float, default=60.0, help="每個工作轉錄的音訊長度（秒）")
+
+    args = parser.parse_args()
+
+    if args.command == "plan":
+        plan = cpu_planner.plan(args.model, quantize=args.int8, max_jobs=args.jobs)
+        print(f"🖥️ 核心: {plan['cores']}, 可用記憶體: {plan['memory_mb']} MB, "
+              f"每個工作約 {plan['job_memory_mb']} MB")
+        print(f"📋 {plan['concurrent_jobs']} 個工作 × {plan['threads_per_job']} 執行緒 (依據: {plan['source']})")
+    elif args.command == "calibrate":
+        if not os.path.exists(args.input):
+            print(f"檔案不存在: {args.input}")
+            sys.exit(1)
+        from audio_cache import load_audio_pcm
+        audio = load_audio_pcm(args.input)
+        cpu_planner.calibrate(args.model, audio, quantize=args.int8, sample_seconds=args.sample_seconds)
+
+
+if __name__ == "__main__":
+    main()
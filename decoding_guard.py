@@ -0,0 +1,445 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+解碼時的幻覺迴圈中止
+音樂內容常讓 Whisper 陷入重複迴圈（例如「作詞・作曲・編曲 初音ミク」一再重複，或整個時間窗
+都是同一個音節），要等整個 token 上限用完後才由壓縮比檢查觸發回退。這裡在每個解碼步驟檢查
+已產生的 token，出現 n-gram 重複或製作資訊重複出現時強制結束該時間窗，並統計省下的解碼步數。
+另外在解碼時直接禁止後處理一定會刪除的製作資訊片語，並降低整個片段只有無意義短語的機率
+"""
+
+import zlib
+import threading
+from contextlib import contextmanager
+from typing import Dict, List, Any, Optional
+
+# 預設的製作資訊片語（與 filter_music_metadata 過濾的項目一致）
+DEFAULT_METADATA_PHRASES = [
+    "作詞", "作曲", "編曲", "初音ミク", "ボーカロイド", "VOCALOID",
+    "Composer", "Lyricist", "Arranger", "Music by", "Lyrics by",
+]
+
+
+class DecodingGuard:
+    """
+    重複迴圈偵測器
+
+    在 decoding_guards 的範圍內，該模型的每次 whisper.decode（包含 model.transcribe
+    內部的解碼和溫度回退）都會加上檢查用的 logit 過濾器。偵測到迴圈時只允許輸出結束 token。
+
+    歌詞本來就常有重複（「ラララ…」、反覆的副歌），因此 n-gram 重複只在已產生文字的壓縮比
+    也超過 Whisper 的回退門檻時才中止：這樣的時間窗即使解碼完也會因壓縮比過高而回退，
+    提前結束只省下解碼步數，被截短的輸出壓縮比仍然過高，溫度回退照常發生。
+    """
+
+    def __init__(self,
+                 max_ngram: int = 16,
+                 min_repeats: int = 4,
+                 min_repeat_tokens: int = 24,
+                 metadata_phrases: Optional[List[str]] = None,
+                 metadata_repeats: int = 2,
+                 compression_ratio_threshold: float = 2.4):
+        """
+        Args:
+            max_ngram: 檢查的最長重複單位（token 數）
+            min_repeats: 重複單位至少連續出現的次數
+            min_repeat_tokens: 重複部分至少涵蓋的 token 數（短單位需要更多次重複，避免誤判疊字）
+            metadata_phrases: 製作資訊片語
+            metadata_repeats: 同一時間窗中製作資訊出現幾次視為迴圈
+            compression_ratio_threshold: 重複部分以外也要求的文字壓縮比（與 Whisper 的回退門檻相同）
+        """
+        self.max_ngram = max_ngram
+        self.min_repeats = min_repeats
+        self.min_repeat_tokens = min_repeat_tokens
+        self.metadata_phrases = list(DEFAULT_METADATA_PHRASES if metadata_phrases is None else metadata_phrases)
+        self.metadata_repeats = metadata_repeats
+        self.compression_ratio_threshold = compression_ratio_threshold
+        self._phrase_tokens: Dict[int, List[List[int]]] = {}
+        self._lock = threading.Lock()
+        self.stats = {"windows": 0, "aborted_windows": 0, "saved_steps": 0, "repetition": 0, "metadata": 0}
+
+    def get_config(self) -> Dict[str, Any]:
+        """取得會影響解碼結果的設定（加入轉錄結果快取鍵）"""
+        return {
+            "max_ngram": self.max_ngram,
+            "min_repeats": self.min_repeats,
+            "min_repeat_tokens": self.min_repeat_tokens,
+            "metadata_phrases": self.metadata_phrases,
+            "metadata_repeats": self.metadata_repeats,
+            "compression_ratio_threshold": self.compression_ratio_threshold,
+        }
+
+    def phrase_tokens(self, tokenizer) -> List[List[int]]:
+        """製作資訊片語的 token 序列（句首和前面有空白兩種寫法）"""
+        with self._lock:
+            sequences = self._phrase_tokens.get(id(tokenizer))
+            if sequences is None:
+                sequences = []
+                for phrase in self.metadata_phrases:
+                    for text in (phrase, " " + phrase):
+                        tokens = tokenizer.encode(text)
+                        if tokens and tokens not in sequences:
+                            sequences.append(tokens)
+                self._phrase_tokens[id(tokenizer)] = sequences
+            return sequences
+
+    def find_loop(self, tokens: List[int], phrases: List[List[int]]) -> Optional[str]:
+        """
+        檢查已產生的文字 token 結尾是否為迴圈
+
+        Args:
+            tokens: 本時間窗已產生的文字 token（不含時間戳 token）
+            phrases: 製作資訊片語的 token 序列
+
+        Returns:
+            "repetition"、"metadata" 或 None
+        """
+        count = len(tokens)
+        for size in range(1, self.max_ngram + 1):
+            repeats = max(self.min_repeats, -(-self.min_repeat_tokens // size))
+            span = size * repeats
+            if span > count:
+                if size * self.min_repeats > count:
+                    break
+                continue
+            if tokens[-span:] == tokens[-size:] * repeats:
+                return "repetition"
+
+        # 只在剛好產生完某個片語時計算出現次數
+        for phrase in phrases:
+            length = len(phrase)
+            if length > count or tokens[-length:] != phrase:
+                continue
+            occurrences = sum(1 for i in range(count - length + 1) if tokens[i:i + length] == phrase)
+            if occurrences >= self.metadata_repeats:
+                return "metadata"
+        return None
+
+    @staticmethod
+    def compression_ratio(text: str) -> float:
+        """文字的 zlib 壓縮比（與 whisper.utils.compression_ratio 相同）"""
+        text_bytes = text.encode("utf-8")
+        if not text_bytes:
+            return 0.0
+        return len(text_bytes) / len(zlib.compress(text_bytes))
+
+    def check(self, text_tokens: List[int], tokenizer, phrases: List[List[int]]) -> Optional[str]:
+        """
+        判斷是否應中止此序列
+
+        Args:
+            text_tokens: 本時間窗已產生的文字 token
+            tokenizer: Whisper 分詞器（計算壓縮比用）
+            phrases: 製作資訊片語的 token 序列
+
+        Returns:
+            中止原因 "repetition" / "metadata"，繼續解碼時為 None
+        """
+        reason = self.find_loop(text_tokens, phrases)
+        if reason == "repetition":
+            # 正常歌詞的重複：整體壓縮比未達回退門檻時繼續解碼
+            if self.compression_ratio(tokenizer.decode(text_tokens)) <= self.compression_ratio_threshold:
+                return None
+        return reason
+
+    def begin_task(self, tokenizer, sample_begin: int, sample_len: int) -> Dict[str, Any]:
+        """建立單次解碼的檢查狀態"""
+        with self._lock:
+            self.stats["windows"] += 1
+        return {
+            "tokenizer": tokenizer,
+            "eot": tokenizer.eot,
+            "sample_begin": sample_begin,
+            "sample_len": sample_len,
+            "phrases": self.phrase_tokens(tokenizer),
+            "aborted": False,
+        }
+
+    def apply(self, logits, tokens, state: Dict[str, Any]):
+        """每個解碼步驟檢查一次，偵測到迴圈的序列只允許輸出結束 token"""
+        eot = state["eot"]
+        step = tokens.shape[-1] - state["sample_begin"]
+        for row, sequence in enumerate(tokens[:, state["sample_begin"]:].tolist()):
+            if sequence and sequence[-1] == eot:
+                continue
+            text_tokens = [token for token in sequence if token < eot]
+            reason = self.check(text_tokens, state["tokenizer"], state["phrases"])
+            if reason is None:
+                continue
+            logits[row, :] = -float("inf")
+            logits[row, eot] = 0
+            if not state["aborted"]:
+                # 每次解碼只計算一次（beam search 的其他候選共用同一個解碼迴圈）
+                state["aborted"] = True
+                self.record_abort(reason, state["sample_len"] - step)
+
+    def record_abort(self, reason: str, saved_steps: int):
+        with self._lock:
+            self.stats["aborted_windows"] += 1
+            self.stats["saved_steps"] += max(0, saved_steps)
+            self.stats[reason] += 1
+
+    def merge_stats(self, stats: Dict[str, Any]):
+        """加入其他程序（分段平行轉錄的工作程序）的統計"""
+        with self._lock:
+            for key, value in stats.items():
+                if key in self.stats:
+                    self.stats[key] += value
+
+    def get_stats(self) -> Dict[str, Any]:
+        """取得中止統計（saved_steps 為提前結束時距離 token 上限的步數）"""
+        with self._lock:
+            return dict(self.stats)
+
+
+class PhraseSuppressor:
+    """
+    片語抑制
+
+    blocked_phrases 在任何位置都不允許完整產生：輸出到片語最後一個 token 前時強制結束片段
+    （只允許時間戳或 EOT），避免改以其他 token 接續而留下「初音ミ…」這類後處理比對不到的殘句；
+    截斷後留下的前綴由 strip_truncated 刪除。音樂類內容另外在片段開頭降低這些片語第一個 token
+    的分數（bias_blocked_starts）。
+    biased_phrases 依語言分組，只在片段開頭降低產生該短語的分數（後處理只刪除整段都是這些
+    短語的片段，片段中間出現時仍是正常內容）
+    """
+
+    def __init__(self,
+                 blocked_phrases: List[str],
+                 biased_phrases: Optional[Dict[str, List[str]]] = None,
+                 phrase_bias: float = -3.0,
+                 bias_blocked_starts: bool = False):
+        """
+        Args:
+            blocked_phrases: 禁止產生的片語
+            biased_phrases: 語言代碼 -> 片段開頭降低分數的短語
+            phrase_bias: 片段開頭短語的 logit 偏移
+            bias_blocked_starts: 片段開頭是否也降低禁止片語第一個 token 的分數（一般語音的
+                                 「初めて」、「Music」開頭的句子也會受影響，只用於音樂類內容）
+        """
+        self.blocked_phrases = list(blocked_phrases)
+        self.biased_phrases = {code: list(phrases) for code, phrases in (biased_phrases or {}).items()}
+        self.phrase_bias = phrase_bias
+        self.bias_blocked_starts = bias_blocked_starts
+        self._tables: Dict[Any, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        self.stats = {"windows": 0, "blocked": 0, "truncated": 0, "biased": 0}
+
+    def get_config(self) -> Dict[str, Any]:
+        """取得會影響解碼結果的設定（加入轉錄結果快取鍵）"""
+        return {
+            "blocked_phrases": self.blocked_phrases,
+            "biased_phrases": self.biased_phrases,
+            "phrase_bias": self.phrase_bias,
+            "bias_blocked_starts": self.bias_blocked_starts,
+        }
+
+    @staticmethod
+    def build_table(tokenizer, phrases: List[str]) -> Dict[tuple, set]:
+        """片語前綴 (token tuple) -> 完成片語的 token（句首和前面有空白兩種寫法）"""
+        table: Dict[tuple, set] = {}
+        for phrase in phrases:
+            for text in (phrase, " " + phrase):
+                tokens = tokenizer.encode(text)
+                if tokens:
+                    table.setdefault(tuple(tokens[:-1]), set()).add(tokens[-1])
+        return table
+
+    def tables(self, tokenizer) -> Dict[str, Any]:
+        """取得此分詞器和語言的抑制表"""
+        language = getattr(tokenizer, "language", None)
+        cache_key = (id(tokenizer), language)
+        with self._lock:
+            tables = self._tables.get(cache_key)
+            if tables is None:
+                blocked = self.build_table(tokenizer, self.blocked_phrases)
+                biased = self.build_table(tokenizer, self.biased_phrases.get(language, []))
+                starts = set()
+                for phrase in (self.blocked_phrases if self.bias_blocked_starts else []):
+                    for text in (phrase, " " + phrase):
+                        tokens = tokenizer.encode(text)
+                        if len(tokens) > 1:
+                            starts.add(tokens[0])
+                tables = {
+                    # 單一 token 的片語沒有前綴，任何位置都直接禁止
+                    "blocked_tokens": blocked.pop((), set()),
+                    "blocked": blocked,
+                    "blocked_lengths": sorted({len(prefix) for prefix in blocked}),
+                    "blocked_starts": starts,
+                    "biased": biased,
+                }
+                self._tables[cache_key] = tables
+            return tables
+
+    def begin_task(self, tokenizer, sample_begin: int, sample_len: int) -> Dict[str, Any]:
+        """建立單次解碼的抑制狀態"""
+        with self._lock:
+            self.stats["windows"] += 1
+        state = dict(self.tables(tokenizer))
+        state["eot"] = tokenizer.eot
+        state["sample_begin"] = sample_begin
+        return state
+
+    def apply(self, logits, tokens, state: Dict[str, Any]):
+        """依已產生的 token 禁止片語、在片語前綴後結束片段，或降低片段開頭短語的分數"""
+        eot = state["eot"]
+        blocked_table = state["blocked"]
+        blocked_tokens = list(state["blocked_tokens"])
+        blocked_starts = state["blocked_starts"]
+        biased_table = state["biased"]
+        blocked_count = truncated_count = biased_count = 0
+        for row, sequence in enumerate(tokens[:, state["sample_begin"]:].tolist()):
+            if sequence and sequence[-1] == eot:
+                continue
+            if blocked_tokens:
+                # 只統計原本會選中的情況，作為實際避免產生的次數
+                if int(logits[row].argmax()) in state["blocked_tokens"]:
+                    blocked_count += 1
+                logits[row, blocked_tokens] = -float("inf")
+
+            if any(length <= len(sequence) and tuple(sequence[len(sequence) - length:]) in blocked_table
+                   for length in state["blocked_lengths"]):
+                # 已輸出完整的禁止片語前綴：不再允許文字 token，片段在前綴處結束
+                if int(logits[row].argmax()) < eot:
+                    truncated_count += 1
+                logits[row, :eot] = -float("inf")
+                continue
+
+            if biased_table or blocked_starts:
+                # 片段開頭：最後一個時間戳 token（或解碼起點）之後的文字
+                start = 0
+                for index in range(len(sequence) - 1, -1, -1):
+                    if sequence[index] > eot:
+                        start = index + 1
+                        break
+                biased = set(biased_table.get(tuple(sequence[start:]), set()))
+                if start == len(sequence):
+                    biased |= blocked_starts
+                if biased:
+                    if int(logits[row].argmax()) in biased:
+                        biased_count += 1
+                    logits[row, list(biased)] += self.phrase_bias
+        if blocked_count or truncated_count or biased_count:
+            with self._lock:
+                self.stats["blocked"] += blocked_count
+                self.stats["truncated"] += truncated_count
+                self.stats["biased"] += biased_count
+
+    def strip_truncated(self, text: str) -> str:
+        """刪除片段結尾被截斷的禁止片語（見 strip_truncated_phrases）"""
+        return strip_truncated_phrases(text, self.blocked_phrases)
+
+    def merge_stats(self, stats: Dict[str, Any]):
+        """加入其他程序（分段平行轉錄的工作程序）的統計"""
+        with self._lock:
+            for key, value in stats.items():
+                if key in self.stats:
+                    self.stats[key] += value
+
+    def get_stats(self) -> Dict[str, Any]:
+        """取得抑制統計（blocked / truncated / biased 為原本會產生片語或接續前綴的解碼步數）"""
+        with self._lock:
+            return dict(self.stats)
+
+
+def strip_truncated_phrases(text: str, phrases: List[str]) -> str:
+    """
+    刪除片段結尾被截斷的片語
+
+    PhraseSuppressor 在禁止片語完成前結束片段，留下「初音ミ」、「Music」這類前綴；
+    原本的片語連同其後內容都會被後處理刪除，因此結尾的前綴（至少兩個字元，從詞首開始）一律刪除，
+    整段只有前綴時返回空字串。
+
+    Args:
+        text: 片段文字
+        phrases: 禁止的片語
+
+    Returns:
+        刪除結尾前綴後的文字
+    """
+    stripped = text.strip()
+    for phrase in phrases:
+        for length in range(len(phrase) - 1, 1, -1):
+            prefix = phrase[:length].rstrip()
+            if len(prefix) < 2 or not stripped.endswith(prefix):
+                continue
+            head = stripped[:len(stripped) - len(prefix)]
+            if not head.strip():
+                return ""
+            # 拉丁字母的前綴必須從詞首開始（「Musical」結尾的「cal」不算）
+            if not (head[-1].isascii() and head[-1].isalnum()):
+                return head.rstrip()
+    return text
+
+
+def _guarded_task_class():
+    """建立加上解碼檢查的 DecodingTask（延遲匯入 whisper）"""
+    from whisper.decoding import DecodingTask, LogitFilter
+
+    class GuardFilter(LogitFilter):
+        """把檢查器包成 Whisper 的 logit 過濾器（每次解碼一個實例，保存該次的狀態）"""
+
+        def __init__(self, guard, tokenizer, sample_begin: int, sample_len: int):
+            self.guard = guard
+            self.state = guard.begin_task(tokenizer, sample_begin, sample_len)
+
+        def apply(self, logits, tokens):
+            self.guard.apply(logits, tokens, self.state)
+
+    class GuardedDecodingTask(DecodingTask):
+        def __init__(self, model, options):
+            super().__init__(model, options)
+            for guard in active_guards(model):
+                self.logit_filters.append(GuardFilter(guard, self.tokenizer, self.sample_begin, self.sample_len))
+
+    return GuardedDecodingTask
+
+
+_INSTALL_LOCK = threading.Lock()
+
+# 每個執行緒目前使用的檢查器（id(模型) -> 檢查器列表），只在 decoding_guards 的範圍內有效
+_ACTIVE = threading.local()
+
+
+def _install_guarded_task():
+    """第一次使用時以加上檢查的版本取代 whisper.decoding.DecodingTask"""
+    import whisper.decoding
+
+    with _INSTALL_LOCK:
+        if not getattr(whisper.decoding.DecodingTask, "_loop_guarded", False):
+            task_class = _guarded_task_class()
+            task_class._loop_guarded = True
+            whisper.decoding.DecodingTask = task_class
+
+
+def active_guards(model) -> List[Any]:
+    """目前執行緒在此模型上使用的檢查器"""
+    return getattr(_ACTIVE, "guards", {}).get(id(model), [])
+
+
+@contextmanager
+def decoding_guards(model, guards: List[Any]):
+    """
+    在此範圍內為目前執行緒的模型解碼加上檢查器（DecodingGuard、PhraseSuppressor）
+
+    檢查器只對進入範圍的執行緒有效，離開時恢復原本的設定；共用模型登錄表中的模型不會
+    留下前一個工作的檢查器，同時使用同一個模型的其他執行緒也不受影響。
+    沒有使用檢查器的解碼方式不變。
+    """
+    guards = [guard for guard in guards if guard is not None]
+    if guards:
+        _install_guarded_task()
+    active = getattr(_ACTIVE, "guards", None)
+    if active is None:
+        active = _ACTIVE.guards = {}
+    key = id(model)
+    previous = active.get(key)
+    active[key] = guards
+    try:
+        yield guards
+    finally:
+        if previous is None:
+            active.pop(key, None)
+        else:
+            active[key] = previous
@@ -0,0 +1,345 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+編碼器輸出共用
+同一個 30 秒時間窗的編碼器輸出與溫度、beam size、best_of 無關，
+但 model.transcribe 的溫度回退和多次通過轉錄的每個溫度都會重新執行編碼器。
+這裡把編碼器包一層以 mel 內容為鍵的快取，相同時間窗的後續解碼直接使用第一次的輸出。
+快取的輸出保存在 CPU 記憶體（不佔用 GPU 顯示記憶體），命中時再移到模型的設備。
+另可啟用磁碟快取（fp16 記憶體映射檔），之後調整解碼參數重新轉錄同一個檔案時完全不需要執行編碼器
+"""
+
+import os
+import sys
+import time
+import hashlib
+import argparse
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Any, Optional
+
+# 預設快取大小上限（MB，CPU 記憶體）；large 模型每個時間窗的輸出約 7.5 MB (1500 x 1280 x float32)
+DEFAULT_MAX_SIZE_MB = 512
+
+# 預設磁碟快取位置和大小上限（MB）；fp16 保存，large 模型每個時間窗約 3.7 MB
+DEFAULT_STORE_DIR = os.path.expanduser("~/.cache/aisub/encoder")
+DEFAULT_STORE_SIZE_MB = 4096
+
+
+class EncoderFeatureStore:
+    """
+    編碼器輸出的磁碟快取
+
+    每個模型一個子目錄，每個時間窗（以 mel 內容雜湊為鍵，mel 由音訊內容決定）保存為一個
+    fp16 的 .npy 檔案，讀取時以記憶體映射開啟。命中時更新修改時間，超過大小上限時依
+    最近最少使用 (LRU) 順序刪除。
+    """
+
+    def __init__(self, namespace: str, store_dir: Optional[str] = None,
+                 max_size_mb: float = DEFAULT_STORE_SIZE_MB):
+        """
+        Args:
+            namespace: 模型識別（模型名稱，量化模型另外加上後綴）
+            store_dir: 快取根目錄
+            max_size_mb: 所有模型合計的大小上限（MB）
+        """
+        self.namespace = namespace
+        self.store_dir = store_dir or DEFAULT_STORE_DIR
+        self.max_size_mb = max_size_mb
+        self._lock = threading.Lock()
+
+    def entry_path(self, key: str) -> str:
+        """取得快取檔案路徑"""
+        return os.path.join(self.store_dir, self.namespace, f"{key}.npy")
+
+    def get(self, key: str, like):
+        """
+        讀取編碼器輸出
+
+        Args:
+            key: 時間窗的快取鍵
+            like: 編碼器的輸入 mel（決定返回的設備和型別）
+
+        Returns:
+            編碼器輸出的 tensor，不存在或損壞時為 None
+        """
+        import numpy as np
+        import torch
+
+        path = self.entry_path(key)
+        try:
+            # copy-on-write 映射：torch 可直接使用且不會寫回檔案
+            features = np.load(path, mmap_mode="c")
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError):
+            self._remove(path)
+            return None
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return torch.from_numpy(features).to(device=like.device, dtype=like.dtype)
+
+    def put(self, key: str, features):
+        """以 fp16 保存編碼器輸出（先寫暫存檔再改名，中斷時不會留下不完整的檔案）"""
+        import numpy as np
+
+        path = self.entry_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(temp_path, 'wb') as f:
+                np.save(f, features.detach().to("cpu").half().numpy())
+            os.replace(temp_path, path)
+        except OSError:
+            pass
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    def _remove(self, path: str) -> int:
+        try:
+            size = os.path.getsize(path)
+            os.remove(path)
+            return size
+        except OSError:
+            return 0
+
+    def entries(self) -> List[Dict[str, Any]]:
+        """列出所有模型的快取項目（依最近使用時間由舊到新）"""
+        entries = []
+        if not os.path.isdir(self.store_dir):
+            return entries
+        for namespace in os.listdir(self.store_dir):
+            directory = os.path.join(self.store_dir, namespace)
+            if not os.path.isdir(directory):
+                continue
+            for name in os.listdir(directory):
+                if not name.endswith(".npy"):
+                    continue
+                path = os.path.join(directory, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                entries.append({"namespace": namespace, "path": path,
+                                "size": stat.st_size, "last_used": stat.st_mtime})
+        entries.sort(key=lambda entry: entry["last_used"])
+        return entries
+
+    def evict(self, max_size_mb: Optional[float] = None) -> int:
+        """
+        刪除最久未使用的項目直到總大小低於上限
+
+        Returns:
+            刪除的項目數
+        """
+        limit = (self.max_size_mb if max_size_mb is None else max_size_mb) * 1024 * 1024
+        with self._lock:
+            entries = self.entries()
+            total = sum(entry["size"] for entry in entries)
+            removed = 0
+            for entry in entries:
+                if total <= limit:
+                    break
+                total -= self._remove(entry["path"])
+                removed += 1
+        return removed
+
+    def clear(self) -> int:
+        """清除所有快取項目，返回刪除的項目數"""
+        with self._lock:
+            entries = self.entries()
+            for entry in entries:
+                self._remove(entry["path"])
+        return len(entries)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """取得快取統計"""
+        entries = self.entries()
+        models: Dict[str, int] = {}
+        for entry in entries:
+            models[entry["namespace"]] = models.get(entry["namespace"], 0) + 1
+        return {
+            "store_dir": self.store_dir,
+            "entries": len(entries),
+            "models": models,
+            "size_mb": round(sum(entry["size"] for entry in entries) / (1024 * 1024), 2),
+            "max_size_mb": self.max_size_mb,
+            "oldest": entries[0]["last_used"] if entries else None,
+            "newest": entries[-1]["last_used"] if entries else None,
+        }
+
+
+class EncoderFeatureCache:
+    """
+    編碼器輸出的記憶體快取
+
+    以 attach_encoder_cache 安裝到模型的編碼器上，之後 whisper.decode、detect_language
+    和字詞時間戳對齊的編碼器呼叫都會先查快取。超過大小上限時依最近最少使用 (LRU) 順序淘汰。
+    輸出以 CPU tensor 保存，GPU 模型命中時複製回 GPU（遠比重新編碼快，且不增加顯示記憶體用量）。
+    """
+
+    def __init__(self, encoder, max_size_mb: float = DEFAULT_MAX_SIZE_MB,
+                 store: Optional[EncoderFeatureStore] = None):
+        """
+        Args:
+            encoder: Whisper 模型的 AudioEncoder
+            max_size_mb: 快取大小上限（MB），0 表示不快取
+            store: 磁碟快取（None 表示只使用記憶體）
+        """
+        self.encoder = encoder
+        self.max_size_mb = max_size_mb
+        self.store = store
+        self._encode = type(encoder).forward.__get__(encoder)
+        self._entries: "OrderedDict[str, Any]" = OrderedDict()
+        self._size_bytes = 0
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "disk_hits": 0, "misses": 0}
+
+    @staticmethod
+    def make_key(mel) -> str:
+        """以 mel 的形狀、型別和內容建立快取鍵"""
+        digest = hashlib.blake2b(digest_size=16)
+        digest.update(f"{tuple(mel.shape)}:{mel.dtype}".encode("utf-8"))
+        digest.update(mel.detach().contiguous().cpu().numpy().tobytes())
+        return digest.hexdigest()
+
+    def forward(self, mel):
+        """取代 AudioEncoder.forward：命中時返回快取的輸出，否則執行編碼器並保存"""
+        if self.max_size_mb <= 0 and self.store is None:
+            return self._encode(mel)
+
+        key = self.make_key(mel)
+        with self._lock:
+            features = self._entries.get(key)
+            if features is not None:
+                self._entries.move_to_end(key)
+                self.stats["hits"] += 1
+        if features is not None:
+            return features.to(device=mel.device)
+
+        features = self.store.get(key, like=mel) if self.store is not None else None
+        if features is not None:
+            counter = "disk_hits"
+        else:
+            counter = "misses"
+            features = self._encode(mel)
+            if self.store is not None:
+                self.store.put(key, features)
+
+        size = features.numel() * features.element_size()
+        with self._lock:
+            self.stats[counter] += 1
+            store_entry = key not in self._entries and size <= self.max_size_mb * 1024 * 1024
+        if store_entry:
+            # 在鎖外複製到 CPU（GPU 同步和複製可能需要一些時間）
+            cpu_features = features.detach().to("cpu")
+            with self._lock:
+                if key not in self._entries:
+                    self._entries[key] = cpu_features
+                    self._size_bytes += size
+                while self._size_bytes > self.max_size_mb * 1024 * 1024:
+                    _, evicted = self._entries.popitem(last=False)
+                    self._size_bytes -= evicted.numel() * evicted.element_size()
+        return features
+
+    def clear(self):
+        """清除快取的輸出（統計保留）"""
+        with self._lock:
+            self._entries.clear()
+            self._size_bytes = 0
+
+    def reset_stats(self):
+        """重設命中統計"""
+        with self._lock:
+            self.stats = {"hits": 0, "disk_hits": 0, "misses": 0}
+
+    def get_stats(self) -> Dict[str, Any]:
+        """取得命中統計"""
+        with self._lock:
+            reused = self.stats["hits"] + self.stats["disk_hits"]
+            total = reused + self.stats["misses"]
+            return {
+                "hits": self.stats["hits"],
+                "disk_hits": self.stats["disk_hits"],
+                "misses": self.stats["misses"],
+                "hit_rate": round(reused / total, 3) if total else 0.0,
+                "cached_mb": round(self._size_bytes / (1024 * 1024), 1),
+            }
+
+
+def attach_encoder_cache(model, max_size_mb: float = DEFAULT_MAX_SIZE_MB,
+                         store: Optional[EncoderFeatureStore] = None) -> EncoderFeatureCache:
+    """
+    在模型的編碼器安裝輸出快取（已安裝時只更新大小上限和磁碟快取）
+
+    Args:
+        model: Whisper 模型
+        max_size_mb: 記憶體快取大小上限（MB）
+        store: 磁碟快取（None 表示只使用記憶體）
+
+    Returns:
+        安裝的 EncoderFeatureCache
+    """
+    cache = get_encoder_cache(model)
+    if cache is None:
+        cache = EncoderFeatureCache(model.encoder, max_size_mb, store)
+        # 以實例屬性覆蓋 forward，nn.Module.__call__ 會呼叫它
+        model.encoder.forward = cache.forward
+        model.encoder._feature_cache = cache
+    else:
+        cache.max_size_mb = max_size_mb
+        cache.store = store
+    return cache
+
+
+def detach_encoder_cache(model) -> Optional[EncoderFeatureCache]:
+    """移除模型編碼器上的輸出快取（不會重新解碼時間窗的轉錄不需要為每個 mel 計算雜湊）"""
+    cache = get_encoder_cache(model)
+    if cache is not None:
+        cache.clear()
+        del model.encoder.forward
+        del model.encoder._feature_cache
+    return cache
+
+
+def get_encoder_cache(model) -> Optional[EncoderFeatureCache]:
+    """取得模型已安裝的編碼器快取"""
+    return getattr(model.encoder, "_feature_cache", None)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="編碼器輸出磁碟快取管理")
+    parser.add_argument("--store-dir", default=None, help="快取目錄")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    subparsers.add_parser("stats", help="顯示快取統計")
+    evict_parser = subparsers.add_parser("evict", help="淘汰最久未使用的項目")
+    evict_parser.add_argument("--max-size-mb", type=float, default=DEFAULT_STORE_SIZE_MB, help="大小上限（MB）")
+    subparsers.add_parser("clear", help="清除所有快取項目")
+
+    args = parser.parse_args()
+    store = EncoderFeatureStore("", args.store_dir)
+
+    if args.command == "stats":
+        stats = store.get_stats()
+        print(f"📁 快取目錄: {stats['store_dir']}")
+        print(f"📦 時間窗: {stats['entries']}, 大小: {stats['size_mb']:.1f}/{stats['max_size_mb']} MB")
+        for namespace, count in sorted(stats["models"].items()):
+            print(f"   {namespace}: {count} 個時間窗")
+        for label, timestamp in (("最舊", stats["oldest"]), ("最新", stats["newest"])):
+            if timestamp:
+                print(f"🕒 {label}使用時間: {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(timestamp))}")
+    elif args.command == "evict":
+        removed = store.evict(args.max_size_mb)
+        print(f"🧹 已淘汰 {removed} 個項目")
+    elif args.command == "clear":
+        removed = store.clear()
+        print(f"🧹 已清除 {removed} 個項目")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+多窗口語言偵測
+從整個檔案平均取樣多個 30 秒時間窗，一次批次送進編碼器後投票決定語言，
+之後所有轉錄次數固定使用這個語言，不再每次重新偵測
+"""
+
+import warnings
+from typing import Dict, List, Any, Optional, Callable
+
+import numpy as np
+
+# Whisper 使用的取樣率和解碼窗長度
+SAMPLE_RATE = 16000
+WINDOW_SECONDS = 30.0
+
+# 預設取樣的時間窗數
+DEFAULT_WINDOWS = 5
+
+# 低於此能量 (dBFS) 的時間窗視為靜音，不參與投票
+SILENCE_DB = -50.0
+
+
+def window_starts(duration: float,
+                  windows: int = DEFAULT_WINDOWS,
+                  speech_regions: Optional[List[Dict[str, float]]] = None) -> List[float]:
+    """
+    決定取樣時間窗的起點（秒）
+
+    有 VAD 區段時在「有聲音的時間」上平均分佈，避免取到前奏或長段靜音
+
+    Args:
+        duration: 音訊長度（秒）
+        windows: 時間窗數
+        speech_regions: VAD 偵測到的有聲區段
+
+    Returns:
+        時間窗起點列表
+    """
+    if duration <= WINDOW_SECONDS or windows <= 1:
+        return [0.0]
+
+    if speech_regions:
+        speech_total = sum(region["end"] - region["start"] for region in speech_regions)
+        starts = []
+        for i in range(windows):
+            target = speech_total * (i + 0.5) / windows
+            for region in speech_regions:
+                length = region["end"] - region["start"]
+                if target <= length:
+                    center = region["start"] + target
+                    break
+                target -= length
+            else:
+                center = speech_regions[-1]["end"]
+            starts.append(min(max(0.0, center - WINDOW_SECONDS / 2), duration - WINDOW_SECONDS))
+    else:
+        span = duration - WINDOW_SECONDS
+        starts = [span * (i + 0.5) / windows for i in range(windows)]
+
+    # 短音訊的時間窗會重疊，去除重複的起點
+    unique = []
+    for start in starts:
+        if not unique or start - unique[-1] >= 1.0:
+            unique.append(start)
+    return unique
+
+
+def detect_language(model,
+                    audio,
+                    windows: int = DEFAULT_WINDOWS,
+                    speech_regions: Optional[List[Dict[str, float]]] = None,
+                    log: Optional[Callable[[str], None]] = None) -> Dict[str, Any]:
+    """
+    以多個時間窗投票偵測語言
+
+    每個時間窗的語言機率相加後取最高者，比單看第一個 30 秒穩定（例如日英混合的歌曲）
+
+    Args:
+        model: Whisper 模型
+        audio: 16kHz 單聲道 PCM
+        windows: 取樣的時間窗數
+        speech_regions: VAD 偵測到的有聲區段
+        log: 日誌函數
+
+    Returns:
+        包含 language、confidence、votes（各語言勝出的時間窗數）和 windows 的字典
+    """
+    import torch
+    from whisper.audio import N_FRAMES, N_SAMPLES, log_mel_spectrogram, pad_or_trim
+
+    log = log or print
+    if not model.is_multilingual:
+        return {"language": "en", "confidence": 1.0, "votes": {}, "windows": 0}
+
+    duration = len(audio) / SAMPLE_RATE
+    clips = []
+    for start in window_starts(duration, windows, speech_regions):
+        offset = int(start * SAMPLE_RATE)
+        clip = np.asarray(audio[offset:offset + N_SAMPLES], dtype=np.float32)
+        if len(clip) == 0:
+            continue
+        rms_db = 20 * np.log10(np.sqrt(np.mean(clip * clip)) + 1e-10)
+        clips.append((rms_db, clip))
+
+    # 只用有聲音的時間窗投票；全部都很安靜時仍使用全部時間窗
+    voiced = [clip for rms_db, clip in clips if rms_db > SILENCE_DB]
+    clips = voiced or [clip for _, clip in clips]
+    if not clips:
+        return {"language": None, "confidence": 0.0, "votes": {}, "windows": 0}
+
+    # 所有時間窗合成一個批次，只需一次編碼器前向計算
+    mel = torch.stack([pad_or_trim(log_mel_spectrogram(clip, model.dims.n_mels), N_FRAMES) for clip in clips])
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        _, probs = model.detect_language(mel.to(model.device))
+
+    totals: Dict[str, float] = {}
+    votes: Dict[str, int] = {}
+    for window_probs in probs:
+        for code, prob in window_probs.items():
+            totals[code] = totals.get(code, 0.0) + prob
+        top = max(window_probs, key=window_probs.get)
+        votes[top] = votes.get(top, 0) + 1
+
+    language = max(totals, key=totals.get)
+    confidence = totals[language] / len(probs)
+    log(f"🌍 語言偵測: {language} (信心 {confidence:.2f}, 投票 {votes}, {len(probs)} 個時間窗)")
+    return {
+        "language": language,
+        "confidence": round(confidence, 3),
+        "votes": votes,
+        "windows": len(probs),
+    }
@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+CPU int8 動態量化
+將 Whisper 模型的線性層轉換為 int8 動態量化版本，並把量化後的模型保存在磁碟上，
+之後載入時不需要再次量化
+"""
+
+import os
+import json
+import time
+import warnings
+from typing import Dict, Any, Optional, Callable
+
+# 預設快取位置（與音訊快取 ~/.cache/aisub/audio 並列）
+DEFAULT_CACHE_DIR = os.path.expanduser("~/.cache/aisub/models")
+
+
+def whisper_checkpoint_path(name: str, download_root: Optional[str] = None) -> Optional[str]:
+    """取得 Whisper 原始檢查點的路徑（與 whisper.load_model 的下載位置一致）"""
+    import whisper
+
+    if os.path.isfile(name):
+        return name
+    if name not in whisper._MODELS:
+        return None
+    if download_root is None:
+        default = os.path.join(os.path.expanduser("~"), ".cache")
+        download_root = os.path.join(os.getenv("XDG_CACHE_HOME", default), "whisper")
+    return os.path.join(download_root, os.path.basename(whisper._MODELS[name]))
+
+
+def quantize_model(model):
+    """
+    對模型的線性層套用 int8 動態量化（只適用於 CPU）
+
+    Whisper 的 Linear 是 nn.Linear 的子類別，quantize_dynamic 只比對確切型別，
+    因此先把類別換回 nn.Linear（兩者的參數完全相同）。
+    """
+    import torch
+    from torch import nn
+
+    model = model.cpu().float()
+    for module in model.modules():
+        if isinstance(module, nn.Linear) and type(module) is not nn.Linear:
+            module.__class__ = nn.Linear
+    return torch.quantization.quantize_dynamic(model, {nn.Linear}, dtype=torch.qint8)
+
+
+class QuantizedModelCache:
+    """量化後模型的磁碟快取"""
+
+    def __init__(self, cache_dir: Optional[str] = None):
+        self.cache_dir = cache_dir or DEFAULT_CACHE_DIR
+
+    def model_path(self, name: str) -> str:
+        """取得量化模型檔案路徑"""
+        safe_name = os.path.basename(name).replace(".pt", "")
+        return os.path.join(self.cache_dir, f"{safe_name}-int8.pt")
+
+    def source_fingerprint(self, name: str, download_root: Optional[str] = None) -> Dict[str, Any]:
+        """原始檢查點與 torch 版本，任一項改變時量化模型需要重建"""
+        import torch
+
+        fingerprint: Dict[str, Any] = {"model": name, "torch": torch.__version__}
+        checkpoint = whisper_checkpoint_path(name, download_root)
+        if checkpoint and os.path.exists(checkpoint):
+            stat = os.stat(checkpoint)
+            fingerprint.update(checkpoint=os.path.abspath(checkpoint),
+                               size=stat.st_size, mtime=stat.st_mtime)
+        return fingerprint
+
+    def _read_meta(self, path: str) -> Optional[Dict[str, Any]]:
+        try:
+            with open(f"{path}.json", 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def load(self,
+             name: str,
+             download_root: Optional[str] = None,
+             log: Optional[Callable[[str], None]] = None):
+        """
+        取得 int8 量化的 CPU 模型，磁碟上沒有有效的快取時才從 fp32 模型量化
+
+        Args:
+            name: 模型名稱
+            download_root: 原始模型目錄
+            log: 日誌函數
+
+        Returns:
+            量化後的 Whisper 模型
+        """
+        import torch
+
+        log = log or print
+        path = self.model_path(name)
+        fingerprint = self.source_fingerprint(name, download_root)
+
+        if os.path.exists(path) and self._read_meta(path) == fingerprint:
+            try:
+                start_time = time.time()
+                with warnings.catch_warnings():
+                    warnings.simplefilter("ignore")
+                    model = torch.load(path, map_location="cpu", weights_only=False)
+                model.eval()
+                log(f"♻️ 載入已量化的模型: {os.path.basename(path)} ({time.time() - start_time:.1f} 秒)")
+                return model
+            except Exception as e:
+                log(f"⚠️ 量化模型快取無法讀取，重新量化: {e}")
+
+        log(f"⚙️ 正在將模型 {name} 量化為 int8（每個模型只需一次）...")
+        start_time = time.time()
+        from model_verification import load_verified_model
+        model = load_verified_model(name, device="cpu", download_root=download_root, log=log)
+        model = quantize_model(model)
+        model.eval()
+        log(f"✅ 量化完成 ({time.time() - start_time:.1f} 秒)")
+
+        # 原始檢查點可能在載入時才下載，重新取得指紋
+        fingerprint = self.source_fingerprint(name, download_root)
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            torch.save(model, temp_path)
+            os.replace(temp_path, path)
+            with open(f"{path}.json", 'w', encoding='utf-8') as f:
+                json.dump(fingerprint, f, indent=2, ensure_ascii=False)
+        except Exception as e:
+            log(f"⚠️ 保存量化模型失敗（下次將重新量化）: {e}")
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+        return model
+
+
+# 全域實例
+quantized_model_cache = QuantizedModelCache()
+
+
+def load_quantized_model(name: str,
+                         download_root: Optional[str] = None,
+                         log: Optional[Callable[[str], None]] = None):
+    """
+    取得 int8 量化模型的便捷函數
+    """
+    return quantized_model_cache.load(name, download_root=download_root, log=log)
@@ -0,0 +1,257 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+已驗證模型標記
+whisper.load_model 每次載入都會讀取整個檢查點計算 SHA256（large 模型約 3 GB），
+這裡在第一次通過驗證後記錄檔案的路徑、大小和修改時間，之後檔案未改變時直接以路徑載入，
+不再重新計算雜湊。標記同時記錄每個檢查點的載入次數和載入時間
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+import warnings
+from typing import Dict, Any, Optional, Callable
+
+from model_quantization import whisper_checkpoint_path
+
+# 預設標記檔位置（與量化模型快取並列）
+DEFAULT_STAMP_PATH = os.path.expanduser("~/.cache/aisub/models/verified.json")
+
+# 標記格式版本，格式改變時舊的標記自動失效
+STAMP_VERSION = 1
+
+
+class VerifiedModelStamps:
+    """
+    已驗證檢查點的標記
+
+    以檢查點的絕對路徑為鍵，記錄驗證時的大小、修改時間和 SHA256。
+    檔案被替換或重新下載後大小或修改時間改變，標記自動失效，下次載入時重新驗證。
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        """
+        Args:
+            path: 標記檔路徑
+        """
+        self.path = path or DEFAULT_STAMP_PATH
+        self._lock = threading.Lock()
+
+    def _read(self) -> Dict[str, Any]:
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        if data.get("version") != STAMP_VERSION:
+            return {}
+        return data.get("models", {})
+
+    def _write(self, models: Dict[str, Any]):
+        """以暫存檔寫入後替換，避免中斷時留下損壞的標記檔"""
+        temp_path = f"{self.path}.{os.getpid()}.tmp"
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump({"version": STAMP_VERSION, "models": models}, f, indent=2, ensure_ascii=False)
+            os.replace(temp_path, self.path)
+        except OSError:
+            pass
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    def is_verified(self, checkpoint: str, sha256: str) -> bool:
+        """檢查點是否已驗證且驗證後未改變"""
+        try:
+            stat = os.stat(checkpoint)
+        except OSError:
+            return False
+        with self._lock:
+            stamp = self._read().get(os.path.abspath(checkpoint))
+        return (stamp is not None and stamp.get("sha256") == sha256
+                and stamp.get("size") == stat.st_size and stamp.get("mtime") == stat.st_mtime)
+
+    def mark_verified(self, checkpoint: str, sha256: str):
+        """記錄已通過 SHA256 驗證的檢查點（保留既有的載入統計）"""
+        try:
+            stat = os.stat(checkpoint)
+        except OSError:
+            return
+        key = os.path.abspath(checkpoint)
+        with self._lock:
+            models = self._read()
+            stamp = models.get(key, {})
+            stamp.update(sha256=sha256, size=stat.st_size, mtime=stat.st_mtime, verified_at=time.time())
+            models[key] = stamp
+            self._write(models)
+
+    def invalidate(self, checkpoint: str):
+        """移除標記（以路徑載入失敗時，下次改由 Whisper 重新驗證）"""
+        key = os.path.abspath(checkpoint)
+        with self._lock:
+            models = self._read()
+            if models.pop(key, None) is not None:
+                self._write(models)
+
+    def record_load(self, checkpoint: str, device: str, load_time: float, verified: bool):
+        """
+        記錄一次載入
+
+        Args:
+            checkpoint: 檢查點路徑
+            device: 載入的設備
+            load_time: 載入耗時（秒）
+            verified: 是否略過了 SHA256 驗證
+        """
+        key = os.path.abspath(checkpoint)
+        with self._lock:
+            models = self._read()
+            stamp = models.get(key)
+            if stamp is None:
+                return
+            metrics = stamp.setdefault("loads", {"count": 0, "skipped_verification": 0,
+                                                 "total_seconds": 0.0, "devices": {}})
+            metrics["count"] += 1
+            metrics["skipped_verification"] += 1 if verified else 0
+            metrics["total_seconds"] = round(metrics["total_seconds"] + load_time, 3)
+            metrics["last_seconds"] = round(load_time, 3)
+            metrics["last_loaded"] = time.time()
+            metrics["devices"][device] = metrics["devices"].get(device, 0) + 1
+            self._write(models)
+
+    def get_stamp(self, checkpoint: str) -> Optional[Dict[str, Any]]:
+        """取得檢查點的標記（檔案已改變時為 None）"""
+        try:
+            stat = os.stat(checkpoint)
+        except OSError:
+            return None
+        with self._lock:
+            stamp = self._read().get(os.path.abspath(checkpoint))
+        if stamp is None or stamp.get("size") != stat.st_size or stamp.get("mtime") != stat.st_mtime:
+            return None
+        return stamp
+
+    def get_stats(self) -> Dict[str, Any]:
+        """取得所有標記和載入統計"""
+        with self._lock:
+            models = self._read()
+        return {"stamp_path": self.path, "models": models}
+
+    def clear(self) -> int:
+        """清除所有標記，返回清除的數量"""
+        with self._lock:
+            count = len(self._read())
+            try:
+                os.remove(self.path)
+            except OSError:
+                pass
+        return count
+
+    def load_model(self,
+                   name: str,
+                   device: str = "cpu",
+                   download_root: Optional[str] = None,
+                   log: Optional[Callable[[str], None]] = None):
+        """
+        載入 Whisper 模型，已驗證且未改變的檢查點略過 SHA256 驗證
+
+        Args:
+            name: 模型名稱或檢查點路徑
+            device: 設備
+            download_root: 模型目錄
+            log: 日誌函數
+
+        Returns:
+            已載入的 Whisper 模型
+        """
+        import whisper
+
+        log = log or print
+        checkpoint = None
+        sha256 = None
+        if name in whisper._MODELS:
+            checkpoint = whisper_checkpoint_path(name, download_root)
+            # 官方下載網址的倒數第二段即為檢查點的 SHA256
+            sha256 = whisper._MODELS[name].split("/")[-2]
+
+        if checkpoint and self.is_verified(checkpoint, sha256):
+            start_time = time.time()
+            try:
+                with warnings.catch_warnings():
+                    warnings.simplefilter("ignore")
+                    model = whisper.load_model(checkpoint, device=device, download_root=download_root)
+                # 以路徑載入時不會套用該模型的對齊注意力頭，需另外設定（字詞時間戳使用）
+                model.set_alignment_heads(whisper._ALIGNMENT_HEADS[name])
+            except Exception as e:
+                log(f"⚠️ 已驗證的模型檔案無法載入，重新驗證: {e}")
+                self.invalidate(checkpoint)
+            else:
+                load_time = time.time() - start_time
+                self.record_load(checkpoint, device, load_time, verified=True)
+                log(f"✅ 模型檔案已驗證，略過 SHA256 檢查 ({load_time:.1f} 秒)")
+                return model
+
+        start_time = time.time()
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            model = whisper.load_model(name, device=device, download_root=download_root)
+        load_time = time.time() - start_time
+        if checkpoint and os.path.isfile(checkpoint):
+            # load_model 只在 SHA256 相符時才會成功返回（不符時重新下載並再次檢查）
+            self.mark_verified(checkpoint, sha256)
+            self.record_load(checkpoint, device, load_time, verified=False)
+        return model
+
+
+# 全域實例
+verified_model_stamps = VerifiedModelStamps()
+
+
+def load_verified_model(name: str,
+                        device: str = "cpu",
+                        download_root: Optional[str] = None,
+                        log: Optional[Callable[[str], None]] = None):
+    """
+    載入 Whisper 模型（略過已驗證檢查點的 SHA256 檢查）的便捷函數
+    """
+    return verified_model_stamps.load_model(name, device=device, download_root=download_root, log=log)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="已驗證模型標記管理")
+    parser.add_argument("--stamp-path", default=None, help="標記檔路徑")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    subparsers.add_parser("stats", help="顯示已驗證的模型和載入統計")
+    subparsers.add_parser("clear", help="清除所有標記（下次載入時重新驗證）")
+
+    args = parser.parse_args()
+    stamps = VerifiedModelStamps(args.stamp_path)
+
+    if args.command == "stats":
+        stats = stamps.get_stats()
+        print(f"📁 標記檔: {stats['stamp_path']}")
+        if not stats["models"]:
+            print("   (沒有已驗證的模型)")
+        for checkpoint, stamp in sorted(stats["models"].items()):
+            size_mb = stamp.get("size", 0) / (1024 * 1024)
+            verified_at = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(stamp.get("verified_at", 0)))
+            print(f"✅ {checkpoint} ({size_mb:.1f} MB, 驗證於 {verified_at})")
+            loads = stamp.get("loads")
+            if loads and loads["count"]:
+                print(f"   載入 {loads['count']} 次 (略過驗證 {loads['skipped_verification']} 次), "
+                      f"平均 {loads['total_seconds'] / loads['count']:.1f} 秒, "
+                      f"最近 {loads.get('last_seconds', 0):.1f} 秒, 設備 {loads['devices']}")
+    elif args.command == "clear":
+        removed = stamps.clear()
+        print(f"🧹 已清除 {removed} 個標記")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,433 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+分段平行轉錄（CPU）
+在安靜處切割長音訊，以多個程序同時轉錄各片段後再拼接回完整結果。
+工作程序以 fork 建立，以寫入時複製的方式共用父程序已載入的模型權重；
+不支援 fork 的平台（Windows）改在本程序依序轉錄，不會為每個程序各載入一份模型。
+fork 時父程序已有其他執行緒（GUI、torch 的 OpenMP 執行緒池），子程序只有呼叫 fork 的執行緒；
+子程序再次啟動 OpenMP 執行緒池或取用 fork 時被其他執行緒持有的鎖都可能卡住，
+因此工作程序固定只使用一個 torch 執行緒，並重建檢查器的鎖
+"""
+
+import os
+import time
+import functools
+import threading
+import warnings
+import multiprocessing
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import shared_memory
+from typing import Dict, List, Any, Optional, Callable, Iterator
+
+import numpy as np
+
+from audio_segmentation import (SAMPLE_RATE, split_audio_on_silence, stitch_chunk_results,
+                                clip_timestamps_for_range)
+from cpu_planner import JOB_OVERHEAD_MB, available_memory_mb
+from decoding_guard import active_guards, decoding_guards
+
+# 父程序在 fork 之前設定，子程序以寫入時複製的方式共用模型權重和 PCM
+_PARENT_STATE: Dict[str, Any] = {}
+
+# 每個工作程序自己的狀態
+_WORKER_STATE: Dict[str, Any] = {}
+
+# fork 出的工作程序使用的 torch 執行緒數（見模組說明）
+FORKED_TORCH_THREADS = 1
+
+
+def _attach_shared_memory(name: str) -> shared_memory.SharedMemory:
+    """附加到既有的共享記憶體（不交給子程序的資源追蹤器管理）"""
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        # Python 3.13 之前沒有 track 參數
+        return shared_memory.SharedMemory(name=name)
+
+
+def _init_worker(n_samples: int, torch_threads: int):
+    """工作程序初始化：設定執行緒數，取得 fork 時繼承的模型和共享 PCM"""
+    warnings.filterwarnings("ignore")
+    try:
+        import torch
+        torch.set_num_threads(torch_threads)
+    except ImportError:
+        pass
+
+    shm = _PARENT_STATE["shm"]
+    guards = _PARENT_STATE["guards"]
+    # fork 時其他執行緒可能正持有檢查器的鎖（同時執行的其他轉錄），子程序改用新的鎖
+    for guard in guards:
+        guard._lock = threading.Lock()
+    _WORKER_STATE["model"] = _PARENT_STATE["model"]
+    _WORKER_STATE["guards"] = guards
+    _WORKER_STATE["shm"] = shm
+    _WORKER_STATE["audio"] = np.ndarray((n_samples,), dtype=np.float32, buffer=shm.buf)
+
+
+def _with_worker_guards(function):
+    """在父程序轉錄時使用的檢查器範圍內執行（檢查器只對進入範圍的執行緒有效）"""
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        with decoding_guards(_WORKER_STATE["model"], _WORKER_STATE["guards"]):
+            return function(*args, **kwargs)
+    return wrapper
+
+
+def _guard_stats(model) -> List[Dict[str, Any]]:
+    """模型上解碼檢查器的統計（依掛上的順序）"""
+    return [guard.get_stats() for guard in active_guards(model)]
+
+
+def _guard_stats_delta(model, before: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """本次轉錄增加的檢查器統計（子程序的檢查器是父程序的副本，統計需要回傳給父程序）"""
+    return [{key: value - previous.get(key, 0) for key, value in stats.items()}
+            for stats, previous in zip(_guard_stats(model), before)]
+
+
+def _merge_guard_stats(model, deltas: Optional[List[Dict[str, Any]]]):
+    """把子程序回傳的檢查器統計加到父程序的檢查器"""
+    for guard, delta in zip(active_guards(model), deltas or []):
+        guard.merge_stats(delta)
+
+
+@_with_worker_guards
+def _transcribe_chunk(chunk: Dict[str, Any], params: Dict[str, Any]) -> Dict[str, Any]:
+    """在工作程序中轉錄單一片段"""
+    start_time = time.time()
+    model = _WORKER_STATE["model"]
+    guard_stats = _guard_stats(model)
+    audio = _WORKER_STATE["audio"][chunk["padded_start"]:chunk["padded_end"]]
+    if isinstance(params.get("clip_timestamps"), list):
+        # VAD 區段換算為相對於片段的時間
+        params = dict(params)
+        params["clip_timestamps"] = clip_timestamps_for_range(
+            params["clip_timestamps"],
+            chunk["padded_start"] / SAMPLE_RATE,
+            chunk["padded_end"] / SAMPLE_RATE)
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        result = model.transcribe(audio, **params)
+    return {
+        "chunk": chunk,
+        "segments": result.get("segments", []),
+        "language": result.get("language"),
+        "elapsed": time.time() - start_time,
+        "pid": os.getpid(),
+        "guard_stats": _guard_stats_delta(model, guard_stats),
+    }
+
+
+class _PassStopped(Exception):
+    """父程序要求停止目前的溫度"""
+
+
+@_with_worker_guards
+def _transcribe_pass(temperature: float,
+                     params: Dict[str, Any],
+                     window_seconds: Optional[float] = None,
+                     stop_name: Optional[str] = None) -> Dict[str, Any]:
+    """
+    在工作程序中以單一溫度轉錄整個音訊
+
+    提供 window_seconds 時逐窗轉錄，每個時間窗之間檢查停止旗標（共享記憶體的第一個位元組）
+    """
+    start_time = time.time()
+    model = _WORKER_STATE["model"]
+    guard_stats = _guard_stats(model)
+    audio = _WORKER_STATE["audio"]
+    if not window_seconds or stop_name is None:
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            result = model.transcribe(audio, temperature=temperature, **params)
+    else:
+        from streaming_transcriber import StreamingTranscriber
+
+        stop = _attach_shared_memory(stop_name)
+        covered = [0.0]
+
+        def check(segments, progress):
+            covered[0] = progress * len(audio) / SAMPLE_RATE
+            if stop.buf[0]:
+                raise _PassStopped()
+
+        try:
+            if stop.buf[0]:
+                raise _PassStopped()
+            transcriber = StreamingTranscriber(model, window_seconds=window_seconds, log=lambda message: None)
+            result = transcriber.transcribe(audio, dict(params, temperature=temperature), on_window=check)
+            result.pop("windowed", None)
+        except _PassStopped:
+            return {"temperature": temperature, "cancelled": True, "covered_seconds": covered[0],
+                    "elapsed": time.time() - start_time, "pid": os.getpid(),
+                    "guard_stats": _guard_stats_delta(model, guard_stats)}
+        finally:
+            stop.close()
+    return {
+        "temperature": temperature,
+        "result": result,
+        "elapsed": time.time() - start_time,
+        "pid": os.getpid(),
+        "guard_stats": _guard_stats_delta(model, guard_stats),
+    }
+
+
+def _terminate_pool(executor: ProcessPoolExecutor):
+    """不等待執行中的工作，直接結束程序池的工作程序"""
+    processes = list((getattr(executor, "_processes", None) or {}).values())
+    executor.shutdown(wait=False, cancel_futures=True)
+    for process in processes:
+        process.terminate()
+    for process in processes:
+        process.join()
+
+
+def default_worker_count() -> int:
+    """預設工作程序數：保留一個核心給 GUI 和系統"""
+    return max(1, (os.cpu_count() or 1) - 1)
+
+
+class ParallelChunkTranscriber:
+    """以程序池平行轉錄在安靜處切割的音訊片段"""
+
+    def __init__(self,
+                 model,
+                 model_name: str,
+                 download_root: Optional[str] = None,
+                 workers: Optional[int] = None,
+                 chunk_seconds: float = 120.0,
+                 overlap_seconds: float = 1.0,
+                 log: Optional[Callable[[str], None]] = None,
+                 quantize: bool = False):
+        """
+        Args:
+            model: 已載入的 CPU Whisper 模型（由 fork 的子程序共用）
+            model_name: 模型名稱
+            download_root: 模型目錄
+            workers: 工作程序數，None 或 0 表示自動
+            chunk_seconds: 目標片段長度（秒）
+            overlap_seconds: 片段前後重疊長度（秒）
+            log: 日誌函數
+            quantize: 模型為 int8 量化版本
+        """
+        self.model = model
+        self.model_name = model_name
+        self.download_root = download_root
+        self.workers = workers or default_worker_count()
+        self.chunk_seconds = chunk_seconds
+        self.overlap_seconds = overlap_seconds
+        self.log = log or print
+        self.quantize = quantize
+
+    @staticmethod
+    def can_share_model() -> bool:
+        """是否能以 fork 讓子程序共用父程序已載入的模型權重"""
+        return "fork" in multiprocessing.get_all_start_methods()
+
+    def plan_workers(self, tasks: int) -> int:
+        """
+        決定工作程序數
+
+        不支援 fork 時只使用本程序（spawn 的子程序必須各自載入完整模型）；
+        fork 時模型權重共用，每個程序另需解碼用的記憶體，依可用記憶體限制程序數
+        """
+        if not self.can_share_model():
+            self.log("ℹ️ 此平台不支援 fork，無法在程序間共用模型，改在本程序依序轉錄")
+            return 1
+        workers = max(1, min(self.workers, tasks or 1))
+        available = available_memory_mb()
+        if available > 0:
+            limit = max(1, int(available // JOB_OVERHEAD_MB))
+            if workers > limit:
+                self.log(f"ℹ️ 可用記憶體 {available:.0f} MB，工作程序數由 {workers} 限制為 {limit}")
+                workers = limit
+        return workers
+
+    @contextmanager
+    def inline_worker(self, audio: np.ndarray):
+        """在本程序直接轉錄（不支援 fork 或只需要一個程序時），檢查器統計直接累計"""
+        _WORKER_STATE["model"] = self.model
+        _WORKER_STATE["guards"] = active_guards(self.model)
+        _WORKER_STATE["audio"] = audio
+        try:
+            yield
+        finally:
+            _WORKER_STATE.clear()
+
+    @contextmanager
+    def worker_pool(self, audio: np.ndarray, workers: int, torch_threads: int):
+        """
+        建立共用模型和 PCM 的程序池（只在支援 fork 時使用）
+
+        PCM 放在共享記憶體中，子程序以寫入時複製的方式直接繼承已載入的模型
+        """
+        shm = shared_memory.SharedMemory(create=True, size=max(1, len(audio) * 4))
+        try:
+            shared_audio = np.ndarray((len(audio),), dtype=np.float32, buffer=shm.buf)
+            shared_audio[:] = audio
+
+            _PARENT_STATE["model"] = self.model
+            _PARENT_STATE["guards"] = active_guards(self.model)
+            _PARENT_STATE["shm"] = shm
+
+            try:
+                with ProcessPoolExecutor(
+                    max_workers=workers,
+                    mp_context=multiprocessing.get_context("fork"),
+                    initializer=_init_worker,
+                    initargs=(len(audio), torch_threads),
+                ) as executor:
+                    yield executor
+            finally:
+                _PARENT_STATE.clear()
+                del shared_audio
+        finally:
+            shm.close()
+            shm.unlink()
+
+    def transcribe(self, audio: np.ndarray, params: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        分段平行轉錄
+
+        Args:
+            audio: 16kHz 單聲道 PCM
+            params: 傳給 model.transcribe 的參數（含 temperature）
+
+        Returns:
+            與 model.transcribe 相同格式的結果（附帶 parallel 統計）
+        """
+        start_time = time.time()
+        chunks = split_audio_on_silence(audio, SAMPLE_RATE, self.chunk_seconds,
+                                        overlap_seconds=self.overlap_seconds)
+        if isinstance(params.get("clip_timestamps"), list):
+            # 完全沒有聲音的片段不需要送進程序池
+            chunks = [chunk for chunk in chunks
+                      if clip_timestamps_for_range(params["clip_timestamps"],
+                                                   chunk["padded_start"] / SAMPLE_RATE,
+                                                   chunk["padded_end"] / SAMPLE_RATE)]
+        workers = self.plan_workers(len(chunks))
+        torch_threads = FORKED_TORCH_THREADS if workers > 1 else (os.cpu_count() or 1)
+        self.log(f"🧩 音訊切割為 {len(chunks)} 個片段，使用 {workers} 個程序 "
+                 f"(每個程序 {torch_threads} 執行緒)")
+
+        # 第一段沒有前文可參考，各片段獨立轉錄時也不延續前文
+        params = dict(params)
+        params["condition_on_previous_text"] = False
+        params.pop("verbose", None)
+
+        chunk_results = []
+        languages = []
+
+        def collect(done: int, chunk_result: Dict[str, Any]):
+            chunk_results.append(chunk_result)
+            if chunk_result["language"]:
+                languages.append(chunk_result["language"])
+            chunk = chunk_result["chunk"]
+            self.log(f"   片段 {done}/{len(chunks)} 完成 "
+                     f"({chunk['start'] / SAMPLE_RATE:.0f}s-{chunk['end'] / SAMPLE_RATE:.0f}s, "
+                     f"{chunk_result['elapsed']:.1f} 秒)")
+
+        if workers == 1:
+            with self.inline_worker(audio):
+                for done, chunk in enumerate(chunks, 1):
+                    collect(done, _transcribe_chunk(chunk, params))
+        else:
+            with self.worker_pool(audio, workers, torch_threads) as executor:
+                futures = [executor.submit(_transcribe_chunk, chunk, params) for chunk in chunks]
+                for done, future in enumerate(as_completed(futures), 1):
+                    chunk_result = future.result()
+                    _merge_guard_stats(self.model, chunk_result["guard_stats"])
+                    collect(done, chunk_result)
+
+        segments = stitch_chunk_results(chunk_results)
+        elapsed = time.time() - start_time
+        audio_seconds = len(audio) / SAMPLE_RATE
+        chunk_seconds_total = sum(r["elapsed"] for r in chunk_results)
+
+        return {
+            "text": "".join(segment.get("text", "") for segment in segments),
+            "segments": segments,
+            "language": max(set(languages), key=languages.count) if languages else None,
+            "parallel": {
+                "chunks": len(chunks),
+                "workers": workers,
+                "torch_threads": torch_threads,
+                "wall_time": round(elapsed, 3),
+                "chunk_time_total": round(chunk_seconds_total, 3),
+                "audio_seconds": round(audio_seconds, 2),
+                "real_time_factor": elapsed / audio_seconds if audio_seconds > 0 else 0.0,
+            },
+        }
+
+
+class ParallelTemperatureTranscriber(ParallelChunkTranscriber):
+    """以程序池同時執行多次通過轉錄的各個溫度（每個程序轉錄整個音訊）"""
+
+    def run_passes(self,
+                   audio: np.ndarray,
+                   params: Dict[str, Any],
+                   temperatures: List[float],
+                   window_seconds: Optional[float] = None) -> Iterator[Dict[str, Any]]:
+        """
+        同時以多個溫度轉錄，依完成順序逐一返回
+
+        呼叫端提前結束迭代時（已有足夠好的結果），尚未開始的溫度直接取消，
+        逐窗轉錄中的溫度在目前的時間窗完成後停止，整段轉錄中的溫度直接結束工作程序
+
+        Args:
+            audio: 16kHz 單聲道 PCM
+            params: 傳給 model.transcribe 的參數（不含 temperature）
+            temperatures: 溫度列表
+            window_seconds: 逐窗轉錄的時間窗長度（None 表示每個溫度一次轉錄整個音訊，
+                            提前結束迭代時直接結束仍在執行的工作程序）
+
+        Yields:
+            {"temperature", "result", "elapsed"}；單一溫度失敗時為 {"temperature", "error"}，不影響其他溫度
+        """
+        workers = self.plan_workers(len(temperatures))
+        torch_threads = FORKED_TORCH_THREADS if workers > 1 else (os.cpu_count() or 1)
+        self.log(f"🧩 同時執行 {len(temperatures)} 個溫度，使用 {workers} 個程序 "
+                 f"(每個程序 {torch_threads} 執行緒)")
+
+        params = dict(params)
+        params.pop("verbose", None)
+        if workers == 1:
+            # 依序執行；呼叫端提前結束迭代時其餘溫度不會開始
+            with self.inline_worker(audio):
+                for temp in temperatures:
+                    try:
+                        outcome = _transcribe_pass(temp, params)
+                        outcome.pop("guard_stats", None)
+                    except Exception as e:
+                        outcome = {"temperature": temp, "error": str(e)}
+                    yield outcome
+            return
+
+        stop = shared_memory.SharedMemory(create=True, size=1)
+        stop.buf[0] = 0
+        try:
+            with self.worker_pool(audio, workers, torch_threads) as executor:
+                futures = {executor.submit(_transcribe_pass, temp, params, window_seconds, stop.name): temp
+                           for temp in temperatures}
+                try:
+                    for future in as_completed(futures):
+                        try:
+                            outcome = future.result()
+                        except Exception as e:
+                            outcome = {"temperature": futures[future], "error": str(e)}
+                        else:
+                            _merge_guard_stats(self.model, outcome.pop("guard_stats", None))
+                        yield outcome
+                finally:
+                    stop.buf[0] = 1
+                    for future in futures:
+                        future.cancel()
+                    if not window_seconds and not all(future.done() for future in futures):
+                        # 整段轉錄中的溫度無法在時間窗之間停止，直接結束工作程序而不等待
+                        _terminate_pool(executor)
+        finally:
+            stop.close()
+            stop.unlink()
@@ -0,0 +1,249 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+轉錄結果快取
+以「音訊內容雜湊 + 模型 + 解碼參數」為鍵保存 model.transcribe 的原始結果，
+只調整後處理設定（過濾重複、合併短片段、內容類型）重新產生字幕時不需要再次解碼
+"""
+
+import os
+import sys
+import gzip
+import json
+import time
+import hashlib
+import argparse
+import threading
+from typing import Dict, List, Any, Optional
+
+# 預設快取位置（與音訊快取 ~/.cache/aisub/audio 並列）
+DEFAULT_CACHE_DIR = os.path.expanduser("~/.cache/aisub/results")
+
+# 預設快取大小上限（MB）
+DEFAULT_MAX_SIZE_MB = 512
+
+# 結果格式版本，格式改變時舊的快取自動失效
+CACHE_VERSION = 1
+
+
+def _to_json(value):
+    """將 numpy 型別轉換為 JSON 可序列化的值（不需要匯入 numpy）"""
+    if hasattr(value, "tolist"):
+        return value.tolist()
+    return str(value)
+
+
+class TranscriptionResultCache:
+    """
+    model.transcribe 原始結果的磁碟快取
+
+    每個結果保存為一個 gzip 壓縮的 JSON 檔案，命中時更新修改時間，
+    超過大小上限時依最近最少使用 (LRU) 順序刪除。
+    """
+
+    def __init__(self, cache_dir: Optional[str] = None, max_size_mb: float = DEFAULT_MAX_SIZE_MB):
+        self.cache_dir = cache_dir or DEFAULT_CACHE_DIR
+        self.max_size_mb = max_size_mb
+        self._lock = threading.RLock()
+
+    @staticmethod
+    def make_key(audio_hash: str, model_name: str, params: Dict[str, Any], **extra: Any) -> str:
+        """
+        建立快取鍵
+
+        Args:
+            audio_hash: 音訊內容雜湊
+            model_name: 模型名稱
+            params: 解碼參數（optimize_whisper_params 的結果，含 clip_timestamps）
+            **extra: 其他會影響解碼結果的設定（設備、解碼方式等）
+        """
+        material = {
+            "version": CACHE_VERSION,
+            "audio": audio_hash,
+            "model": model_name,
+            "params": {k: v for k, v in params.items() if k != "verbose"},
+            "extra": extra,
+        }
+        encoded = json.dumps(material, sort_keys=True, ensure_ascii=False, default=_to_json)
+        return hashlib.blake2b(encoded.encode("utf-8"), digest_size=20).hexdigest()
+
+    def entry_path(self, key: str) -> str:
+        """取得快取檔案路徑"""
+        return os.path.join(self.cache_dir, f"{key}.json.gz")
+
+    def stats_path(self) -> str:
+        """取得累計統計檔案路徑"""
+        return os.path.join(self.cache_dir, "stats.json")
+
+    def _load_counters(self) -> Dict[str, int]:
+        try:
+            with open(self.stats_path(), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {"hits": 0, "misses": 0, "stores": 0, "evictions": 0}
+
+    def _bump(self, name: str, amount: int = 1):
+        """更新累計統計（跨程序保留，供 stats 指令顯示）"""
+        with self._lock:
+            counters = self._load_counters()
+            counters[name] = counters.get(name, 0) + amount
+            try:
+                os.makedirs(self.cache_dir, exist_ok=True)
+                temp_path = f"{self.stats_path()}.{os.getpid()}.tmp"
+                with open(temp_path, 'w', encoding='utf-8') as f:
+                    json.dump(counters, f)
+                os.replace(temp_path, self.stats_path())
+            except OSError:
+                pass
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """讀取快取結果，不存在或損壞時返回 None"""
+        path = self.entry_path(key)
+        try:
+            with gzip.open(path, 'rt', encoding='utf-8') as f:
+                entry = json.load(f)
+        except FileNotFoundError:
+            self._bump("misses")
+            return None
+        except (OSError, ValueError):
+            # 寫入中斷或損壞的檔案直接丟棄
+            self._remove(path)
+            self._bump("misses")
+            return None
+
+        # 以修改時間記錄最近使用時間，作為 LRU 依據
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        self._bump("hits")
+        return entry.get("result")
+
+    def put(self, key: str, result: Dict[str, Any], meta: Optional[Dict[str, Any]] = None):
+        """保存結果，之後依大小上限淘汰舊的項目"""
+        os.makedirs(self.cache_dir, exist_ok=True)
+        path = self.entry_path(key)
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        entry = {"version": CACHE_VERSION, "created": time.time(), "meta": meta or {}, "result": result}
+        try:
+            with gzip.open(temp_path, 'wt', encoding='utf-8') as f:
+                json.dump(entry, f, ensure_ascii=False, default=_to_json)
+            os.replace(temp_path, path)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+        self._bump("stores")
+        self.evict()
+
+    def _remove(self, path: str) -> int:
+        try:
+            size = os.path.getsize(path)
+            os.remove(path)
+            return size
+        except OSError:
+            return 0
+
+    def entries(self) -> List[Dict[str, Any]]:
+        """列出快取項目（依最近使用時間由舊到新）"""
+        if not os.path.isdir(self.cache_dir):
+            return []
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith(".json.gz"):
+                continue
+            path = os.path.join(self.cache_dir, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append({"key": name[:-len(".json.gz")], "path": path,
+                            "size": stat.st_size, "last_used": stat.st_mtime})
+        entries.sort(key=lambda entry: entry["last_used"])
+        return entries
+
+    def evict(self, max_size_mb: Optional[float] = None) -> int:
+        """
+        刪除最久未使用的項目直到總大小低於上限
+
+        Returns:
+            刪除的項目數
+        """
+        limit = (self.max_size_mb if max_size_mb is None else max_size_mb) * 1024 * 1024
+        with self._lock:
+            entries = self.entries()
+            total = sum(entry["size"] for entry in entries)
+            removed = 0
+            for entry in entries:
+                if total <= limit:
+                    break
+                total -= self._remove(entry["path"])
+                removed += 1
+        if removed:
+            self._bump("evictions", removed)
+        return removed
+
+    def clear(self) -> int:
+        """清除所有快取項目，返回刪除的項目數"""
+        with self._lock:
+            entries = self.entries()
+            for entry in entries:
+                self._remove(entry["path"])
+        return len(entries)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """取得快取統計"""
+        entries = self.entries()
+        counters = self._load_counters()
+        lookups = counters.get("hits", 0) + counters.get("misses", 0)
+        return {
+            "cache_dir": self.cache_dir,
+            "entries": len(entries),
+            "size_mb": round(sum(entry["size"] for entry in entries) / (1024 * 1024), 2),
+            "max_size_mb": self.max_size_mb,
+            "hits": counters.get("hits", 0),
+            "misses": counters.get("misses", 0),
+            "stores": counters.get("stores", 0),
+            "evictions": counters.get("evictions", 0),
+            "hit_rate": counters.get("hits", 0) / lookups if lookups else 0.0,
+            "oldest": entries[0]["last_used"] if entries else None,
+            "newest": entries[-1]["last_used"] if entries else None,
+        }
+
+
+# 全域實例
+result_cache = TranscriptionResultCache()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="轉錄結果快取管理")
+    parser.add_argument("--cache-dir", default=None, help="快取目錄")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    subparsers.add_parser("stats", help="顯示快取統計")
+    evict_parser = subparsers.add_parser("evict", help="淘汰最久未使用的項目")
+    evict_parser.add_argument("--max-size-mb", type=float, default=DEFAULT_MAX_SIZE_MB, help="大小上限（MB）")
+    subparsers.add_parser("clear", help="清除所有快取項目")
+
+    args = parser.parse_args()
+    cache = TranscriptionResultCache(args.cache_dir) if args.cache_dir else result_cache
+
+    if args.command == "stats":
+        stats = cache.get_stats()
+        print(f"📁 快取目錄: {stats['cache_dir']}")
+        print(f"📦 項目: {stats['entries']}, 大小: {stats['size_mb']:.1f}/{stats['max_size_mb']} MB")
+        print(f"🎯 命中: {stats['hits']}, 未命中: {stats['misses']}, 命中率: {stats['hit_rate'] * 100:.1f}%")
+        print(f"💾 寫入: {stats['stores']}, 淘汰: {stats['evictions']}")
+        for label, timestamp in (("最舊", stats["oldest"]), ("最新", stats["newest"])):
+            if timestamp:
+                print(f"🕒 {label}使用時間: {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(timestamp))}")
+    elif args.command == "evict":
+        removed = cache.evict(args.max_size_mb)
+        print(f"🧹 已淘汰 {removed} 個項目")
+    elif args.command == "clear":
+        removed = cache.clear()
+        print(f"🧹 已清除 {removed} 個項目")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
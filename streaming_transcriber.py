@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+串流字幕輸出
+逐個時間窗轉錄，每完成一個時間窗就把後處理過的片段寫入 SRT 檔案
+"""
+
+import os
+import time
+import warnings
+from typing import Dict, List, Any, Optional, Callable
+
+import numpy as np
+
+from audio_segmentation import (SAMPLE_RATE, split_audio_on_silence, place_chunk_segments,
+                                clip_timestamps_for_range)
+
+
+def format_srt_time(seconds: float) -> str:
+    """將秒數轉換為 SRT 時間格式"""
+    hours = int(seconds // 3600)
+    minutes = int((seconds % 3600) // 60)
+    secs = int(seconds % 60)
+    millisecs = int((seconds % 1) * 1000)
+    return f"{hours:02d}:{minutes:02d}:{secs:02d},{millisecs:03d}"
+
+
+class StreamingSrtWriter:
+    """逐步寫入 SRT 字幕，每次寫入後立即 flush 讓其他程式可以讀取"""
+
+    def __init__(self,
+                 output_path: str,
+                 post_process: Optional[Callable[[List[Dict[str, Any]], List[Dict[str, Any]]], List[Dict[str, Any]]]] = None,
+                 segment_callback: Optional[Callable[[List[Dict[str, Any]], float], None]] = None):
+        """
+        Args:
+            output_path: SRT 輸出路徑
+            post_process: 後處理函數 (新片段, 已輸出的前文片段) -> 要輸出的片段
+            segment_callback: 每次輸出後呼叫 (新輸出的片段, 進度 0-1)
+        """
+        self.output_path = output_path
+        self.post_process = post_process
+        self.segment_callback = segment_callback
+        self.written_segments: List[Dict[str, Any]] = []
+        self.srt_content = ""
+        output_dir = os.path.dirname(output_path)
+        if output_dir:
+            os.makedirs(output_dir, exist_ok=True)
+        self._file = open(output_path, 'w', encoding='utf-8')
+
+    def write_segments(self, segments: List[Dict[str, Any]], progress: float = 0.0) -> List[Dict[str, Any]]:
+        """後處理並寫入一批片段，返回實際寫入的片段"""
+        if self.post_process is not None:
+            segments = self.post_process(segments, self.written_segments[-3:])
+        segments = [segment for segment in segments if segment.get("text", "").strip()]
+
+        block = ""
+        for segment in segments:
+            index = len(self.written_segments) + 1
+            block += f"{index}\n"
+            block += f"{format_srt_time(segment['start'])} --> {format_srt_time(segment['end'])}\n"
+            block += f"{segment['text'].strip()}\n\n"
+            self.written_segments.append(segment)
+
+        if block:
+            self._file.write(block)
+            self._file.flush()
+            self.srt_content += block
+
+        if self.segment_callback is not None:
+            self.segment_callback(segments, progress)
+        return segments
+
+    def close(self):
+        """關閉輸出檔案"""
+        if not self._file.closed:
+            self._file.close()
+
+
+class StreamingTranscriber:
+    """逐個時間窗轉錄並串流輸出字幕"""
+
+    def __init__(self,
+                 model,
+                 window_seconds: float = 30.0,
+                 overlap_seconds: float = 1.0,
+                 log: Optional[Callable[[str], None]] = None):
+        """
+        Args:
+            model: Whisper 模型
+            window_seconds: 每個時間窗的目標長度（在附近的安靜處切割）
+            overlap_seconds: 時間窗前後重疊長度（秒）
+            log: 日誌函數
+        """
+        self.model = model
+        self.window_seconds = window_seconds
+        self.overlap_seconds = overlap_seconds
+        self.log = log or print
+
+    def transcribe(self,
+                   audio: np.ndarray,
+                   params: Dict[str, Any],
+                   on_window: Optional[Callable[[List[Dict[str, Any]], float], None]] = None,
+                   checkpoint=None) -> Dict[str, Any]:
+        """
+        逐個時間窗轉錄
+
+        Args:
+            audio: 16kHz 單聲道 PCM
+            params: 傳給 model.transcribe 的參數（含 temperature）
+            on_window: 每個時間窗完成後呼叫 (該時間窗的片段, 進度 0-1)；從檢查點繼續時先以已完成的片段呼叫一次
+            checkpoint: TranscriptionCheckpoint，每完成一個時間窗就保存，已完成的時間窗不再轉錄
+
+        Returns:
+            與 model.transcribe 相同格式的完整結果（原始片段）
+        """
+        params = dict(params)
+        params.pop("verbose", None)
+        clip_timestamps = params.get("clip_timestamps")
+        audio_seconds = len(audio) / SAMPLE_RATE
+
+        chunks = split_audio_on_silence(audio, SAMPLE_RATE, self.window_seconds,
+                                        search_seconds=min(5.0, self.window_seconds / 4),
+                                        overlap_seconds=self.overlap_seconds)
+        self.log(f"📡 逐窗轉錄: {len(chunks)} 個時間窗")
+
+        start_time = time.time()
+        segments: List[Dict[str, Any]] = []
+        completed = set()
+        if checkpoint is not None:
+            windows = [[chunk["start"], chunk["end"]] for chunk in chunks]
+            state = checkpoint.load(windows)
+            if state is None:
+                checkpoint.begin(windows)
+            else:
+                completed = state["completed"]
+                segments = state["segments"]
+                if not params.get("language") and state["language"]:
+                    params["language"] = state["language"]
+                resumed_end = max(chunks[index]["end"] for index in completed)
+                self.log(f"♻️ 從檢查點繼續: 已完成 {len(completed)}/{len(chunks)} 個時間窗 "
+                         f"(至 {format_srt_time(resumed_end / SAMPLE_RATE)})")
+                if on_window is not None and segments:
+                    on_window([dict(segment) for segment in segments],
+                              resumed_end / len(audio) if len(audio) else 1.0)
+
+        for index, chunk in enumerate(chunks):
+            if index in completed:
+                continue
+            chunk_params = dict(params)
+            placed: List[Dict[str, Any]] = []
+            if isinstance(clip_timestamps, list):
+                # VAD 區段換算為相對於時間窗的時間，完全靜音的時間窗直接跳過
+                chunk_params["clip_timestamps"] = clip_timestamps_for_range(
+                    clip_timestamps,
+                    chunk["padded_start"] / SAMPLE_RATE,
+                    chunk["padded_end"] / SAMPLE_RATE)
+
+            if chunk_params.get("clip_timestamps") != []:
+                with warnings.catch_warnings():
+                    warnings.simplefilter("ignore")
+                    chunk_result = self.model.transcribe(
+                        audio[chunk["padded_start"]:chunk["padded_end"]], **chunk_params)
+
+                # 第一個時間窗偵測到語言後固定下來，避免後續時間窗重新偵測
+                if not params.get("language") and chunk_result.get("language"):
+                    params["language"] = chunk_result["language"]
+
+                placed = place_chunk_segments(chunk, chunk_result.get("segments", []),
+                                              segments[-1] if segments else None)
+                for segment in placed:
+                    segment["id"] = len(segments)
+                    segments.append(dict(segment))
+
+            if checkpoint is not None:
+                checkpoint.save_window(index, [dict(segment) for segment in placed], params.get("language"))
+
+            progress = chunk["end"] / len(audio) if len(audio) else 1.0
+            self.log(f"   {format_srt_time(chunk['end'] / SAMPLE_RATE)} 已完成 "
+                     f"({progress * 100:.0f}%)，{len(placed)} 個片段")
+            if on_window is not None:
+                on_window(placed, progress)
+
+        elapsed = time.time() - start_time
+        return {
+            "text": "".join(segment.get("text", "") for segment in segments),
+            "segments": segments,
+            "language": params.get("language"),
+            "windowed": {
+                "windows": len(chunks),
+                "resumed_windows": len(completed),
+                "wall_time": round(elapsed, 3),
+                "audio_seconds": round(audio_seconds, 2),
+            },
+        }
+
+    def transcribe_to_srt(self,
+                          audio: np.ndarray,
+                          params: Dict[str, Any],
+                          writer: StreamingSrtWriter,
+                          checkpoint=None) -> Dict[str, Any]:
+        """
+        轉錄並在每個時間窗完成後寫入字幕
+
+        Args:
+            audio: 16kHz 單聲道 PCM
+            params: 傳給 model.transcribe 的參數（含 temperature）
+            writer: 串流 SRT 寫入器
+            checkpoint: TranscriptionCheckpoint（從檢查點繼續時先寫入已完成的字幕）
+
+        Returns:
+            與 model.transcribe 相同格式的完整結果（原始片段）
+        """
+        result = self.transcribe(audio, params, on_window=writer.write_segments, checkpoint=checkpoint)
+        stats = result.pop("windowed")
+        result["streaming"] = dict(stats, written_segments=len(writer.written_segments))
+        return result
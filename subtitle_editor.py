@@ -158,19 +158,13 @@ class SubtitleEditor:
     def extract_audio(self):
         """從影片提取音訊"""
         try:
-            from moviepy.editor import VideoFileClip
-            video = VideoFileClip(self.video_path)
-            self.duration = video.duration
-            
-            # 提取音訊並儲存為臨時檔案
-            import tempfile
-            temp_dir = tempfile.gettempdir()
-            audio_path = os.path.join(temp_dir, f"temp_audio_{os.getpid()}.wav")
-            video.audio.write_audiofile(audio_path, verbose=False, logger=None)
-            video.close()
+            # 使用共用音訊快取（轉錄時已擷取過的影片不需要再次解碼）
+            from audio_cache import audio_cache
+            tracks = audio_cache.extract(self.video_path, ("asr", "playback"), log=lambda message: None)
+            self.duration = os.path.getsize(tracks["asr"]) / 4 / 16000
             
             # 載入音訊到 pygame
-            pygame.mixer.music.load(audio_path)
+            pygame.mixer.music.load(tracks["playback"])
             messagebox.showinfo("成功", f"影片載入成功！長度: {self.duration:.1f} 秒")
             
         except Exception as e:
@@ -0,0 +1,34 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+VAD 區段轉換為 clip_timestamps 的測試
+"""
+
+import pytest
+
+pytest.importorskip("numpy")
+
+from audio_segmentation import group_speech_regions, regions_to_clip_timestamps
+
+
+def test_short_regions_are_grouped_into_whisper_windows():
+    # 十分鐘的語音，每 1.5 秒一句、句間停頓 1 秒（speech_mode 會切出數百個區段）
+    regions = [{"start": i * 2.5, "end": i * 2.5 + 1.5} for i in range(240)]
+    clip_timestamps = regions_to_clip_timestamps(regions)
+    clips = list(zip(clip_timestamps[::2], clip_timestamps[1::2]))
+    assert len(clips) <= 600 / 30 + 1
+    assert all(end - start <= 30.0 for start, end in clips)
+    # 合併後仍涵蓋所有區段
+    assert clips[0][0] == 0.0 and clips[-1][1] == regions[-1]["end"]
+
+
+def test_long_gaps_split_clips():
+    regions = [{"start": 0.0, "end": 2.0}, {"start": 3.0, "end": 5.0}, {"start": 40.0, "end": 42.0}]
+    assert group_speech_regions(regions, max_gap_seconds=10.0) == [
+        {"start": 0.0, "end": 5.0}, {"start": 40.0, "end": 42.0}]
+
+
+def test_long_region_is_kept_whole():
+    regions = [{"start": 0.0, "end": 45.0}, {"start": 46.0, "end": 47.0}]
+    assert len(group_speech_regions(regions)) == 2
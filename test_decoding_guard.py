@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+解碼迴圈檢查的測試
+以逐字元的分詞器代替 Whisper 的分詞器（假名和漢字在 Whisper 的詞彙表中大多也是一個字一個 token），
+確認正常的重複歌詞不會被中止，真正的幻覺迴圈仍會中止，以及片語抑制截斷的製作資訊會被後處理刪除
+"""
+
+import threading
+
+import pytest
+
+import decoding_guard
+from decoding_guard import DecodingGuard, PhraseSuppressor, active_guards, decoding_guards
+from whisper_accuracy_optimizer import WhisperAccuracyOptimizer
+
+
+class CharTokenizer:
+    """每個字元一個 token 的分詞器"""
+
+    eot = 0x110000
+
+    def encode(self, text):
+        return [ord(char) for char in text]
+
+    def decode(self, tokens):
+        return "".join(chr(token) for token in tokens)
+
+
+def check(guard, text):
+    tokenizer = CharTokenizer()
+    return guard.check(tokenizer.encode(text), tokenizer, guard.phrase_tokens(tokenizer))
+
+
+def test_repeated_lyrics_are_not_aborted():
+    guard = DecodingGuard()
+    # 「ラララ」反覆八次：n-gram 重複成立，但整體壓縮比未達回退門檻
+    lyric = "夢の中で 君を呼んだ" + " ラララ" * 8
+    assert guard.find_loop(CharTokenizer().encode(lyric), []) == "repetition"
+    assert check(guard, lyric) is None
+    # 副歌的同一句反覆四次
+    assert check(guard, "夜空に光る星を数えて" + " 会いたくて" * 4) is None
+
+
+def test_hallucination_loop_is_aborted():
+    guard = DecodingGuard()
+    assert check(guard, "ご視聴ありがとうございました" * 6) == "repetition"
+
+
+def test_music_threshold_is_more_lenient():
+    text = "会いたくて " * 6
+    assert check(DecodingGuard(compression_ratio_threshold=2.4), text) == "repetition"
+    assert check(DecodingGuard(compression_ratio_threshold=3.5), text) is None
+
+
+def test_repeated_metadata_is_aborted():
+    guard = DecodingGuard()
+    assert check(guard, "作詞 作曲 初音ミク 作詞") == "metadata"
+
+
+def test_truncated_metadata_is_filtered():
+    optimizer = WhisperAccuracyOptimizer()
+    phrases = optimizer.blocked_metadata_phrases()
+    assert "初音ミク" in phrases and "Music by" in phrases
+    for phrase in phrases:
+        # 片語抑制在最後一個 token 前結束片段，留下的前綴不能進入字幕
+        prefix = phrase[:-1]
+        assert optimizer.filter_music_metadata(prefix) == ""
+        assert optimizer.filter_music_metadata(" " + prefix) == ""
+        assert not optimizer.filter_music_metadata("歌: " + prefix).endswith(prefix)
+    # 以整個單字結束的前綴（「Music by」的「Music」）同樣刪除，詞中間的字母不算前綴
+    assert optimizer.filter_music_metadata("歌: Music") == "歌:"
+    assert optimizer.filter_music_metadata("Lyrics") == ""
+    assert optimizer.filter_music_metadata("so Musical") == "so Musical"
+
+
+def pipeline_srt(generate, segments):
+    from transcription_pipeline import TranscriptionPipeline
+    pipeline = TranscriptionPipeline({}, log=lambda message: None)
+    pipeline.phrase_suppressor = WhisperAccuracyOptimizer().create_phrase_suppressor("speech")
+    return getattr(pipeline, generate)({"segments": segments})
+
+
+@pytest.mark.parametrize("generate", ["generate_srt_from_result", "generate_basic_srt"])
+def test_truncated_metadata_is_filtered_in_basic_output(generate):
+    srt = pipeline_srt(generate, [
+        {"start": 0.0, "end": 2.0, "text": " 夢の中で 初音ミ"},
+        {"start": 2.0, "end": 3.0, "text": " Music"},
+        {"start": 3.0, "end": 5.0, "text": " 君を呼んだ Lyrics"},
+    ])
+    assert "夢の中で" in srt and "君を呼んだ" in srt
+    assert "初音ミ" not in srt and "Music" not in srt and "Lyrics" not in srt
+
+
+def test_start_bias_only_for_music():
+    optimizer = WhisperAccuracyOptimizer()
+    assert not optimizer.create_phrase_suppressor("speech").bias_blocked_starts
+    assert optimizer.create_phrase_suppressor("music").bias_blocked_starts
+
+
+def test_guards_are_scoped_to_job_and_thread(monkeypatch):
+    # 不需要 Whisper：只檢查檢查器的範圍
+    monkeypatch.setattr(decoding_guard, "_install_guarded_task", lambda: None)
+    model = object()
+    guard = DecodingGuard()
+    seen = []
+
+    with decoding_guards(model, [guard, None]):
+        assert active_guards(model) == [guard]
+        other = threading.Thread(target=lambda: seen.append(active_guards(model)))
+        other.start()
+        other.join()
+    assert seen == [[]]
+    assert active_guards(model) == []
+
+
+def test_suppressor_ends_segment_after_blocked_prefix():
+    torch = pytest.importorskip("torch")
+    tokenizer = CharTokenizer()
+    suppressor = PhraseSuppressor(["初音ミク"], bias_blocked_starts=True)
+    state = suppressor.begin_task(tokenizer, 0, 32)
+    timestamp = tokenizer.eot + 1
+
+    # 完整前綴之後只允許時間戳或 EOT
+    tokens = torch.tensor([[timestamp] + tokenizer.encode("歌 初音ミ")])
+    logits = torch.zeros(1, tokenizer.eot + 2)
+    logits[0, ord("ク")] = 5.0
+    suppressor.apply(logits, tokens, state)
+    assert int(logits[0].argmax()) >= tokenizer.eot
+    assert suppressor.get_stats()["truncated"] == 1
+
+    # 片段開頭降低片語第一個 token 的分數
+    tokens = torch.tensor([[timestamp]])
+    logits = torch.zeros(1, tokenizer.eot + 2)
+    suppressor.apply(logits, tokens, state)
+    assert float(logits[0, ord("初")]) == suppressor.phrase_bias
@@ -0,0 +1,26 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+轉錄流程的測試
+確認回退統計以絕對時間區分時間窗（平行和分窗轉錄的 seek 在每個片段中都從 0 開始）
+"""
+
+from transcription_pipeline import TranscriptionPipeline
+
+
+def test_fallback_windows_are_keyed_by_absolute_time():
+    pipeline = TranscriptionPipeline({}, log=lambda message: None)
+    result = {"segments": [
+        # 第一個片段：seek 0 的時間窗以溫度 0.4 回退
+        {"start": 0.0, "end": 4.0, "seek": 0, "temperature": 0.4},
+        {"start": 4.0, "end": 8.0, "seek": 0, "temperature": 0.4},
+        {"start": 30.0, "end": 34.0, "seek": 3000, "temperature": 0.0},
+        # 第二個片段的 seek 重新從 0 開始，但是不同的時間窗
+        {"start": 600.0, "end": 604.0, "seek": 0, "temperature": 0.0},
+        {"start": 630.0, "end": 634.0, "seek": 3000, "temperature": 0.2},
+    ]}
+    stats = pipeline.count_fallbacks(result, [0.0, 0.2, 0.4], 3600.0)
+    assert stats["windows"] == 4
+    assert stats["fallback_windows"] == 2
+    assert stats["fallbacks_per_hour"] == 2.0
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+多次通過轉錄和逐窗溫度回退的測試
+以假的模型和逐窗轉錄代替 Whisper，只檢查溫度的選擇、中止和時間窗的重試範圍
+"""
+
+import pytest
+
+from whisper_accuracy_optimizer import WhisperAccuracyOptimizer, PassCancelled
+
+WINDOW_SECONDS = 60.0
+WINDOWS = 5
+
+
+class FakeAudio:
+    """只提供長度的 16kHz PCM"""
+
+    def __init__(self, seconds):
+        self.seconds = seconds
+
+    def __len__(self):
+        return int(self.seconds * 16000)
+
+    def __getitem__(self, index):
+        return FakeAudio((index.stop - index.start) / 16000)
+
+
+def make_segment(start, end, text, avg_logprob):
+    return {"start": start, "end": end, "text": text, "avg_logprob": avg_logprob,
+            "compression_ratio": 1.3, "no_speech_prob": 0.05}
+
+
+class WindowedOptimizer(WhisperAccuracyOptimizer):
+    """以固定的片段代替 StreamingTranscriber 逐窗轉錄"""
+
+    def __init__(self, window_segments):
+        super().__init__()
+        self.window_segments = window_segments
+        self.decoded = []
+
+    def transcribe_pass_windows(self, model, audio, whisper_params, temperature, on_window):
+        segments = []
+        for index in range(WINDOWS):
+            window = self.window_segments(temperature, index)
+            self.decoded.append((temperature, index))
+            covered = (index + 1) * WINDOW_SECONDS
+            if not on_window(window, covered):
+                raise PassCancelled(covered)
+            segments.extend(window)
+        return {"text": "".join(segment["text"] for segment in segments), "segments": segments}
+
+
+def test_hopeless_pass_is_cancelled_before_last_window():
+    def window_segments(temperature, index):
+        start = index * WINDOW_SECONDS
+        if temperature == 0.0:
+            return [make_segment(start + i * 6, start + i * 6 + 5, "夢の中で君を呼んだ", -0.1) for i in range(10)]
+        return [make_segment(start + i * 6, start + i * 6 + 5, "あ", -2.5) for i in range(10)]
+
+    optimizer = WindowedOptimizer(window_segments)
+    optimizer.optimization_config["multi_pass"]["good_enough_score"] = 1.01
+    result = optimizer.multi_pass_transcription(None, FakeAudio(WINDOWS * WINDOW_SECONDS),
+                                                {"temperature": [0.0, 0.4]}, "ja", early_stop=True)
+
+    stats = result["multi_pass"]
+    assert stats["best_temperature"] == 0.0
+    assert stats["cancelled"] == 1 and stats["pruning"]
+    hopeless_windows = [index for temperature, index in optimizer.decoded if temperature == 0.4]
+    assert max(hopeless_windows) < WINDOWS - 1
+
+
+def test_competitive_pass_is_not_cancelled():
+    def window_segments(temperature, index):
+        start = index * WINDOW_SECONDS
+        # 第二個溫度開頭較差，後半段較好，整體勝出
+        logprob = -0.3 if temperature == 0.0 else (-0.9 if index == 0 else -0.05)
+        return [make_segment(start + i * 6, start + i * 6 + 5, "夢の中で君を呼んだ", logprob) for i in range(10)]
+
+    optimizer = WindowedOptimizer(window_segments)
+    optimizer.optimization_config["multi_pass"]["good_enough_score"] = 1.01
+    result = optimizer.multi_pass_transcription(None, FakeAudio(WINDOWS * WINDOW_SECONDS),
+                                                {"temperature": [0.0, 0.4]}, "ja", early_stop=True)
+
+    assert result["multi_pass"]["cancelled"] == 0
+    assert result["multi_pass"]["best_temperature"] == 0.4
+
+
+class FallbackModel:
+    """第一次轉錄：0-30 秒正常、30-60 秒沒有片段、60-90 秒品質很差；重新解碼時整段都正常"""
+
+    def __init__(self):
+        self.clips = []
+
+    def transcribe(self, audio, temperature, **params):
+        if temperature == 0.0:
+            segments = [make_segment(1.0, 5.0, "夢の中で君を呼んだ", -0.1),
+                        make_segment(61.0, 65.0, "あ", -3.0)]
+        else:
+            self.clips.append(audio.seconds)
+            # 相對於時間窗的片段，第一個落在前面多取的音訊中
+            segments = [make_segment(start, start + 4.0, "夜空に光る星を数えて", -0.1)
+                        for start in [0.1] + [0.5 + 5.0 * i for i in range(int(audio.seconds // 5))]]
+        return {"text": "", "segments": segments, "language": "ja"}
+
+
+def test_window_fallback_retries_gaps_without_overlaps():
+    pytest.importorskip("numpy")
+    optimizer = WhisperAccuracyOptimizer()
+    model = FallbackModel()
+    result = optimizer.windowed_temperature_fallback(model, FakeAudio(90.0), {"temperature": [0.0, 0.4]}, "ja")
+
+    stats = result["window_fallback"]
+    assert stats["windows"] == 3 and stats["retried_windows"] == 2 and stats["empty_windows"] == 1
+    segments = result["segments"]
+    # 空白的 30-60 秒重新解碼後有字幕
+    assert any(30.0 <= segment["start"] < 60.0 for segment in segments)
+    # 相鄰時間窗前後多取的音訊不會產生重複或重疊的片段
+    for previous, current in zip(segments, segments[1:]):
+        assert current["start"] >= previous["end"]
@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+模型登錄表的測試
+以不需要 Whisper 的載入函數確認：同一個模型只載入一次、載入中不會阻擋其他模型，以及釋放模型的日誌
+"""
+
+import threading
+
+from whisper_model_manager import WhisperModelRegistry
+
+
+class SlowRegistry(WhisperModelRegistry):
+    """載入 "slow" 模型時等待放行的登錄表"""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.release = threading.Event()
+        self.loads = []
+
+    def _load(self, name, device, download_root, quantize, log):
+        self.loads.append(name)
+        if name == "slow":
+            assert self.release.wait(5)
+        return object(), 0.0
+
+
+def test_models_load_once_without_holding_the_lock():
+    registry = SlowRegistry(log=lambda message: None)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(registry.get_model("slow")))
+               for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    while not registry.is_loading("slow"):
+        pass
+
+    # 載入中的模型不會阻擋其他模型
+    registry.get_model("tiny")
+    registry.release.set()
+    for thread in threads:
+        thread.join()
+
+    assert registry.loads.count("slow") == 1
+    assert results[0] is results[1]
+    assert not registry.is_loading("slow")
+
+
+def test_eviction_uses_log():
+    messages = []
+    registry = SlowRegistry(log=messages.append)
+    registry.get_model("tiny")
+    registry.set_memory_budget(-1)
+    assert registry.loaded_models() == []
+    assert any(message.startswith("🗑️") for message in messages)
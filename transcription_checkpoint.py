@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+轉錄檢查點
+逐窗轉錄時每完成一個時間窗就把片段追加到檢查點檔案，程式關閉或當機後以相同的
+音訊和解碼參數重新執行時，從最後完成的時間窗繼續
+"""
+
+import os
+import json
+import time
+from typing import Dict, List, Any, Optional
+
+# 預設檢查點位置（與其他快取並列）
+DEFAULT_CHECKPOINT_DIR = os.path.expanduser("~/.cache/aisub/checkpoints")
+
+# 超過此天數未更新的檢查點視為放棄的工作，自動刪除
+MAX_AGE_DAYS = 7
+
+# 檢查點格式版本，格式改變時舊的檢查點自動失效
+CHECKPOINT_VERSION = 1
+
+
+def _to_json(value):
+    """將 numpy 型別轉換為 JSON 可序列化的值（不需要匯入 numpy）"""
+    if hasattr(value, "tolist"):
+        return value.tolist()
+    return str(value)
+
+
+class TranscriptionCheckpoint:
+    """
+    單一轉錄工作的檢查點
+
+    檔案為 JSON Lines：第一行是標頭（鍵和時間窗邊界），之後每行是一個完成的時間窗。
+    每行寫入後立即 fsync，中斷時最多只會遺失正在轉錄的那個時間窗，
+    寫到一半的最後一行在讀取時忽略。
+    """
+
+    def __init__(self, key: str, checkpoint_dir: Optional[str] = None):
+        """
+        Args:
+            key: 工作識別鍵（音訊雜湊 + 模型 + 解碼參數，與轉錄結果快取鍵相同）
+            checkpoint_dir: 檢查點目錄
+        """
+        self.key = key
+        self.checkpoint_dir = checkpoint_dir or DEFAULT_CHECKPOINT_DIR
+        self.path = os.path.join(self.checkpoint_dir, f"{key}.jsonl")
+
+    def load(self, windows: List[List[int]]) -> Optional[Dict[str, Any]]:
+        """
+        讀取已完成的時間窗
+
+        Args:
+            windows: 本次的時間窗邊界 [[start, end], ...]（與檢查點不一致時捨棄檢查點）
+
+        Returns:
+            {"completed": 已完成的時間窗索引, "segments": 片段, "language": 語言}，沒有可用的檢查點時為 None
+        """
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                lines = f.readlines()
+        except OSError:
+            return None
+
+        try:
+            header = json.loads(lines[0])
+        except (IndexError, ValueError):
+            self.clear()
+            return None
+        if (header.get("version") != CHECKPOINT_VERSION or header.get("key") != self.key
+                or header.get("windows") != [list(window) for window in windows]):
+            self.clear()
+            return None
+
+        completed = set()
+        segments: List[Dict[str, Any]] = []
+        language = None
+        valid_lines = 1
+        for line in lines[1:]:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                break
+            completed.add(entry["index"])
+            segments.extend(entry["segments"])
+            language = entry.get("language") or language
+            valid_lines += 1
+
+        if valid_lines < len(lines):
+            # 寫入中斷的最後一行：截掉後才能繼續追加
+            with open(self.path, 'w', encoding='utf-8') as f:
+                f.writelines(lines[:valid_lines])
+                f.flush()
+                os.fsync(f.fileno())
+
+        if not completed:
+            return None
+        return {"completed": completed, "segments": segments, "language": language}
+
+    def begin(self, windows: List[List[int]]):
+        """開始新的檢查點（寫入標頭，覆蓋無法使用的舊檔案）"""
+        os.makedirs(self.checkpoint_dir, exist_ok=True)
+        self.remove_stale()
+        header = {
+            "version": CHECKPOINT_VERSION,
+            "key": self.key,
+            "windows": [list(window) for window in windows],
+            "created": time.time(),
+        }
+        with open(self.path, 'w', encoding='utf-8') as f:
+            f.write(json.dumps(header) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    def save_window(self, index: int, segments: List[Dict[str, Any]], language: Optional[str] = None):
+        """追加一個完成的時間窗（片段時間為原始音訊的時間軸）"""
+        entry = {"index": index, "segments": segments, "language": language}
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(entry, ensure_ascii=False, default=_to_json) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    def clear(self):
+        """刪除檢查點（轉錄完成或檢查點無效時）"""
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+    def remove_stale(self):
+        """刪除超過 MAX_AGE_DAYS 未更新的檢查點"""
+        cutoff = time.time() - MAX_AGE_DAYS * 86400
+        try:
+            names = os.listdir(self.checkpoint_dir)
+        except OSError:
+            return
+        for name in names:
+            path = os.path.join(self.checkpoint_dir, name)
+            try:
+                if name.endswith(".jsonl") and os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+            except OSError:
+                pass
@@ -0,0 +1,1191 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+轉錄流程
+與 GUI 無關的 Whisper Python API 轉錄流程，GUI 和背景工作程序共用
+"""
+
+import os
+import time
+import warnings
+from contextlib import ExitStack
+from typing import Dict, List, Any, Optional, Callable
+
+# 轉錄設定的預設值（對應 GUI 的設定項目）
+DEFAULT_SETTINGS: Dict[str, Any] = {
+    "model": "medium",
+    "language": "auto",
+    "use_gpu": True,
+    "download_root": None,
+    "model_cache_mb": 6144,
+    "use_optimization": True,
+    "content_type": "auto",
+    "music_mode": False,
+    "quality_level": "auto",
+    "multi_pass_mode": False,
+    "multi_pass_strategy": "whole",
+    # 多次通過轉錄的提前結束：各溫度改為逐窗轉錄，已有足夠好的結果時停止其餘溫度
+    # （逐窗轉錄會改變解碼結果，因此預設關閉；關閉時每個溫度都完整轉錄）
+    "multi_pass_early_stop": False,
+    "filter_repetitive": True,
+    # 音樂內容解碼時偵測重複迴圈並提前結束時間窗
+    "loop_guard": True,
+    # 解碼時禁止後處理一定會刪除的製作資訊片語（音樂內容另外降低片段開頭無意義短語的分數）
+    "phrase_suppression": True,
+    "no_speech_threshold": 0.6,
+    "temperature": 0.0,
+    # 轉錄時不計算字詞時間戳，只對合併短片段時需要的片段補算
+    # （合併片段的起訖時間改以字詞時間為準，會改變輸出，因此預設關閉）
+    "lazy_word_timestamps": False,
+    "parallel_chunks": False,
+    "parallel_workers": 0,
+    # CPU 上多次通過轉錄的各溫度以多個程序同時執行
+    "parallel_passes": False,
+    # 模型串接：先以快速模型轉錄，品質不足的片段再以所選模型重新轉錄
+    "cascade_mode": False,
+    "cascade_fast_model": "small",
+    # 批次時間窗解碼：每次前向計算的時間窗數（0 表示使用 model.transcribe 逐窗解碼）
+    "batched_windows": 0,
+    "cpu_quantization": False,
+    "cpu_threads": 0,
+    # 解碼時一併產生的其他音軌（GUI 之後編輯或燒錄時直接使用）
+    "extra_audio_tracks": [],
+    "audio_cache_mb": 8192,
+    "use_vad": False,
+    "stream_output": False,
+    "use_result_cache": True,
+    "result_cache_mb": 512,
+    # 多次通過和模型串接重新解碼同一時間窗時共用編碼器輸出（CPU 記憶體上限 MB，0 表示停用）
+    "encoder_cache_mb": 512,
+    # 編碼器輸出另存到磁碟（fp16），之後只調整解碼參數重新轉錄同一個檔案時不需要執行編碼器
+    "encoder_disk_cache": False,
+    "encoder_disk_cache_mb": 4096,
+    # 長檔案逐窗轉錄並保存檢查點，中斷後重新執行時從最後完成的時間窗繼續
+    # （逐窗轉錄的時間窗邊界和前文與單次轉錄不同，因此預設關閉；串流輸出本來就逐窗轉錄，不受影響）
+    "checkpoint_long_files": False,
+    "checkpoint_min_seconds": 600,
+}
+
+# 保存檢查點的逐窗轉錄所使用的時間窗長度（秒）
+CHECKPOINT_WINDOW_SECONDS = 120.0
+
+
+class TranscriptionPipeline:
+    """以 Whisper Python API 將一個檔案轉錄為 SRT 字幕"""
+
+    def __init__(self,
+                 settings: Dict[str, Any],
+                 log: Optional[Callable[[str], None]] = None,
+                 set_status: Optional[Callable[..., None]] = None,
+                 segment_callback: Optional[Callable[[List[Dict[str, Any]], float], None]] = None):
+        """
+        Args:
+            settings: 轉錄設定（未提供的項目使用 DEFAULT_SETTINGS）
+            log: 日誌函數
+            set_status: 狀態函數 (訊息, 顏色)
+            segment_callback: 串流輸出時每批片段的回呼 (片段, 進度 0-1)
+        """
+        self.settings = dict(DEFAULT_SETTINGS)
+        self.settings.update(settings)
+        self.log = log or print
+        self._set_status = set_status
+        self.segment_callback = segment_callback
+        self.partial_segments: List[Dict[str, Any]] = []
+        # 最近一次轉錄的摘要（供工作程序回傳結構化結果）
+        self.summary: Dict[str, Any] = {}
+        # 本次轉錄偵測到的語言（優化版和回退的基本版共用）
+        self.language_detection: Optional[Dict[str, Any]] = None
+        # 本次轉錄使用的模型上安裝的編碼器輸出快取（模型名稱 -> 快取）
+        self.encoder_caches: Dict[str, Any] = {}
+        # 本次轉錄的解碼模式是否會重新解碼同一個時間窗（只有這時才在記憶體中共用編碼器輸出）
+        self.reuse_encoder_output = False
+        # 本次轉錄掛到模型上的迴圈檢查器（None 表示不檢查）
+        self.decoding_guard = None
+        self.phrase_suppressor = None
+        # 本次轉錄的檢查器範圍（run 結束時離開，常駐模型不會留下這次的檢查器）
+        self._guard_scope: Optional[ExitStack] = None
+    
+    def set_status(self, message: str, color: str = "black"):
+        """更新狀態（未提供狀態函數時忽略）"""
+        if self._set_status is not None:
+            self._set_status(message, color)
+    
+    def run(self, input_file: str, output_srt: str) -> bool:
+        """依設定執行優化版轉錄，失敗時回退到基本版本"""
+        success = False
+        self.language_detection = None
+        self.encoder_caches = {}
+        self.reuse_encoder_output = False
+        self.decoding_guard = None
+        self.phrase_suppressor = None
+        self._guard_scope = ExitStack()
+        try:
+            if self.settings["use_optimization"]:
+                self.log("🧠 嘗試使用優化版 Python API...")
+                success = self.run_optimized(input_file, output_srt)
+            
+            if not success:
+                if self.settings["use_optimization"]:
+                    self.log("🔄 回退到基本版本...")
+                success = self.run_basic(input_file, output_srt)
+        finally:
+            self._guard_scope.close()
+            self._guard_scope = None
+        
+        # 字詞時間戳對齊等後處理之後才載入的快取也一併釋放
+        for cache in self.encoder_caches.values():
+            cache.clear()
+        self.encoder_caches = {}
+        return success
+    
+    def run_optimized(self, input_file: str, output_srt: str) -> bool:
+        """使用 Python API 直接調用 Whisper（優化版本）"""
+        try:
+            # 抑制 Whisper 警告
+            import warnings
+            warnings.filterwarnings("ignore", message=".*Failed to launch Triton kernels.*")
+            warnings.filterwarnings("ignore", message=".*falling back to a slower.*")
+            
+            import whisper
+            
+            # 檢查輸入檔案是否存在
+            if not os.path.exists(input_file):
+                raise FileNotFoundError(f"輸入檔案不存在: {input_file}")
+            
+            # 檢查輸出目錄是否存在，如果不存在則創建
+            output_dir = os.path.dirname(output_srt)
+            if output_dir and not os.path.exists(output_dir):
+                try:
+                    os.makedirs(output_dir, exist_ok=True)
+                    self.log(f"🔧 創建輸出目錄: {output_dir}")
+                except Exception as e:
+                    self.log(f"❌ 創建輸出目錄失敗: {e}")
+                    return False
+            
+            # 嘗試載入優化器，如果失敗則使用基本版本
+            try:
+                from whisper_accuracy_optimizer import WhisperAccuracyOptimizer
+                optimizer = WhisperAccuracyOptimizer()
+                self.log("🐍 使用優化版 Python API 調用 Whisper...")
+                use_optimizer = True
+            except ImportError as e:
+                self.log(f"⚠️ 優化器未找到: {e}")
+                self.log("⚠️ 使用基本版 Python API...")
+                optimizer = None
+                use_optimizer = False
+            except Exception as e:
+                self.log(f"⚠️ 載入優化器時出錯: {e}")
+                self.log("⚠️ 使用基本版 Python API...")
+                optimizer = None
+                use_optimizer = False
+            
+            # 決定內容類型
+            if self.settings["content_type"] == "auto":
+                content_type = "music" if self.settings["music_mode"] else "speech"
+            else:
+                content_type = self.settings["content_type"]
+            
+            # 智能語言偵測
+            language = self.settings["language"]
+            if language == "auto":
+                self.log("🔍 使用自動語言偵測...")
+                language = None  # Whisper 會自動偵測
+            else:
+                self.log(f"🌍 使用指定語言: {language}")
+            
+            # 決定品質等級
+            if self.settings["quality_level"] == "auto":
+                # 根據模型大小自動決定品質等級
+                quality_map = {
+                    "tiny": "fast",
+                    "base": "balanced", 
+                    "small": "balanced",
+                    "medium": "high",
+                    "large": "ultra"
+                }
+                quality_level = quality_map.get(self.settings["model"], "high")
+            else:
+                quality_level = self.settings["quality_level"]
+            
+            self.log(f"🎯 內容類型: {content_type}, 語言: {language if language else 'auto'}, 品質等級: {quality_level}")
+            
+            if use_optimizer and self.settings["loop_guard"]:
+                self.decoding_guard = optimizer.create_decoding_guard(content_type)
+                if self.decoding_guard is not None:
+                    self.log("🔁 解碼時偵測重複迴圈並提前結束時間窗")
+            if use_optimizer and self.settings["phrase_suppression"]:
+                self.phrase_suppressor = optimizer.create_phrase_suppressor(content_type)
+                if self.phrase_suppressor is not None:
+                    self.log(f"🚫 解碼時禁止 {len(self.phrase_suppressor.blocked_phrases)} 個製作資訊片語"
+                             + (", 片段開頭降低無意義短語分數" if self.phrase_suppressor.biased_phrases else ""))
+            
+            # 獲取優化參數
+            if use_optimizer:
+                optimized_params = optimizer.optimize_whisper_params(
+                    content_type=content_type,
+                    language=language if language else "auto",
+                    quality_level=quality_level,
+                    lazy_word_timestamps=self.settings["lazy_word_timestamps"]
+                )
+                if language:
+                    optimized_params["language"] = language
+                
+                self.log("⚙️ 使用優化參數:")
+                for key, value in optimized_params.items():
+                    if key != "temperature":  # temperature 會特別處理
+                        self.log(f"   {key}: {value}")
+            else:
+                # 使用基本參數
+                optimized_params = {
+                    "language": language,  # None 表示自動偵測
+                    "temperature": [0.0],
+                    "no_speech_threshold": self.settings["no_speech_threshold"],
+                    "condition_on_previous_text": False
+                }
+                self.log("⚙️ 使用基本參數（無優化器）")
+            
+            if self.decoding_guard is not None and optimized_params.get("compression_ratio_threshold"):
+                # 迴圈中止使用與溫度回退相同的壓縮比門檻（音樂模式較寬鬆）
+                self.decoding_guard.compression_ratio_threshold = optimized_params["compression_ratio_threshold"]
+            
+            # 決定使用的設備
+            device = "cpu"
+            if self.settings["use_gpu"]:
+                try:
+                    import torch
+                    if torch.cuda.is_available():
+                        device = "cuda"
+                        self.log("🚀 Python API 使用 GPU 加速")
+                        self.log("ℹ️ 注意: Windows 上可能會看到 Triton 警告，但 GPU 仍正常工作")
+                    else:
+                        self.log("💻 GPU 不可用，Python API 使用 CPU")
+                except ImportError:
+                    self.log("💻 PyTorch 未安裝，Python API 使用 CPU")
+            else:
+                self.log("💻 Python API 強制使用 CPU")
+            self.apply_cpu_plan(device)
+            
+            # 解碼音訊（所有轉錄次數和備用路徑共用同一份 PCM）
+            self.set_status("正在解碼音訊...", "blue")
+            audio = self.load_job_audio(input_file)
+            
+            # 能量 VAD：只把有聲音的區段送進解碼器
+            speech_regions = None
+            if self.settings["use_vad"] and not isinstance(audio, str):
+                speech_regions = self.detect_speech_regions(audio, content_type, optimizer)
+                if speech_regions:
+                    from audio_segmentation import regions_to_clip_timestamps
+                    optimized_params["clip_timestamps"] = regions_to_clip_timestamps(speech_regions)
+                    self.log(f"🔇 VAD: 合併為 {len(optimized_params['clip_timestamps']) // 2} 段送入解碼器")
+            
+            # 轉錄結果快取：只調整後處理設定時直接使用上次的解碼結果
+            if self.settings["cascade_mode"] and use_optimizer:
+                decode_mode = f"cascade:{self.settings['cascade_fast_model']}"
+            elif self.settings["multi_pass_mode"] and use_optimizer:
+                decode_mode = f"multi_pass:{self.settings['multi_pass_strategy']}"
+                if self.settings["multi_pass_strategy"] != "window" and self.settings["multi_pass_early_stop"]:
+                    decode_mode += ":early_stop"
+            elif self.settings["parallel_chunks"] and device == "cpu" and not isinstance(audio, str):
+                decode_mode = "parallel"
+            elif self.settings["batched_windows"] > 1 and not isinstance(audio, str):
+                decode_mode = "batched"
+            elif self.settings["stream_output"] and not isinstance(audio, str):
+                decode_mode = "streaming"
+            elif self.settings["checkpoint_long_files"] and self.is_long_audio(audio):
+                decode_mode = "windowed"
+            else:
+                decode_mode = "single"
+            if self.settings["stream_output"] and decode_mode != "streaming":
+                self.log(f"ℹ️ 串流輸出不支援 {decode_mode.split(':')[0]} 模式，轉錄完成後才寫入字幕")
+            self.reuse_encoder_output = self.redecodes_windows(decode_mode)
+            decode_key = self.get_decode_key(input_file, device, decode_mode, optimized_params)
+            cache_key = decode_key if self.settings["use_result_cache"] else None
+            cached_result = self.load_cached_result(cache_key)
+            checkpoint = None
+            if decode_key and decode_mode in ("streaming", "windowed") and self.is_long_audio(audio):
+                from transcription_checkpoint import TranscriptionCheckpoint
+                checkpoint = TranscriptionCheckpoint(decode_key)
+            
+            if cached_result is None:
+                # 載入模型（已常駐的模型會直接重用；模型串接時先只載入快速模型）
+                self.set_status("正在載入 Whisper 模型...", "blue")
+                model_name = (self.settings["cascade_fast_model"] if decode_mode.startswith("cascade:")
+                              else self.settings["model"])
+                try:
+                    model = self.load_whisper_model(device, model_name)
+                    self.log(f"✅ 模型 {model_name} 載入成功 (設備: {device})")
+                except Exception as e:
+                    self.log(f"❌ 模型載入失敗: {e}")
+                    import traceback
+                    self.log(f"🔍 詳細錯誤:\n{traceback.format_exc()}")
+                    return False
+                
+                # 自動偵測時先以多個時間窗決定語言，所有轉錄次數固定使用，不再各自偵測
+                if not language:
+                    detected = self.pin_language(model, audio, speech_regions)
+                    if detected:
+                        optimized_params["language"] = detected
+            
+            # 延遲字詞時間戳：後處理決定要合併的片段後才對齊（結果快取命中時才需要載入模型）
+            word_aligner = None
+            if use_optimizer and self.settings["lazy_word_timestamps"] and not isinstance(audio, str):
+                from word_alignment import LazyWordAligner
+                word_aligner = LazyWordAligner(
+                    lambda: self.load_whisper_model(device),
+                    audio,
+                    language=optimized_params.get("language"),
+                    prepend_punctuations=optimized_params["prepend_punctuations"],
+                    append_punctuations=optimized_params["append_punctuations"],
+                    log=self.log
+                )
+            
+            # 根據設定決定是否使用多次通過轉錄
+            streamed_srt = None
+            if cached_result is not None:
+                result = cached_result
+            elif decode_mode.startswith("cascade:"):
+                self.set_status("正在執行模型串接轉錄...", "blue")
+                try:
+                    result = optimizer.cascade_transcription(
+                        fast_model=model,
+                        load_accurate_model=lambda: self.load_whisper_model(device),
+                        audio_file=audio,
+                        params=optimized_params,
+                        language=language,
+                        fast_model_name=self.settings["cascade_fast_model"],
+                        accurate_model_name=self.settings["model"]
+                    )
+                    stats = result["cascade"]
+                    self.log(f"📊 模型串接: {stats['hard_segments']}/{stats['segments']} 個困難片段, "
+                             f"{stats['accurate_ratio'] * 100:.1f}% 音訊使用 {self.settings['model']}")
+                except Exception as e:
+                    self.log(f"❌ 模型串接轉錄失敗: {e}")
+                    import traceback
+                    self.log(f"🔍 詳細錯誤:\n{traceback.format_exc()}")
+                    return False
+            elif self.settings["multi_pass_mode"] and use_optimizer:
+                self.set_status("正在執行多次通過轉錄...", "blue")
+                try:
+                    if self.settings["multi_pass_strategy"] == "window":
+                        self.log("🎯 多次通過策略: 只重試低品質時間窗")
+                        result = optimizer.windowed_temperature_fallback(
+                            model=model,
+                            audio_file=audio,
+                            params=optimized_params,
+                            language=language
+                        )
+                        stats = result.get("window_fallback", {})
+                        self.log(f"📊 重試時間窗: {stats.get('retried_windows', 0)}/{stats.get('windows', 0)}, "
+                                 f"重新解碼 {stats.get('redecoded_ratio', 0) * 100:.1f}% 音訊")
+                    else:
+                        pass_runner = None
+                        if self.settings["parallel_passes"] and device == "cpu" and not isinstance(audio, str):
+                            from parallel_transcriber import ParallelTemperatureTranscriber
+                            pass_runner = ParallelTemperatureTranscriber(
+                                model,
+                                self.settings["model"],
+                                download_root=self.get_model_download_root(),
+                                workers=self.settings["parallel_workers"],
+                                log=self.log,
+                                quantize=self.use_quantized_model(device)
+                            ).run_passes
+                        result = optimizer.multi_pass_transcription(
+                            model=model,
+                            audio_file=audio,
+                            params=optimized_params,
+                            language=language,
+                            pass_runner=pass_runner,
+                            early_stop=self.settings["multi_pass_early_stop"]
+                        )
+                        stats = result.get("multi_pass", {})
+                        if stats.get("decoded_ratio") is not None:
+                            # 只有依序執行時會中止不可能勝出的溫度；平行執行只在已有足夠好的結果時略過其餘溫度
+                            pruned = f"中止 {stats['cancelled']}, " if stats.get("pruning") else ""
+                            self.log(f"📊 多次通過: 完成 {stats['completed']}, {pruned}"
+                                     f"略過 {stats['skipped']} 個溫度, 共解碼 {stats['decoded_ratio']:.2f} 倍音訊長度")
+                    self.log("✅ 多次通過轉錄完成")
+                except Exception as e:
+                    self.log(f"❌ 多次通過轉錄失敗: {e}")
+                    import traceback
+                    self.log(f"🔍 詳細錯誤:\n{traceback.format_exc()}")
+                    return False
+            else:
+                self.set_status("正在執行單次轉錄...", "blue")
+                # 使用優化參數進行單次轉錄
+                try:
+                    whisper_params = {k: v for k, v in optimized_params.items() 
+                                    if k not in ["temperature"] and v is not None}
+                    temperature = optimized_params.get("temperature", [0.0])
+                    if isinstance(temperature, list):
+                        temperature = temperature[0]  # 使用第一個溫度值
+                    
+                    self.log(f"🔧 轉錄參數: {whisper_params}")
+                    self.log(f"🔧 溫度: {temperature}")
+                    
+                    if self.settings["parallel_chunks"] and device == "cpu" and not isinstance(audio, str):
+                        # CPU 分段平行：在安靜處切割，多個程序同時轉錄
+                        from parallel_transcriber import ParallelChunkTranscriber
+                        self.set_status("正在執行 CPU 分段平行轉錄...", "blue")
+                        transcriber = ParallelChunkTranscriber(
+                            model,
+                            self.settings["model"],
+                            download_root=self.get_model_download_root(),
+                            workers=self.settings["parallel_workers"],
+                            log=self.log,
+                            quantize=self.use_quantized_model(device)
+                        )
+                        result = transcriber.transcribe(audio, dict(whisper_params, temperature=temperature))
+                        stats = result["parallel"]
+                        self.log(f"📊 平行轉錄: {stats['chunks']} 個片段, {stats['workers']} 個程序, "
+                                 f"耗時 {stats['wall_time']:.1f} 秒 (即時率 {stats['real_time_factor']:.2f})")
+                    elif decode_mode == "batched":
+                        # 批次時間窗解碼：多個時間窗（以及同時轉錄的其他檔案）一起編碼和解碼
+                        from batched_decoder import get_batched_decoder
+                        self.set_status("正在執行批次時間窗解碼...", "blue")
+                        decoder = get_batched_decoder(model, self.settings["batched_windows"], log=self.log)
+                        result = decoder.transcribe(audio, dict(whisper_params, temperature=temperature))
+                        stats = result["batched"]
+                        self.log(f"📊 批次解碼: {stats['windows']} 個時間窗, 批次大小 {stats['batch_size']}, "
+                                 f"耗時 {stats['wall_time']:.1f} 秒")
+                    elif self.settings["stream_output"] and not isinstance(audio, str):
+                        # 串流輸出：每完成一個時間窗就寫入後處理過的字幕
+                        from streaming_transcriber import StreamingTranscriber, StreamingSrtWriter
+                        self.set_status("正在串流轉錄並輸出字幕...", "blue")
+                        
+                        def post_process(segments, context):
+                            if speech_regions:
+                                from audio_segmentation import clamp_segments_to_regions
+                                segments = clamp_segments_to_regions(segments, speech_regions)
+                            if use_optimizer:
+                                return optimizer.post_process_segments(
+                                    segments,
+                                    language=language,
+                                    filter_repetitive=self.settings["filter_repetitive"],
+                                    merge_short_segments=True,
+                                    context_segments=context,
+                                    word_aligner=word_aligner
+                                )
+                            return segments
+                        
+                        self.partial_segments = []
+                        writer = StreamingSrtWriter(output_srt, post_process=post_process,
+                                                    segment_callback=self.on_partial_segments)
+                        try:
+                            result = StreamingTranscriber(model, log=self.log).transcribe_to_srt(
+                                audio, dict(whisper_params, temperature=temperature), writer,
+                                checkpoint=checkpoint)
+                        finally:
+                            writer.close()
+                        streamed_srt = writer.srt_content
+                    elif decode_mode == "windowed":
+                        # 長檔案：逐窗轉錄，每完成一個時間窗就保存檢查點
+                        from streaming_transcriber import StreamingTranscriber
+                        result = StreamingTranscriber(model, window_seconds=CHECKPOINT_WINDOW_SECONDS,
+                                                      log=self.log).transcribe(
+                            audio, dict(whisper_params, temperature=temperature), checkpoint=checkpoint)
+                    else:
+                        with warnings.catch_warnings():
+                            warnings.simplefilter("ignore")
+                            result = model.transcribe(
+                                audio,
+                                temperature=temperature,
+                                **whisper_params
+                            )
+                    self.log("✅ 單次轉錄完成")
+                except Exception as e:
+                    self.log(f"❌ 單次轉錄失敗: {e}")
+                    import traceback
+                    self.log(f"🔍 詳細錯誤:\n{traceback.format_exc()}")
+                    return False
+            
+            if cached_result is None:
+                self.store_cached_result(cache_key, result, decode_mode)
+            encoder_stats = self.release_encoder_caches()
+            guard_stats = None
+            if cached_result is None and self.decoding_guard is not None:
+                guard_stats = self.decoding_guard.get_stats()
+                self.log(f"🔁 迴圈中止: {guard_stats['aborted_windows']}/{guard_stats['windows']} 次解碼提前結束 "
+                         f"(重複 {guard_stats['repetition']}, 製作資訊 {guard_stats['metadata']}), "
+                         f"省下 {guard_stats['saved_steps']} 個解碼步驟")
+            suppression_stats = None
+            if cached_result is None and self.phrase_suppressor is not None:
+                suppression_stats = self.phrase_suppressor.get_stats()
+                self.log(f"🚫 片語抑制: 避免 {suppression_stats['blocked']} 次製作資訊, "
+                         f"截斷 {suppression_stats['truncated']} 次製作資訊前綴, "
+                         f"{suppression_stats['biased']} 次片段開頭無意義短語")
+            fallback_stats = None
+            if cached_result is None and not isinstance(audio, str):
+                fallback_stats = self.count_fallbacks(result, optimized_params.get("temperature", 0.0),
+                                                      len(audio) / 16000)
+                self.log(f"🌡️ 溫度回退: {fallback_stats['fallback_windows']}/{fallback_stats['windows']} 個時間窗 "
+                         f"({fallback_stats['fallbacks_per_hour']:.1f} 次/小時)")
+            
+            # 移除落在靜音區段中的片段（解碼器偶爾會越過區段邊界）
+            if speech_regions:
+                from audio_segmentation import clamp_segments_to_regions
+                result["segments"] = clamp_segments_to_regions(result.get("segments", []), speech_regions)
+            
+            # 生成 SRT 字幕
+            if streamed_srt is not None:
+                srt_content = streamed_srt
+            elif use_optimizer:
+                self.set_status("正在生成優化的 SRT 字幕...", "blue")
+                if word_aligner is not None and not word_aligner.language:
+                    # 自動偵測語言時以偵測結果選擇分詞方式（日文、中文不以空白斷詞）
+                    word_aligner.language = result.get("language")
+                try:
+                    srt_content = optimizer.generate_optimized_srt(
+                        result=result,
+                        language=language,
+                        filter_repetitive=self.settings["filter_repetitive"],
+                        merge_short_segments=True,
+                        word_aligner=word_aligner
+                    )
+                except Exception as e:
+                    self.log(f"❌ 生成優化 SRT 失敗: {e}")
+                    import traceback
+                    self.log(f"🔍 詳細錯誤:\n{traceback.format_exc()}")
+                    return False
+            else:
+                self.set_status("正在生成 SRT 字幕...", "blue")
+                srt_content = self.generate_basic_srt(result)
+            
+            # 寫入檔案（串流模式已邊轉錄邊寫入）
+            try:
+                if streamed_srt is None:
+                    with open(output_srt, 'w', encoding='utf-8') as f:
+                        f.write(srt_content)
+                self.log(f"✅ 檔案寫入成功: {output_srt}")
+                if checkpoint is not None:
+                    # 字幕已完成，之後重新執行會使用結果快取
+                    checkpoint.clear()
+            except Exception as e:
+                self.log(f"❌ 檔案寫入失敗: {e}")
+                import traceback
+                self.log(f"🔍 詳細錯誤:\n{traceback.format_exc()}")
+                return False
+            
+            # 驗證檔案是否成功寫入
+            if os.path.exists(output_srt):
+                file_size = os.path.getsize(output_srt)
+                subtitle_count = srt_content.count('-->')
+                original_count = len(result.get("segments", []))
+                
+                self.log(f"✅ 優化的 SRT 檔案已生成: {output_srt}")
+                self.log(f"📊 檔案大小: {file_size} bytes")
+                self.log(f"📊 原始片段: {original_count}, 優化後: {subtitle_count}")
+                self.summary = {
+                    "mode": "optimized" if use_optimizer else "basic",
+                    "model": self.settings["model"],
+                    "device": device,
+                    "language": result.get("language"),
+                    "original_segments": original_count,
+                    "subtitle_count": subtitle_count,
+                    "output_srt": output_srt,
+                    "audio_seconds": len(audio) / 16000 if not isinstance(audio, str) else None,
+                }
+                
+                report_extra = {"language": self.get_language_report(result)}
+                if encoder_stats:
+                    self.summary["encoder_cache"] = encoder_stats
+                    report_extra["encoder_cache"] = encoder_stats
+                if guard_stats:
+                    self.summary["loop_guard"] = guard_stats
+                    report_extra["loop_guard"] = guard_stats
+                if suppression_stats:
+                    self.summary["phrase_suppression"] = suppression_stats
+                    report_extra["phrase_suppression"] = suppression_stats
+                if fallback_stats:
+                    self.summary["fallbacks"] = fallback_stats
+                    report_extra["fallbacks"] = fallback_stats
+                if result.get("multi_pass"):
+                    self.summary["multi_pass"] = result["multi_pass"]
+                    report_extra["multi_pass"] = result["multi_pass"]
+                if result.get("cascade"):
+                    self.summary["cascade"] = result["cascade"]
+                    report_extra["cascade"] = result["cascade"]
+                if word_aligner is not None:
+                    alignment_stats = word_aligner.get_stats(original_count)
+                    self.summary["word_alignment"] = alignment_stats
+                    report_extra["word_alignment"] = alignment_stats
+                    self.log(f"⏱️ 字詞時間戳: 對齊 {alignment_stats['aligned_segments']}/{original_count} 個片段, "
+                             f"耗時 {alignment_stats['align_seconds']:.2f} 秒, "
+                             f"估計省下 {alignment_stats['estimated_saved_seconds']:.2f} 秒")
+                
+                if use_optimizer and original_count > 0:
+                    reduction_rate = (original_count - subtitle_count) / original_count * 100
+                    self.log(f"📊 優化率: {reduction_rate:.1f}% (移除了 {original_count - subtitle_count} 個低品質片段)")
+                
+                # 保存優化報告
+                if use_optimizer:
+                    try:
+                        quality_scores = []
+                        for segment in result.get("segments", []):
+                            if "avg_logprob" in segment:
+                                quality_scores.append(max(0, min(1, (segment["avg_logprob"] + 3) / 3)))
+                        
+                        optimizer.save_optimization_report(
+                            original_segments=original_count,
+                            final_segments=subtitle_count,
+                            quality_scores=quality_scores,
+                            output_path=output_srt,
+                            extra=report_extra
+                        )
+                    except Exception as e:
+                        self.log(f"⚠️ 保存優化報告失敗: {e}")
+                
+                if subtitle_count > 0:
+                    if use_optimizer:
+                        self.set_status("✅ 優化版 Python API 字幕生成完成！", "green")
+                    else:
+                        self.set_status("✅ Python API 字幕生成完成！", "green")
+                    return True
+                else:
+                    self.log("⚠️ 字幕檔案為空，可能需要調整參數")
+                    return False
+            else:
+                self.log("❌ 檔案寫入失敗")
+                return False
+            
+        except Exception as e:
+            import traceback
+            error_details = traceback.format_exc()
+            self.log(f"❌ 優化版 Python API 執行失敗: {e}")
+            self.log(f"� 詳細錯誤信息:\n{error_details}")
+            return False
+    
+    def pin_language(self, model, audio, speech_regions=None) -> Optional[str]:
+        """
+        取得本次轉錄固定使用的語言
+
+        指定語言時直接使用；自動偵測時以多個時間窗投票，結果保留給回退的基本版使用
+        """
+        if self.settings["language"] != "auto":
+            return self.settings["language"]
+        if self.language_detection is not None:
+            return self.language_detection.get("language")
+        if isinstance(audio, str):
+            return None
+        try:
+            from language_detection import detect_language
+            self.set_status("正在偵測語言...", "blue")
+            self.language_detection = detect_language(model, audio, speech_regions=speech_regions, log=self.log)
+        except Exception as e:
+            self.log(f"⚠️ 多窗口語言偵測失敗，由 Whisper 自行偵測: {e}")
+            self.language_detection = {"language": None}
+        return self.language_detection.get("language")
+    
+    def get_language_report(self, result: Dict[str, Any]) -> Dict[str, Any]:
+        """優化報告中的語言資訊（指定、多窗口偵測或由 Whisper 偵測）"""
+        if self.settings["language"] != "auto":
+            return {"language": self.settings["language"], "source": "specified"}
+        if self.language_detection and self.language_detection.get("language"):
+            return dict(self.language_detection, source="detected")
+        return {"language": result.get("language"), "source": "whisper"}
+    
+    def get_model_download_root(self):
+        """取得模型目錄（未使用自訂位置時為 None，交由 Whisper 決定）"""
+        return self.settings.get("download_root") or None
+    
+    def is_long_audio(self, audio) -> bool:
+        """
+        是否為需要保存檢查點的長音訊
+
+        串流輸出本來就逐窗轉錄，長音訊一律保存檢查點；其他模式只在啟用 checkpoint_long_files 時
+        改為逐窗轉錄以保存檢查點
+        """
+        return (not isinstance(audio, str)
+                and len(audio) / 16000 >= self.settings["checkpoint_min_seconds"])
+    
+    def get_decode_key(self, input_file: str, device: str, decode_mode: str,
+                       params: Dict[str, Any]) -> Optional[str]:
+        """建立解碼結果的識別鍵，供結果快取和檢查點使用（無法計算雜湊時返回 None）"""
+        try:
+            from audio_cache import audio_cache
+            from result_cache import TranscriptionResultCache
+            return TranscriptionResultCache.make_key(
+                audio_cache.file_hash(input_file),
+                self.settings["model"],
+                params,
+                device=device,
+                decode_mode=decode_mode,
+                quantized=self.use_quantized_model(device),
+                loop_guard=self.decoding_guard.get_config() if self.decoding_guard is not None else None,
+                phrase_suppression=(self.phrase_suppressor.get_config()
+                                    if self.phrase_suppressor is not None else None)
+            )
+        except Exception as e:
+            self.log(f"⚠️ 無法建立轉錄結果快取鍵: {e}")
+            return None
+    
+    def load_cached_result(self, cache_key: Optional[str]):
+        """讀取快取的轉錄結果"""
+        if cache_key is None:
+            return None
+        from result_cache import result_cache
+        
+        start_time = time.time()
+        result_cache.max_size_mb = self.settings["result_cache_mb"]
+        result = result_cache.get(cache_key)
+        if result is not None:
+            self.log(f"♻️ 使用快取的轉錄結果，跳過解碼 ({(time.time() - start_time) * 1000:.0f} ms)")
+        return result
+    
+    def store_cached_result(self, cache_key: Optional[str], result: Dict[str, Any], decode_mode: str):
+        """保存轉錄結果，失敗時只記錄警告"""
+        if cache_key is None:
+            return
+        from result_cache import result_cache
+        
+        try:
+            result_cache.max_size_mb = self.settings["result_cache_mb"]
+            result_cache.put(cache_key, result, meta={"model": self.settings["model"], "decode_mode": decode_mode})
+        except Exception as e:
+            self.log(f"⚠️ 保存轉錄結果快取失敗: {e}")
+    
+    def apply_cpu_plan(self, device: str):
+        """CPU 轉錄時依規劃設定每個工作的 torch 執行緒數"""
+        if device != "cpu":
+            return
+        try:
+            import torch
+            threads = self.settings["cpu_threads"]
+            source = "設定"
+            if not threads:
+                from cpu_planner import plan_cpu_execution
+                plan = plan_cpu_execution(self.settings["model"],
+                                          quantize=self.use_quantized_model(device),
+                                          max_jobs=1)
+                threads = plan["threads_per_job"]
+                source = "校準" if plan["source"] == "calibration" else "自動"
+            torch.set_num_threads(threads)
+            self.log(f"🧵 CPU 執行緒: {threads} ({source})")
+        except Exception as e:
+            self.log(f"⚠️ 無法設定 CPU 執行緒數: {e}")
+    
+    def use_quantized_model(self, device: str) -> bool:
+        """是否使用 int8 動態量化模型（只在 CPU 上啟用）"""
+        return bool(self.settings["cpu_quantization"]) and device == "cpu"
+    
+    def preload_model(self):
+        """
+        在背景執行緒載入設定中的模型（不輸出設備相關日誌）
+
+        之後轉錄時 load_whisper_model 直接重用已載入的模型，仍在載入時等待完成而不會重複載入
+
+        Returns:
+            載入用的執行緒，模型已載入或正在載入時為 None
+        """
+        from whisper_model_manager import model_registry
+        
+        device = "cpu"
+        if self.settings["use_gpu"]:
+            try:
+                import torch
+                if torch.cuda.is_available():
+                    device = "cuda"
+            except ImportError:
+                pass
+        
+        model_registry.set_memory_budget(self.settings["model_cache_mb"], log=self.log)
+        return model_registry.preload(
+            self.settings["model"],
+            device=device,
+            download_root=self.get_model_download_root(),
+            log=self.log,
+            quantize=self.use_quantized_model(device)
+        )
+    
+    def load_whisper_model(self, device: str, name: Optional[str] = None):
+        """從共用模型登錄表取得 Whisper 模型（name 預設為設定中的模型）"""
+        from whisper_model_manager import model_registry
+        
+        model_registry.set_memory_budget(self.settings["model_cache_mb"], log=self.log)
+        model = model_registry.get_model(
+            name or self.settings["model"],
+            device=device,
+            download_root=self.get_model_download_root(),
+            log=self.log,
+            quantize=self.use_quantized_model(device)
+        )
+        
+        if self._guard_scope is not None:
+            # 只在本次轉錄的執行緒中使用這次的檢查器，run 結束時移除
+            from decoding_guard import decoding_guards
+            self._guard_scope.enter_context(decoding_guards(model, [self.decoding_guard, self.phrase_suppressor]))
+        
+        memory_mb = self.settings["encoder_cache_mb"] if self.reuse_encoder_output else 0
+        if memory_mb > 0 or self.settings["encoder_disk_cache"]:
+            from encoder_cache import EncoderFeatureStore, attach_encoder_cache
+            cache_name = name or self.settings["model"]
+            store = None
+            if self.settings["encoder_disk_cache"]:
+                # 量化模型的編碼器輸出與原模型不同，分開保存
+                namespace = os.path.basename(cache_name) + ("-int8" if self.use_quantized_model(device) else "")
+                store = EncoderFeatureStore(namespace, max_size_mb=self.settings["encoder_disk_cache_mb"])
+            cache = attach_encoder_cache(model, memory_mb, store)
+            if cache_name not in self.encoder_caches:
+                cache.reset_stats()
+            self.encoder_caches[cache_name] = cache
+        else:
+            # 常駐模型可能留有前一個工作安裝的快取；每個時間窗只解碼一次時不需要計算 mel 雜湊
+            from encoder_cache import detach_encoder_cache
+            detach_encoder_cache(model)
+        
+        stats = model_registry.get_stats()
+        self.log(f"📊 模型快取: 命中 {stats['hits']} / 未命中 {stats['misses']}, "
+                 f"累計載入 {stats['total_load_time']:.1f} 秒, "
+                 f"常駐 {stats['used_memory_mb']:.0f}/{stats['max_memory_mb']} MB")
+        return model
+    
+    @staticmethod
+    def redecodes_windows(decode_mode: str) -> bool:
+        """
+        解碼模式是否會重新解碼同一個時間窗
+
+        多次通過（各溫度或逐窗回退）和模型串接（精確模型重做）會再次編碼相同的時間窗；
+        其他模式只以第一個溫度解碼，每個時間窗只編碼一次
+        """
+        return decode_mode.startswith(("multi_pass:", "cascade:"))
+    
+    def count_fallbacks(self, result: Dict[str, Any], temperature, audio_seconds: float) -> Dict[str, Any]:
+        """
+        統計以高於最低溫度解碼的時間窗（每小時音訊的回退次數）
+        
+        seek 是相對於各自片段（平行、分窗、串流轉錄）的位置，不同片段會重複，
+        所以以 seek 相同的連續片段為一個時間窗，並以第一個片段的絕對開始時間為鍵
+        """
+        temperatures = temperature if isinstance(temperature, (list, tuple)) else [temperature]
+        base_temperature = min(temperatures) if temperatures else 0.0
+        windows: Dict[float, float] = {}
+        window_start = previous_seek = None
+        for segment in result.get("segments", []):
+            seek = segment.get("seek")
+            if window_start is None or seek is None or seek != previous_seek:
+                window_start = round(float(segment.get("start", 0.0)), 2)
+            previous_seek = seek
+            windows[window_start] = max(windows.get(window_start, base_temperature),
+                                        segment.get("temperature", base_temperature))
+        fallback_windows = sum(1 for value in windows.values() if value > base_temperature)
+        return {
+            "windows": len(windows),
+            "fallback_windows": fallback_windows,
+            "fallbacks_per_hour": round(fallback_windows / audio_seconds * 3600, 2) if audio_seconds > 0 else 0.0,
+        }
+    
+    def release_encoder_caches(self) -> Optional[Dict[str, Any]]:
+        """記錄編碼器輸出共用的命中統計並釋放快取的輸出（常駐模型不保留上一個檔案的輸出）"""
+        if not self.encoder_caches:
+            return None
+        hits = disk_hits = misses = 0
+        for cache in self.encoder_caches.values():
+            stats = cache.get_stats()
+            hits += stats["hits"]
+            disk_hits += stats["disk_hits"]
+            misses += stats["misses"]
+            cache.clear()
+            if cache.store is not None:
+                cache.store.evict()
+        self.encoder_caches = {}
+        total = hits + disk_hits + misses
+        if total == 0:
+            return None
+        self.log(f"📊 編碼器輸出共用: 命中 {hits} / 磁碟命中 {disk_hits} / 編碼 {misses} 個時間窗")
+        return {"hits": hits, "disk_hits": disk_hits, "misses": misses,
+                "hit_rate": round((hits + disk_hits) / total, 3)}
+    
+    def on_partial_segments(self, segments, progress: float):
+        """串流輸出的片段回呼：保存部分結果並轉交給呼叫端"""
+        self.partial_segments.extend(segments)
+        if self.segment_callback is not None:
+            self.segment_callback(segments, progress)
+            return
+        for segment in segments:
+            self.log(f"   [{self.seconds_to_srt_time(segment['start'])}] {segment['text'].strip()}")
+    
+    def detect_speech_regions(self, audio, content_type: str, optimizer=None):
+        """以能量 VAD 偵測有聲區段，並記錄跳過的靜音比例"""
+        try:
+            if optimizer is not None:
+                regions = optimizer.detect_speech_regions(audio, content_type)
+            else:
+                from audio_segmentation import detect_speech_regions
+                regions = detect_speech_regions(audio)
+        except Exception as e:
+            self.log(f"⚠️ VAD 偵測失敗，改為轉錄完整音訊: {e}")
+            return None
+        
+        total_seconds = len(audio) / 16000
+        speech_seconds = sum(region["end"] - region["start"] for region in regions)
+        if total_seconds > 0:
+            self.log(f"🔇 VAD ({content_type}): {len(regions)} 個有聲區段, "
+                     f"跳過 {total_seconds - speech_seconds:.1f} 秒靜音 "
+                     f"({(1 - speech_seconds / total_seconds) * 100:.1f}%)")
+        return regions
+    
+    def load_job_audio(self, input_file: str):
+        """取得輸入檔案的共用 PCM 緩衝區，失敗時返回原始路徑"""
+        try:
+            from audio_cache import audio_cache, load_audio_pcm
+            audio_cache.max_size_mb = self.settings["audio_cache_mb"]
+            return load_audio_pcm(input_file, log=self.log,
+                                  extra_tracks=self.settings["extra_audio_tracks"])
+        except Exception as e:
+            self.log(f"⚠️ 音訊預先解碼失敗，改由 Whisper 自行解碼: {e}")
+            return input_file
+    
+    def generate_basic_srt(self, result):
+        """生成基本的 SRT 字幕（無優化器時使用）"""
+        srt_content = ""
+        segments = result.get("segments", [])
+        
+        for i, segment in enumerate(segments, 1):
+            start_time = segment["start"]
+            end_time = segment["end"]
+            text = self.strip_truncated_phrases(segment["text"]).strip()
+            
+            if not text:
+                continue
+            
+            # 格式化時間
+            start_str = self.seconds_to_srt_time(start_time)
+            end_str = self.seconds_to_srt_time(end_time)
+            
+            # 添加字幕片段
+            srt_content += f"{i}\n"
+            srt_content += f"{start_str} --> {end_str}\n"
+            srt_content += f"{text}\n\n"
+        
+        return srt_content
+    
+    def run_basic(self, input_file: str, output_srt: str) -> bool:
+        """基本版本的 Whisper API（作為備用方案）"""
+        try:
+            import warnings
+            warnings.filterwarnings("ignore", message=".*Failed to launch Triton kernels.*")
+            warnings.filterwarnings("ignore", message=".*falling back to a slower.*")
+            
+            import whisper
+            
+            self.log("🔄 使用基本版 Python API...")
+            
+            # 檢查輸入檔案是否存在
+            if not os.path.exists(input_file):
+                raise FileNotFoundError(f"輸入檔案不存在: {input_file}")
+                
+            # 檢查輸出目錄是否存在，如果不存在則創建
+            output_dir = os.path.dirname(output_srt)
+            if output_dir and not os.path.exists(output_dir):
+                try:
+                    os.makedirs(output_dir, exist_ok=True)
+                    self.log(f"🔧 創建輸出目錄: {output_dir}")
+                except Exception as e:
+                    self.log(f"❌ 創建輸出目錄失敗: {e}")
+                    return False
+            
+            # 決定使用的設備
+            device = "cpu"
+            if self.settings["use_gpu"]:
+                try:
+                    import torch
+                    if torch.cuda.is_available():
+                        device = "cuda"
+                        self.log("🚀 基本API使用 GPU 加速")
+                    else:
+                        self.log("💻 GPU不可用，基本API使用 CPU")
+                except ImportError:
+                    self.log("💻 PyTorch未安裝，基本API使用 CPU")
+            else:
+                self.log("💻 基本API強制使用 CPU")
+            self.apply_cpu_plan(device)
+            
+            # 載入模型（優化版已載入時直接共用同一個模型）
+            try:
+                model = self.load_whisper_model(device)
+                self.log(f"✅ 模型載入成功")
+            except Exception as e:
+                self.log(f"❌ 模型載入失敗: {e}")
+                return False
+            
+            # 重用優化版已解碼的 PCM
+            audio = self.load_job_audio(input_file)
+            
+            # 基本轉錄選項（自動偵測時沿用優化版偵測到的語言）
+            language = self.pin_language(model, audio)
+            options = {
+                "language": language,
+                "task": "transcribe",
+                "no_speech_threshold": self.settings["no_speech_threshold"],
+                "temperature": self.settings["temperature"],
+                "condition_on_previous_text": False,
+            }
+            
+            if self.settings["language"] == "auto":
+                self.log(f"🔍 基本API使用自動偵測的語言: {language or '由 Whisper 偵測'}")
+            else:
+                self.log(f"🌍 基本API使用指定語言: {language}")
+            
+            # 執行轉錄
+            try:
+                self.log("🚀 開始轉錄...")
+                with warnings.catch_warnings():
+                    warnings.simplefilter("ignore")
+                    result = model.transcribe(audio, **options)
+                self.log("✅ 轉錄完成")
+            except Exception as e:
+                self.log(f"❌ 轉錄失敗: {e}")
+                import traceback
+                self.log(f"🔍 詳細錯誤:\n{traceback.format_exc()}")
+                return False
+            
+            # 生成基本 SRT
+            try:
+                self.log("📝 生成 SRT 內容...")
+                srt_content = self.generate_srt_from_result(result)
+                self.log("✅ SRT 內容生成完成")
+            except Exception as e:
+                self.log(f"❌ SRT 生成失敗: {e}")
+                import traceback
+                self.log(f"🔍 詳細錯誤:\n{traceback.format_exc()}")
+                return False
+            
+            # 寫入檔案
+            try:
+                with open(output_srt, 'w', encoding='utf-8') as f:
+                    f.write(srt_content)
+                self.log(f"✅ 檔案寫入成功: {output_srt}")
+            except Exception as e:
+                self.log(f"❌ 檔案寫入失敗: {e}")
+                import traceback
+                self.log(f"🔍 詳細錯誤:\n{traceback.format_exc()}")
+                return False
+            
+            if os.path.exists(output_srt):
+                subtitle_count = srt_content.count('-->')
+                self.log(f"✅ 基本版 SRT 檔案已生成，字幕片段: {subtitle_count} 個")
+                self.summary = {
+                    "mode": "basic",
+                    "model": self.settings["model"],
+                    "device": device,
+                    "language": result.get("language"),
+                    "original_segments": len(result.get("segments", [])),
+                    "subtitle_count": subtitle_count,
+                    "output_srt": output_srt,
+                    "audio_seconds": len(audio) / 16000 if not isinstance(audio, str) else None,
+                }
+                return subtitle_count > 0
+            
+            return False
+            
+        except Exception as e:
+            import traceback
+            error_details = traceback.format_exc()
+            self.log(f"❌ 基本版 API 也失敗: {e}")
+            self.log(f"🔍 詳細錯誤信息:\n{error_details}")
+            return False
+    
+    def generate_srt_from_result(self, result) -> str:
+        """從 Whisper 結果生成 SRT 格式"""
+        srt_content = ""
+        filtered_segments = []
+        
+        # 過濾重複和無意義的內容
+        for segment in result["segments"]:
+            text = self.strip_truncated_phrases(segment["text"]).strip()
+            
+            # 跳過空白或太短的內容
+            if len(text) < 2:
+                continue
+            
+            # 過濾重複內容
+            if self.settings["filter_repetitive"]:
+                # 檢查是否與前面的內容重複
+                is_repetitive = False
+                for prev_segment in filtered_segments[-3:]:  # 檢查最近3個片段
+                    if self.is_similar_text(text, prev_segment["text"]):
+                        is_repetitive = True
+                        break
+                
+                if is_repetitive:
+                    self.log(f"⚠️ 跳過重複內容: {text[:30]}...")
+                    continue
+            
+            # 使用增強版音樂內容過濾器
+            try:
+                from enhanced_music_filter import filter_music_content
+                should_keep, cleaned_text = filter_music_content(text)
+                
+                if not should_keep:
+                    continue
+                
+                # 使用清理後的文字
+                text = cleaned_text
+                
+            except ImportError:
+                # 如果增強版過濾器不可用，使用基本過濾
+                meaningless_patterns = [
+                    "作詞・作曲・編曲", "作詞", "作曲", "編曲",
+                    "初音ミク", "ボーカロイド", "VOCALOID",
+                    "♪", "♫", "♬", "♩"
+                ]
+                
+                is_meaningless = any(pattern in text for pattern in meaningless_patterns)
+                if is_meaningless and (len(text) < 50 or text.count("作詞") > 2):
+                    self.log(f"⚠️ 跳過無意義內容: {text[:30]}...")
+                    continue
+            
+            filtered_segments.append({
+                "start": segment["start"],
+                "end": segment["end"],
+                "text": text
+            })
+        
+        # 生成 SRT 內容
+        for i, segment in enumerate(filtered_segments, 1):
+            start_time = self.seconds_to_srt_time(segment["start"])
+            end_time = self.seconds_to_srt_time(segment["end"])
+            text = segment["text"]
+            
+            srt_content += f"{i}\n"
+            srt_content += f"{start_time} --> {end_time}\n"
+            srt_content += f"{text}\n\n"
+        
+        self.log(f"📊 原始片段: {len(result['segments'])}, 過濾後: {len(filtered_segments)}")
+        return srt_content
+    
+    def strip_truncated_phrases(self, text: str) -> str:
+        """刪除片語抑制在片語完成前結束片段時留下的前綴（沒有片語抑制時不變）"""
+        if self.phrase_suppressor is None:
+            return text
+        return self.phrase_suppressor.strip_truncated(text)
+    
+    def is_similar_text(self, text1: str, text2: str, threshold: float = 0.8) -> bool:
+        """檢查兩個文字是否相似"""
+        # 簡單的相似度檢查
+        if text1 == text2:
+            return True
+        
+        # 檢查包含關係
+        if len(text1) > 10 and len(text2) > 10:
+            if text1 in text2 or text2 in text1:
+                return True
+        
+        # 檢查字符重疊度
+        set1 = set(text1.lower())
+        set2 = set(text2.lower())
+        if len(set1) > 0 and len(set2) > 0:
+            overlap = len(set1.intersection(set2))
+            similarity = overlap / max(len(set1), len(set2))
+            return similarity > threshold
+        
+        return False
+    
+    def seconds_to_srt_time(self, seconds: float) -> str:
+        """將秒數轉換為 SRT 時間格式"""
+        hours = int(seconds // 3600)
+        minutes = int((seconds % 3600) // 60)
+        secs = int(seconds % 60)
+        millisecs = int((seconds % 1) * 1000)
+        
+        return f"{hours:02d}:{minutes:02d}:{secs:02d},{millisecs:03d}"
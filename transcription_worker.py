@@ -0,0 +1,276 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+常駐轉錄工作程序
+在獨立程序中常駐 Whisper 模型，透過佇列接收轉錄工作並回傳結構化的進度與結果
+"""
+
+import time
+import queue
+import itertools
+import threading
+import traceback
+import multiprocessing
+from typing import Dict, Any, Optional, Callable
+
+
+def _run_job(job: Dict[str, Any], event_queue):
+    """執行單一工作並以 done 事件回報結果"""
+    from transcription_pipeline import TranscriptionPipeline
+
+    job_id = job["job_id"]
+
+    def emit(event_type: str, **payload):
+        event_queue.put(dict(payload, type=event_type, job_id=job_id))
+
+    def on_segments(segments, progress):
+        emit("segments", progress=progress,
+             segments=[{"start": s["start"], "end": s["end"], "text": s.get("text", "")}
+                       for s in segments])
+
+    start_time = time.time()
+    try:
+        if job["command"] == "transcribe":
+            pipeline = TranscriptionPipeline(
+                job["settings"],
+                log=lambda message: emit("log", message=message),
+                set_status=lambda message, color="black": emit("status", message=message, color=color),
+                segment_callback=on_segments
+            )
+            success = pipeline.run(job["input_file"], job["output_srt"])
+            emit("done", success=success, summary=pipeline.summary,
+                 elapsed=time.time() - start_time)
+        elif job["command"] == "preload":
+            # 在背景執行緒載入，工作程序立即可接收下一個工作；轉錄工作會等待載入完成後重用模型
+            pipeline = TranscriptionPipeline(job["settings"], log=print)
+            thread = pipeline.preload_model()
+            emit("done", success=True, summary={"model": pipeline.settings["model"], "started": thread is not None},
+                 elapsed=time.time() - start_time)
+        elif job["command"] == "stats":
+            from whisper_model_manager import model_registry
+            emit("done", success=True, summary=model_registry.get_stats(),
+                 elapsed=time.time() - start_time)
+        else:
+            emit("done", success=False, error=f"未知的指令: {job['command']}",
+                 elapsed=time.time() - start_time)
+    except Exception as e:
+        emit("done", success=False, error=str(e), traceback=traceback.format_exc(),
+             elapsed=time.time() - start_time)
+
+
+def _worker_main(job_queue, event_queue):
+    """
+    工作程序主迴圈：模型由程序內的登錄表常駐，直到收到 None 為止
+
+    轉錄工作依序在轉錄執行緒執行；preload 和 stats 立即在主迴圈處理，不需要等待進行中的轉錄
+    """
+    import warnings
+    warnings.filterwarnings("ignore")
+
+    import transcription_pipeline  # 回報 ready 前先完成匯入（torch 和 whisper）
+
+    transcribe_jobs: "queue.Queue[Optional[Dict[str, Any]]]" = queue.Queue()
+
+    def run_transcriptions():
+        while True:
+            job = transcribe_jobs.get()
+            if job is None:
+                break
+            _run_job(job, event_queue)
+
+    runner = threading.Thread(target=run_transcriptions, name="transcription-runner", daemon=True)
+    runner.start()
+
+    event_queue.put({"type": "ready"})
+    while True:
+        job = job_queue.get()
+        if job is None:
+            transcribe_jobs.put(None)
+            runner.join()
+            break
+        if job["command"] == "transcribe":
+            transcribe_jobs.put(job)
+        else:
+            _run_job(job, event_queue)
+
+
+class TranscriptionWorker:
+    """
+    常駐轉錄工作程序的用戶端
+
+    可從多個執行緒同時送出工作：事件讀取執行緒依 job_id 把事件分送給各工作，
+    因此預先載入或統計查詢不需要等待進行中的轉錄。cancel 以終止工作程序的方式取消轉錄。
+    """
+
+    def __init__(self, start_timeout: float = 60.0):
+        """
+        Args:
+            start_timeout: 等待工作程序啟動的秒數
+        """
+        self.start_timeout = start_timeout
+        # 以 spawn 啟動乾淨的程序，避免複製 GUI 的 Tk 狀態和執行緒
+        self._context = multiprocessing.get_context("spawn")
+        self._process = None
+        self._job_queue = None
+        self._event_queue = None
+        # 目前工作程序的進行中工作：job_id -> 事件佇列
+        self._pending: Dict[int, "queue.Queue[Dict[str, Any]]"] = {}
+        self._job_ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def is_alive(self) -> bool:
+        """工作程序是否仍在執行"""
+        return self._process is not None and self._process.is_alive()
+
+    def start(self):
+        """啟動工作程序（已在執行時不做任何事）"""
+        with self._lock:
+            self._start()
+
+    def _start(self):
+        if self.is_alive():
+            return
+        self._job_queue = self._context.Queue()
+        self._event_queue = self._context.Queue()
+        self._pending = {}
+        self._process = self._context.Process(
+            target=_worker_main,
+            args=(self._job_queue, self._event_queue),
+            name="whisper-transcription-worker",
+            daemon=True
+        )
+        self._process.start()
+
+        try:
+            event = self._event_queue.get(timeout=self.start_timeout)
+        except queue.Empty:
+            self._terminate()
+            raise RuntimeError("轉錄工作程序啟動逾時")
+        if event.get("type") != "ready":
+            self._terminate()
+            raise RuntimeError(f"轉錄工作程序啟動失敗: {event}")
+
+        threading.Thread(target=self._read_events,
+                         args=(self._process, self._event_queue, self._pending),
+                         name="transcription-worker-events", daemon=True).start()
+
+    def _read_events(self, process, event_queue, pending: Dict[int, "queue.Queue[Dict[str, Any]]"]):
+        """把工作程序的事件分送給對應的工作；工作程序結束時通知所有未完成的工作"""
+        while True:
+            try:
+                event = event_queue.get(timeout=1.0)
+            except queue.Empty:
+                if process.is_alive():
+                    continue
+                break
+            except (EOFError, OSError):
+                break
+            with self._lock:
+                events = pending.get(event.get("job_id"))
+            if events is not None:
+                events.put(event)
+
+        with self._lock:
+            waiting = list(pending.values())
+            pending.clear()
+            if self._process is process:
+                self._process = None
+        for events in waiting:
+            events.put({"type": "exit", "exitcode": process.exitcode})
+
+    def submit(self,
+               command: str,
+               on_event: Optional[Callable[[Dict[str, Any]], None]] = None,
+               **job: Any) -> Dict[str, Any]:
+        """
+        送出工作並等待完成
+
+        Args:
+            command: 工作指令（transcribe / preload / stats）
+            on_event: 進度事件回呼（log / status / segments）
+            **job: 工作內容，transcribe 需要 input_file、output_srt、settings，preload 需要 settings
+
+        Returns:
+            done 事件：success、summary、elapsed，失敗時另有 error 和 traceback，
+            被 cancel 取消時 cancelled 為 True
+        """
+        events: "queue.Queue[Dict[str, Any]]" = queue.Queue()
+        with self._lock:
+            self._start()
+            job_id = next(self._job_ids)
+            self._pending[job_id] = events
+            self._job_queue.put(dict(job, command=command, job_id=job_id))
+
+        while True:
+            event = events.get()
+            if event["type"] == "done":
+                with self._lock:
+                    self._pending.pop(job_id, None)
+                return event
+            if event["type"] == "exit":
+                raise RuntimeError(f"轉錄工作程序意外結束 (exit code {event['exitcode']})")
+            if on_event is not None:
+                on_event(event)
+
+    def cancel(self, timeout: float = 5.0) -> bool:
+        """
+        取消進行中的工作（終止工作程序，下一個工作會重新啟動並重新載入模型）
+
+        沒有進行中的工作時不終止工作程序，保留已載入的模型
+
+        Returns:
+            是否有工作被取消
+        """
+        with self._lock:
+            if not self._pending:
+                return False
+            process = self._process
+            waiting = list(self._pending.values())
+            self._pending.clear()
+            self._process = None
+        for events in waiting:
+            events.put({"type": "done", "success": False, "cancelled": True,
+                        "error": "工作已取消", "elapsed": 0.0})
+        if process is not None and process.is_alive():
+            process.terminate()
+            process.join(timeout)
+        return True
+
+    def transcribe(self,
+                   input_file: str,
+                   output_srt: str,
+                   settings: Dict[str, Any],
+                   on_event: Optional[Callable[[Dict[str, Any]], None]] = None) -> Dict[str, Any]:
+        """在工作程序中將檔案轉錄為 SRT"""
+        return self.submit("transcribe", on_event=on_event,
+                           input_file=input_file, output_srt=output_srt, settings=settings)
+
+    def preload(self, settings: Dict[str, Any]) -> Dict[str, Any]:
+        """啟動工作程序並在背景載入設定中的模型（不等待載入完成）"""
+        return self.submit("preload", settings=settings)
+
+    def stop(self, timeout: float = 5.0):
+        """通知工作程序結束，逾時則強制終止"""
+        with self._lock:
+            process = self._process
+            self._process = None
+        if process is None:
+            return
+        if process.is_alive():
+            try:
+                self._job_queue.put(None)
+            except Exception:
+                pass
+            process.join(timeout)
+            if process.is_alive():
+                process.terminate()
+                process.join(timeout)
+
+    def _terminate(self):
+        """啟動失敗時終止工作程序（呼叫端持有鎖）"""
+        process = self._process
+        self._process = None
+        if process is not None and process.is_alive():
+            process.terminate()
+            process.join(5.0)
@@ -236,10 +236,20 @@ class VideoProcessor:
             # 應用字幕到影片
             final_video = video.fl(add_subtitle_to_frame, apply_to=['mask'])
             
+            # 使用共用音訊快取中的 AAC 音軌直接複製，不必再次解碼和編碼音訊
+            audio_track = True
+            if video.audio is not None:
+                try:
+                    from audio_cache import audio_cache
+                    audio_track = audio_cache.extract(video_path, ("burn",), log=print)["burn"]
+                except Exception as e:
+                    print(f"無法使用快取音軌，改由 moviepy 處理音訊: {e}")
+            
             # 輸出影片
             print("正在輸出影片...")
             final_video.write_videofile(
                 output_path,
+                audio=audio_track,
                 codec='libx264',
                 audio_codec='aac',
                 temp_audiofile=None,  # 讓 moviepy 自動處理臨時檔案
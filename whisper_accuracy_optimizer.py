@@ -9,7 +9,7 @@ import os
 import re
 import json
 import warnings
-from typing import Dict, List, Tuple, Optional, Any
+from typing import Dict, List, Tuple, Optional, Any, Union, Callable, Iterable, Iterator
 from pathlib import Path
 import difflib
 
@@ -17,12 +17,21 @@ import difflib
 warnings.filterwarnings("ignore", message=".*Failed to launch Triton kernels.*")
 warnings.filterwarnings("ignore", message=".*falling back to a slower.*")
 
+
+class PassCancelled(Exception):
+    """多次通過轉錄中，已不可能勝過目前最佳結果而中止的溫度"""
+    
+    def __init__(self, covered_seconds: float = 0.0):
+        super().__init__(f"已中止 (完成 {covered_seconds:.1f} 秒)")
+        self.covered_seconds = covered_seconds
+
 class WhisperAccuracyOptimizer:
     """Whisper 識別準確度優化器"""
     
     def __init__(self):
         self.load_optimization_config()
         self.setup_language_specific_rules()
+        self._blocked_metadata_phrases = None
         
     def load_optimization_config(self):
         """載入優化配置"""
@@ -76,6 +85,79 @@ class WhisperAccuracyOptimizer:
                 "beam_size": 5,
                 "patience": 2.0,
                 "length_penalty": 1.2,
+            },
+            
+            # 多次通過轉錄的提前結束：逐窗評分，不可能勝過目前最佳結果的溫度中止，
+            # 已有結果達到「足夠好」的分數時不再執行其餘溫度。
+            # 提前結束需要逐窗轉錄，時間窗邊界和前文與整段轉錄不同，因此預設關閉
+            # （關閉時每個溫度都完整轉錄，ultra 品質的轉錄時間約為溫度數倍）
+            "multi_pass": {
+                "early_stop": False,
+                "good_enough_score": 0.93,  # 約相當於 avg_logprob -0.5 且其他項目正常
+                "window_seconds": 120.0,  # 每個溫度逐窗轉錄的時間窗長度
+                "segment_rate_slack": 1.25,  # 以此溫度已轉錄部分的片段密度估計剩餘片段數時放寬的倍數
+            },
+            
+            # 逐窗溫度回退（只重新解碼品質不足的時間窗）
+            "window_fallback": {
+                "window_seconds": 30.0,  # 與 Whisper 的解碼窗長度一致
+                "score_threshold": 0.55,  # 低於此分數的時間窗才會重試
+                "padding_seconds": 0.5,  # 重新解碼時前後多取的音訊
+            },
+            
+            # 模型串接：快速模型轉錄全部音訊，品質不足的片段交給大模型重新轉錄
+            "cascade": {
+                "fast_model": "small",
+                "logprob_score_threshold": 0.6,  # avg_logprob 約 -1.2 以下
+                "compression_score_threshold": 0.6,  # 壓縮比約 3.5 以上（重複輸出）
+                "text_quality_threshold": 0.5,
+                "padding_seconds": 0.5,  # 重新轉錄時前後多取的音訊
+                "merge_gap_seconds": 1.0,  # 間隔小於此值的困難片段合併為同一個區段
+            },
+            
+            # 延遲字詞時間戳（轉錄時不做交叉注意力對齊，只對需要合併的片段補算；
+            # 合併片段的起訖時間改以字詞時間為準，輸出會改變，因此預設關閉）
+            "word_alignment": {
+                "lazy": False,
+                "merge_min_duration": 1.0,  # 與 merge_short_segments 的預設值一致
+                "merge_max_gap": 2.0,
+            },
+            
+            # 解碼時的幻覺迴圈中止（n-gram 重複或製作資訊重複出現時提前結束時間窗）
+            "loop_guard": {
+                "content_types": ["music", "mixed"],
+                "max_ngram": 16,  # 檢查的最長重複單位（token 數）
+                "min_repeats": 4,
+                "min_repeat_tokens": 24,  # 單一 token 需重複 24 次、2 個 token 的單位需 12 次
+                "metadata_repeats": 2,  # 同一時間窗中製作資訊出現兩次即中止
+                # 重複之外還要求已產生文字的壓縮比超過 Whisper 的回退門檻（避免截斷正常的重複歌詞；
+                # 轉錄參數有 compression_ratio_threshold 時改用相同的值）
+                "compression_ratio_threshold": 2.4,
+            },
+            
+            # 解碼時的片語抑制：後處理一定會刪除的製作資訊直接禁止產生，
+            # 無意義短語只在片段開頭降低分數（後處理只刪除整段都是這些短語的片段）
+            "phrase_suppression": {
+                "bias_content_types": ["music", "mixed"],
+                "phrase_bias": -3.0,
+            },
+            
+            # 能量 VAD 前置過濾（只把有聲音的區段送進解碼器）
+            "vad": {
+                "music_mode": {
+                    "threshold_db": -55.0,  # 伴奏持續有能量，只跳過真正的靜音
+                    "margin_db": 6.0,
+                    "min_speech_seconds": 0.5,
+                    "min_silence_seconds": 2.0,
+                    "padding_seconds": 0.5,
+                },
+                "speech_mode": {
+                    "threshold_db": -45.0,
+                    "margin_db": 10.0,
+                    "min_speech_seconds": 0.3,
+                    "min_silence_seconds": 0.8,
+                    "padding_seconds": 0.3,
+                },
             }
         }
     
@@ -154,10 +236,77 @@ class WhisperAccuracyOptimizer:
             }
         }
     
+    def create_decoding_guard(self, content_type: str):
+        """
+        建立解碼時的迴圈檢查器
+        
+        Args:
+            content_type: 內容類型
+        
+        Returns:
+            DecodingGuard，此內容類型不需要檢查時為 None
+        """
+        config = self.optimization_config["loop_guard"]
+        if content_type not in config["content_types"]:
+            return None
+        from decoding_guard import DecodingGuard
+        return DecodingGuard(
+            max_ngram=config["max_ngram"],
+            min_repeats=config["min_repeats"],
+            min_repeat_tokens=config["min_repeat_tokens"],
+            metadata_repeats=config["metadata_repeats"],
+            compression_ratio_threshold=config["compression_ratio_threshold"]
+        )
+    
+    def create_phrase_suppressor(self, content_type: str):
+        """
+        以音樂元數據關鍵詞和各語言的無意義短語建立解碼時的片語抑制
+        
+        只禁止 filter_music_metadata 一定會整個刪除的關鍵詞；無意義短語和關鍵詞開頭的 token
+        只在音樂類內容的片段開頭降低分數
+        
+        Args:
+            content_type: 內容類型
+        
+        Returns:
+            PhraseSuppressor，沒有需要抑制的片語時為 None
+        """
+        config = self.optimization_config["phrase_suppression"]
+        blocked = self.blocked_metadata_phrases()
+        
+        biased = {}
+        if content_type in config["bias_content_types"]:
+            biased = {code: rules["meaningless_phrases"] for code, rules in self.language_rules.items()
+                      if rules.get("meaningless_phrases")}
+        if not blocked and not biased:
+            return None
+        
+        from decoding_guard import PhraseSuppressor
+        return PhraseSuppressor(blocked, biased, phrase_bias=config["phrase_bias"],
+                                bias_blocked_starts=content_type in config["bias_content_types"])
+    
+    def blocked_metadata_phrases(self) -> List[str]:
+        """
+        filter_music_metadata 一定會整個刪除的音樂元數據關鍵詞（解碼時禁止完整產生）
+        
+        Returns:
+            關鍵詞列表
+        """
+        if self._blocked_metadata_phrases is None:
+            try:
+                from enhanced_music_filter import EnhancedMusicFilter
+                keywords = EnhancedMusicFilter().music_metadata_keywords
+            except ImportError:
+                keywords = []
+            self._blocked_metadata_phrases = [keyword for keyword in keywords
+                                              if not self.remove_metadata_patterns(keyword).strip()]
+        return self._blocked_metadata_phrases
+    
     def optimize_whisper_params(self, 
                                content_type: str = "auto",
                                language: str = "auto",
-                               quality_level: str = "high") -> Dict[str, Any]:
+                               quality_level: str = "high",
+                               lazy_word_timestamps: Optional[bool] = None) -> Dict[str, Any]:
         """
         根據內容類型和語言優化 Whisper 參數
         
@@ -165,6 +314,7 @@ class WhisperAccuracyOptimizer:
             content_type: 內容類型 ("music", "speech", "mixed", "auto")
             language: 語言 ("ja", "en", "zh", "auto")
             quality_level: 品質等級 ("fast", "balanced", "high", "ultra")
+            lazy_word_timestamps: 轉錄時不計算字詞時間戳，由後處理按需對齊（None 表示使用配置）
         
         Returns:
             優化後的參數字典
@@ -204,71 +354,547 @@ class WhisperAccuracyOptimizer:
             base_params["best_of"] = 5
             base_params["beam_size"] = 5
         
+        # 延遲字詞時間戳：解碼時跳過對齊，後處理再對需要的片段補算
+        if lazy_word_timestamps is None:
+            lazy_word_timestamps = self.optimization_config["word_alignment"]["lazy"]
+        if lazy_word_timestamps:
+            base_params["word_timestamps"] = False
+        
         return base_params
     
+    def get_vad_settings(self, content_type: str = "speech") -> Dict[str, float]:
+        """取得對應內容類型的 VAD 閾值"""
+        mode = "music_mode" if content_type == "music" else "speech_mode"
+        return dict(self.optimization_config["vad"][mode])
+    
+    def detect_speech_regions(self, audio, content_type: str = "speech") -> List[Dict[str, float]]:
+        """
+        以能量 VAD 偵測有聲區段
+        
+        Args:
+            audio: 16kHz 單聲道 PCM
+            content_type: 內容類型，決定使用 music_mode 或 speech_mode 閾值
+        
+        Returns:
+            有聲區段列表（秒）
+        """
+        from audio_segmentation import detect_speech_regions
+        return detect_speech_regions(audio, **self.get_vad_settings(content_type))
+    
+    def load_audio(self, audio_file: Union[str, Any]):
+        """
+        將音訊檔案解碼為 16kHz 單聲道 PCM（已是陣列時直接返回）
+        
+        Args:
+            audio_file: 音訊檔案路徑或已解碼的 PCM 陣列
+        
+        Returns:
+            PCM 陣列，解碼失敗時返回原始路徑交由 Whisper 處理
+        """
+        if not isinstance(audio_file, str):
+            return audio_file
+        
+        try:
+            from audio_cache import load_audio_pcm
+            return load_audio_pcm(audio_file)
+        except Exception as e:
+            print(f"⚠️ 音訊預先解碼失敗，改由 Whisper 自行解碼: {e}")
+            return audio_file
+    
     def multi_pass_transcription(self, 
                                 model, 
-                                audio_file: str, 
+                                audio_file: Union[str, Any], 
                                 params: Dict[str, Any],
-                                language: str = "auto") -> Dict[str, Any]:
+                                language: str = "auto",
+                                pass_runner: Optional[Callable[..., Iterable[Dict[str, Any]]]] = None,
+                                early_stop: Optional[bool] = None) -> Dict[str, Any]:
         """
         多次通過轉錄，選擇最佳結果
         
+        啟用提前結束時每個溫度逐窗轉錄，某個溫度的分數達到 good_enough_score 後其餘溫度不再執行；
+        依序執行時另外累計各時間窗的品質分數，剩餘音訊全部是滿分的最短片段也不可能勝過目前最佳
+        結果的溫度立即中止
+        
         Args:
             model: Whisper 模型
-            audio_file: 音訊檔案路徑
+            audio_file: 音訊檔案路徑或已解碼的 16kHz PCM 陣列
             params: 轉錄參數
             language: 語言代碼
+            pass_runner: 執行各溫度的函數 (音訊, 參數, 溫度列表, window_seconds=逐窗轉錄長度)，
+                        依完成順序返回結果（例如 ParallelTemperatureTranscriber.run_passes；None 表示依序執行）
+            early_stop: 是否提前結束（None 表示使用配置，預設關閉）
         
         Returns:
-            最佳轉錄結果
+            最佳轉錄結果（附帶 multi_pass 統計）
         """
-        results = []
         temperatures = params.get("temperature", [0.0])
+        if not isinstance(temperatures, (list, tuple)):
+            temperatures = [temperatures]
+        
+        # 只解碼一次，所有溫度共用同一個 PCM 緩衝區
+        audio = self.load_audio(audio_file)
+        audio_seconds = len(audio) / 16000 if not isinstance(audio, str) else 0.0
+        config = self.optimization_config["multi_pass"]
+        if early_stop is None:
+            early_stop = config["early_stop"]
+        early_stop = early_stop and not isinstance(audio, str)
+        # 只有依序執行時能在每個時間窗後評分並中止不可能勝出的溫度
+        pruning = early_stop and pass_runner is None
+        
+        # 移除不是 Whisper API 參數的項目（temperature 會單獨處理）
+        whisper_params = {k: v for k, v in params.items() if k not in ["temperature"]}
+        
+        best = None
+        running: Dict[float, Dict[str, float]] = {}
+        
+        def keep_going(temperature: float, segments: List[Dict[str, Any]], covered_seconds: float) -> bool:
+            """累計此溫度已完成時間窗的分數，估計的上限不可能勝過目前最佳結果時返回 False"""
+            state = running.setdefault(temperature, {"score_sum": 0.0, "count": 0})
+            state["score_sum"] += sum(self.segment_quality_score(segment, language) for segment in segments)
+            state["count"] += len(segments)
+            if best is None:
+                return True
+            if covered_seconds <= 0 or state["count"] == 0:
+                return True
+            # 剩餘片段全部滿分時的分數上限（剩餘片段數以此溫度已轉錄部分的片段密度估計）
+            remaining = max(0.0, audio_seconds - covered_seconds)
+            expected = state["count"] / covered_seconds * remaining * config["segment_rate_slack"]
+            total = state["count"] + expected
+            upper = (state["score_sum"] + expected) / total
+            return upper > best["quality_score"] or (upper == best["quality_score"]
+                                                     and temperature < best["temperature"])
+        
+        window_seconds = config["window_seconds"] if early_stop else None
+        if pass_runner is None or isinstance(audio, str):
+            passes = self.run_temperature_passes(model, audio, whisper_params, temperatures,
+                                                 on_window=keep_going if pruning else None)
+        else:
+            passes = pass_runner(audio, whisper_params, list(temperatures), window_seconds=window_seconds)
         
         print(f"🔄 開始多次通過轉錄 (溫度值: {temperatures})")
         
+        # 每完成一次就評分，保留目前最佳結果（分數相同時取較低溫度）
+        stats = {"passes": len(temperatures), "completed": 0, "cancelled": 0, "failed": 0, "skipped": 0,
+                 "pruning": pruning, "decoded_seconds": 0.0, "audio_seconds": round(audio_seconds, 2)}
+        for outcome in passes:
+            temp = outcome["temperature"]
+            if outcome.get("cancelled"):
+                stats["cancelled"] += 1
+                stats["decoded_seconds"] += outcome.get("covered_seconds", 0.0)
+                print(f"   ⏹️ 溫度 {temp} 已不可能勝過最佳結果，於 {outcome.get('covered_seconds', 0.0):.0f} 秒處中止")
+                continue
+            if "error" in outcome:
+                stats["failed"] += 1
+                print(f"   ⚠️ 溫度 {temp} 轉錄失敗: {outcome['error']}")
+                continue
+            
+            stats["completed"] += 1
+            stats["decoded_seconds"] += audio_seconds
+            result = outcome["result"]
+            quality_score = self.calculate_quality_score(result, language)
+            print(f"   溫度 {temp} 完成 ({stats['completed']}/{len(temperatures)}), 品質分數: {quality_score:.3f}")
+            
+            if (best is None or quality_score > best["quality_score"]
+                    or (quality_score == best["quality_score"] and temp < best["temperature"])):
+                best = {"result": result, "temperature": temp, "quality_score": quality_score}
+            
+            if early_stop and best["quality_score"] >= config["good_enough_score"]:
+                # 已足夠好：其餘溫度不再執行（依序執行時尚未開始，平行執行時通知工作程序停止）
+                break
+        
+        if hasattr(passes, "close"):
+            passes.close()
+        
+        if best is None:
+            raise Exception("所有溫度設定都轉錄失敗")
+        
+        stats["skipped"] = len(temperatures) - stats["completed"] - stats["cancelled"] - stats["failed"]
+        stats["decoded_seconds"] = round(stats["decoded_seconds"], 2)
+        stats["decoded_ratio"] = round(stats["decoded_seconds"] / audio_seconds, 3) if audio_seconds > 0 else None
+        stats["best_temperature"] = best["temperature"]
+        stats["best_score"] = round(best["quality_score"], 3)
+        print(f"✅ 選擇最佳結果 (溫度: {best['temperature']}, 分數: {best['quality_score']:.3f}); "
+              f"完成 {stats['completed']}, "
+              + (f"中止 {stats['cancelled']}, " if pruning else "")
+              + f"略過 {stats['skipped']} 個溫度")
+        
+        result = best["result"]
+        result["multi_pass"] = stats
+        return result
+    
+    def run_temperature_passes(self, 
+                               model, 
+                               audio: Union[str, Any], 
+                               whisper_params: Dict[str, Any],
+                               temperatures: List[float],
+                               on_window: Optional[Callable[[float, List[Dict[str, Any]], float], bool]] = None
+                               ) -> Iterator[Dict[str, Any]]:
+        """
+        依序以每個溫度轉錄（與平行版本返回相同格式，失敗的溫度返回 error）
+        
+        Args:
+            on_window: 提供時逐窗轉錄，每完成一個時間窗呼叫 (溫度, 片段, 已完成秒數)，
+                       返回 False 時中止該溫度並返回 {"temperature", "cancelled", "covered_seconds"}
+        """
         for i, temp in enumerate(temperatures):
+            print(f"   第 {i+1}/{len(temperatures)} 次 (溫度: {temp})")
             try:
-                print(f"   第 {i+1}/{len(temperatures)} 次 (溫度: {temp})")
+                if on_window is not None and not isinstance(audio, str):
+                    result = self.transcribe_pass_windows(model, audio, whisper_params, temp,
+                                                          lambda segments, covered, temp=temp:
+                                                          on_window(temp, segments, covered))
+                else:
+                    with warnings.catch_warnings():
+                        warnings.simplefilter("ignore")
+                        result = model.transcribe(
+                            audio, 
+                            temperature=temp,
+                            **whisper_params
+                        )
+            except PassCancelled as e:
+                yield {"temperature": temp, "cancelled": True, "covered_seconds": e.covered_seconds}
+                continue
+            except Exception as e:
+                yield {"temperature": temp, "error": str(e)}
+                continue
+            yield {"temperature": temp, "result": result}
+    
+    def transcribe_pass_windows(self, 
+                                model, 
+                                audio, 
+                                whisper_params: Dict[str, Any],
+                                temperature: float,
+                                on_window: Callable[[List[Dict[str, Any]], float], bool]) -> Dict[str, Any]:
+        """
+        以單一溫度逐窗轉錄整個音訊（在安靜處切成 window_seconds 的時間窗）
+        
+        Args:
+            on_window: 每完成一個時間窗呼叫 (片段, 已完成秒數)，返回 False 時拋出 PassCancelled
+        
+        Returns:
+            與 model.transcribe 相同格式的結果
+        """
+        from streaming_transcriber import StreamingTranscriber
+        
+        audio_seconds = len(audio) / 16000
+        
+        def check(segments: List[Dict[str, Any]], progress: float):
+            covered = progress * audio_seconds
+            if not on_window(segments, covered):
+                raise PassCancelled(covered)
+        
+        window_seconds = self.optimization_config["multi_pass"]["window_seconds"]
+        transcriber = StreamingTranscriber(model, window_seconds=window_seconds, log=lambda message: None)
+        result = transcriber.transcribe(audio, dict(whisper_params, temperature=temperature), on_window=check)
+        result.pop("windowed", None)
+        return result
+    
+    def windowed_temperature_fallback(self, 
+                                      model, 
+                                      audio_file: Union[str, Any], 
+                                      params: Dict[str, Any],
+                                      language: str = "auto") -> Dict[str, Any]:
+        """
+        逐窗溫度回退轉錄：整個檔案只以最低溫度轉錄一次，
+        只有品質分數低於閾值的時間窗才以更高溫度重新解碼
+        
+        Args:
+            model: Whisper 模型
+            audio_file: 音訊檔案路徑或已解碼的 16kHz PCM 陣列
+            params: 轉錄參數
+            language: 語言代碼
+        
+        Returns:
+            拼接後的轉錄結果（附帶 window_fallback 統計）
+        """
+        temperatures = params.get("temperature", [0.0])
+        if not isinstance(temperatures, (list, tuple)):
+            temperatures = [temperatures]
+        
+        audio = self.load_audio(audio_file)
+        if isinstance(audio, str):
+            # 無法取得 PCM 就無法切出時間窗，退回整檔多次通過
+            print("⚠️ 無法切割音訊，改用整檔多次通過轉錄")
+            return self.multi_pass_transcription(model, audio, params, language)
+        
+        fallback_config = self.optimization_config["window_fallback"]
+        threshold = fallback_config["score_threshold"]
+        padding = fallback_config["padding_seconds"]
+        sample_rate = 16000
+        audio_duration = len(audio) / sample_rate
+        
+        whisper_params = {k: v for k, v in params.items() if k not in ["temperature"]}
+        clip_timestamps = whisper_params.get("clip_timestamps")
+        
+        print(f"🔄 開始逐窗溫度回退轉錄 (溫度值: {temperatures}, 閾值: {threshold})")
+        print(f"   第 1 次完整轉錄 (溫度: {temperatures[0]})")
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            result = model.transcribe(audio, temperature=temperatures[0], **whisper_params)
+        
+        # 後續時間窗沿用第一次偵測到的語言，避免短片段重新偵測
+        if not whisper_params.get("language") and result.get("language"):
+            whisper_params["language"] = result["language"]
+        
+        # 第一次轉錄沒有產生片段的時間窗（最嚴重的失敗）也一起檢查
+        windows = self.group_segments_into_windows(result.get("segments", []),
+                                                   fallback_config["window_seconds"],
+                                                   duration=audio_duration)
+        
+        stats = {
+            "windows": len(windows),
+            "retried_windows": 0,
+            "empty_windows": 0,
+            "improved_windows": 0,
+            "redecoded_seconds": 0.0,
+            "audio_seconds": round(audio_duration, 2),
+        }
+        
+        stitched_segments = []
+        for index, window in enumerate(windows):
+            best_segments = window["segments"]
+            best_score = self.calculate_quality_score({"segments": best_segments}, language)
+            
+            if best_score < threshold and len(temperatures) > 1:
+                clip_start = max(0.0, window["start"] - padding)
+                segments_end = max([window["end"]] + [seg["end"] for seg in window["segments"]])
+                clip_end = min(audio_duration, segments_end + padding)
+                clip_params = dict(whisper_params)
+                if isinstance(clip_timestamps, list):
+                    # VAD 區段換算為相對於時間窗的時間
+                    from audio_segmentation import clip_timestamps_for_range
+                    clip_params["clip_timestamps"] = clip_timestamps_for_range(
+                        clip_timestamps, clip_start, clip_end) or "0"
+                    if not window["segments"] and clip_params["clip_timestamps"] == "0":
+                        # VAD 判斷沒有聲音的空白時間窗不需要重試
+                        stitched_segments.extend(best_segments)
+                        continue
                 
-                current_params = params.copy()
-                current_params["temperature"] = temp
+                stats["retried_windows"] += 1
+                stats["empty_windows"] += 0 if window["segments"] else 1
+                stats["redecoded_seconds"] += clip_end - clip_start
+                clip = audio[int(clip_start * sample_rate):int(clip_end * sample_rate)]
+                print(f"   時間窗 {index + 1}/{len(windows)} "
+                      f"({window['start']:.1f}s-{window['end']:.1f}s) "
+                      + (f"分數 {best_score:.3f}" if window["segments"] else "沒有片段")
+                      + "，重新解碼")
                 
-                # 移除不是 Whisper API 參數的項目
-                whisper_params = {k: v for k, v in current_params.items() 
-                                if k not in ["temperature"]}  # temperature 會單獨處理
+                for temp in temperatures[1:]:
+                    try:
+                        with warnings.catch_warnings():
+                            warnings.simplefilter("ignore")
+                            clip_result = model.transcribe(clip, temperature=temp, **clip_params)
+                    except Exception as e:
+                        print(f"   ⚠️ 溫度 {temp} 重新解碼失敗: {e}")
+                        continue
+                    
+                    # 只保留開始於此時間窗內、且在前一個時間窗最後一個片段之後的片段（前後多取的音訊
+                    # 只作為上下文，避免與相鄰時間窗重複或重疊）
+                    lower = max(window["start"], stitched_segments[-1]["end"] if stitched_segments else 0.0)
+                    candidate = self.offset_segments(clip_result.get("segments", []), clip_start)
+                    candidate = [seg for seg in candidate if lower <= seg["start"] < window["end"]]
+                    score = self.calculate_quality_score({"segments": candidate}, language)
+                    print(f"      溫度 {temp}: 分數 {score:.3f}")
+                    
+                    # 空白時間窗的結果必須達到閾值才採用（避免把靜音中的幻覺補進字幕）
+                    if candidate and score > best_score and (window["segments"] or score >= threshold):
+                        best_segments = candidate
+                        best_score = score
+                    if best_score >= threshold:
+                        break
                 
+                if best_segments is not window["segments"]:
+                    stats["improved_windows"] += 1
+            
+            stitched_segments.extend(best_segments)
+        
+        for i, segment in enumerate(stitched_segments):
+            segment["id"] = i
+        
+        result["segments"] = stitched_segments
+        result["text"] = "".join(seg.get("text", "") for seg in stitched_segments)
+        stats["redecoded_seconds"] = round(stats["redecoded_seconds"], 2)
+        stats["redecoded_ratio"] = (stats["redecoded_seconds"] / audio_duration
+                                    if audio_duration > 0 else 0.0)
+        result["window_fallback"] = stats
+        
+        print(f"✅ 逐窗回退完成: {stats['retried_windows']}/{stats['windows']} 個時間窗重試, "
+              f"{stats['improved_windows']} 個改善, 重新解碼 {stats['redecoded_ratio'] * 100:.1f}% 音訊")
+        return result
+    
+    def is_hard_segment(self, segment: Dict[str, Any], language: str = "auto") -> bool:
+        """判斷片段是否需要交給大模型重新轉錄（任一項品質分數低於串接閾值）"""
+        config = self.optimization_config["cascade"]
+        components = self.segment_quality_components(segment, language)
+        return (components.get("logprob", 1.0) < config["logprob_score_threshold"]
+                or components.get("compression", 1.0) < config["compression_score_threshold"]
+                or components["text"] < config["text_quality_threshold"])
+    
+    def find_hard_regions(self, 
+                          segments: List[Dict[str, Any]], 
+                          audio_duration: float,
+                          language: str = "auto") -> List[Dict[str, Any]]:
+        """
+        找出需要大模型重新轉錄的區段（困難片段加上前後緩衝，相近的區段合併）
+        
+        Returns:
+            區段列表，每個區段包含 start、end 和 hard_segments（困難片段數）
+        """
+        config = self.optimization_config["cascade"]
+        padding = config["padding_seconds"]
+        regions = []
+        for segment in segments:
+            if not self.is_hard_segment(segment, language):
+                continue
+            start = max(0.0, segment["start"] - padding)
+            end = min(audio_duration, segment["end"] + padding)
+            if regions and start - regions[-1]["end"] <= config["merge_gap_seconds"]:
+                regions[-1]["end"] = max(regions[-1]["end"], end)
+                regions[-1]["hard_segments"] += 1
+            else:
+                regions.append({"start": start, "end": end, "hard_segments": 1})
+        return regions
+    
+    def cascade_transcription(self, 
+                              fast_model, 
+                              load_accurate_model: Callable[[], Any],
+                              audio_file: Union[str, Any], 
+                              params: Dict[str, Any],
+                              language: str = "auto",
+                              fast_model_name: Optional[str] = None,
+                              accurate_model_name: Optional[str] = None) -> Dict[str, Any]:
+        """
+        模型串接轉錄：快速模型轉錄整個檔案，只有品質不足的區段以大模型重新轉錄
+        
+        Args:
+            fast_model: 快速（較小）的 Whisper 模型
+            load_accurate_model: 取得大模型的函數（沒有困難片段時不會載入）
+            audio_file: 音訊檔案路徑或已解碼的 16kHz PCM 陣列
+            params: 轉錄參數
+            language: 語言代碼
+            fast_model_name: 快速模型名稱（只用於報告）
+            accurate_model_name: 大模型名稱（只用於報告）
+        
+        Returns:
+            拼接後的轉錄結果（附帶 cascade 統計）
+        """
+        temperatures = params.get("temperature", [0.0])
+        if not isinstance(temperatures, (list, tuple)):
+            temperatures = [temperatures]
+        whisper_params = {k: v for k, v in params.items() if k not in ["temperature"]}
+        
+        audio = self.load_audio(audio_file)
+        if isinstance(audio, str):
+            # 無法取得 PCM 就無法切出區段，整個檔案交給大模型
+            print("⚠️ 無法切割音訊，整個檔案使用大模型轉錄")
+            with warnings.catch_warnings():
+                warnings.simplefilter("ignore")
+                return load_accurate_model().transcribe(audio, temperature=temperatures[0], **whisper_params)
+        
+        sample_rate = 16000
+        audio_duration = len(audio) / sample_rate
+        clip_timestamps = whisper_params.get("clip_timestamps")
+        
+        print(f"🔄 開始模型串接轉錄 (快速模型: {fast_model_name or 'fast'}, 大模型: {accurate_model_name or 'accurate'})")
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            result = fast_model.transcribe(audio, temperature=temperatures[0], **whisper_params)
+        
+        # 大模型沿用快速模型偵測到的語言，避免短區段重新偵測
+        if not whisper_params.get("language") and result.get("language"):
+            whisper_params["language"] = result["language"]
+        
+        segments = result.get("segments", [])
+        regions = self.find_hard_regions(segments, audio_duration, language)
+        stats = {
+            "fast_model": fast_model_name,
+            "accurate_model": accurate_model_name,
+            "segments": len(segments),
+            "hard_segments": sum(region["hard_segments"] for region in regions),
+            "regions": len(regions),
+            "accurate_seconds": 0.0,
+            "audio_seconds": round(audio_duration, 2),
+        }
+        
+        accurate_model = load_accurate_model() if regions else None
+        for index, region in enumerate(regions):
+            clip = audio[int(region["start"] * sample_rate):int(region["end"] * sample_rate)]
+            clip_params = dict(whisper_params)
+            if isinstance(clip_timestamps, list):
+                # VAD 區段換算為相對於區段的時間
+                from audio_segmentation import clip_timestamps_for_range
+                clip_params["clip_timestamps"] = clip_timestamps_for_range(
+                    clip_timestamps, region["start"], region["end"]) or "0"
+            
+            print(f"   區段 {index + 1}/{len(regions)} ({region['start']:.1f}s-{region['end']:.1f}s, "
+                  f"{region['hard_segments']} 個困難片段) 交給大模型")
+            try:
                 with warnings.catch_warnings():
                     warnings.simplefilter("ignore")
-                    result = model.transcribe(
-                        audio_file, 
-                        temperature=temp,
-                        **whisper_params
-                    )
-                
-                # 計算結果品質分數
-                quality_score = self.calculate_quality_score(result, language)
-                results.append({
-                    "result": result,
-                    "temperature": temp,
-                    "quality_score": quality_score
-                })
-                
-                print(f"   品質分數: {quality_score:.3f}")
-                
+                    clip_result = accurate_model.transcribe(clip, temperature=temperatures[0], **clip_params)
             except Exception as e:
-                print(f"   ⚠️ 溫度 {temp} 轉錄失敗: {e}")
+                print(f"   ⚠️ 大模型轉錄失敗，保留快速模型結果: {e}")
                 continue
+            stats["accurate_seconds"] += region["end"] - region["start"]
+            
+            def in_region(segment):
+                midpoint = (segment["start"] + segment["end"]) / 2
+                return region["start"] <= midpoint < region["end"]
+            
+            candidate = [seg for seg in self.offset_segments(clip_result.get("segments", []), region["start"])
+                         if in_region(seg)]
+            segments = [seg for seg in segments if not in_region(seg)] + candidate
+            segments.sort(key=lambda seg: seg["start"])
+        
+        for i, segment in enumerate(segments):
+            segment["id"] = i
+        
+        result["segments"] = segments
+        result["text"] = "".join(seg.get("text", "") for seg in segments)
+        stats["accurate_seconds"] = round(stats["accurate_seconds"], 2)
+        stats["accurate_ratio"] = (stats["accurate_seconds"] / audio_duration
+                                   if audio_duration > 0 else 0.0)
+        result["cascade"] = stats
+        
+        print(f"✅ 模型串接完成: {stats['hard_segments']}/{stats['segments']} 個困難片段, "
+              f"{stats['accurate_ratio'] * 100:.1f}% 音訊使用大模型")
+        return result
+    
+    def group_segments_into_windows(self, 
+                                    segments: List[Dict[str, Any]], 
+                                    window_seconds: float = 30.0,
+                                    duration: Optional[float] = None) -> List[Dict[str, Any]]:
+        """
+        依片段開始時間將片段分組為固定長度的時間窗
         
-        if not results:
-            raise Exception("所有溫度設定都轉錄失敗")
+        Args:
+            segments: 片段列表
+            window_seconds: 時間窗長度
+            duration: 音訊長度；提供時整個音訊都切成時間窗，沒有片段的時間窗也會出現（segments 為空）
+        
+        Returns:
+            依時間排序的時間窗列表，每個時間窗包含 index、start、end（時間窗邊界）和 segments
+        """
+        windows: Dict[int, Dict[str, Any]] = {}
         
-        # 選擇品質分數最高的結果
-        best_result = max(results, key=lambda x: x["quality_score"])
-        print(f"✅ 選擇最佳結果 (溫度: {best_result['temperature']}, 分數: {best_result['quality_score']:.3f})")
+        def window_at(index: int) -> Dict[str, Any]:
+            end = (index + 1) * window_seconds
+            if duration is not None:
+                end = min(end, max(duration, index * window_seconds))
+            return windows.setdefault(index, {"index": index, "start": index * window_seconds,
+                                              "end": end, "segments": []})
         
-        return best_result["result"]
+        for segment in segments:
+            window_at(int(segment.get("start", 0) // window_seconds))["segments"].append(segment)
+        if duration is not None:
+            for index in range(int(-(-duration // window_seconds))):
+                window_at(index)
+        return [windows[index] for index in sorted(windows)]
+    
+    def offset_segments(self, segments: List[Dict[str, Any]], offset: float) -> List[Dict[str, Any]]:
+        """將片段（及詞級）時間戳平移到原始音訊的時間軸"""
+        from audio_segmentation import offset_segments
+        return offset_segments(segments, offset)
     
     def calculate_quality_score(self, result: Dict[str, Any], language: str) -> float:
         """
@@ -288,48 +914,61 @@ class WhisperAccuracyOptimizer:
         total_segments = len(result["segments"])
         
         for segment in result["segments"]:
-            segment_score = 0.0
-            
-            # 1. 基於平均對數機率的分數 (40%)
-            if "avg_logprob" in segment:
-                # 將對數機率轉換為 0-1 分數
-                logprob_score = max(0, min(1, (segment["avg_logprob"] + 3) / 3))
-                segment_score += logprob_score * 0.4
-            
-            # 2. 基於壓縮比的分數 (20%)
-            if "compression_ratio" in segment:
-                # 理想的壓縮比在 1.5-2.5 之間
-                compression_ratio = segment["compression_ratio"]
-                if 1.5 <= compression_ratio <= 2.5:
-                    compression_score = 1.0
-                elif compression_ratio < 1.5:
-                    compression_score = compression_ratio / 1.5
-                else:
-                    compression_score = max(0, 1 - (compression_ratio - 2.5) / 2.5)
-                segment_score += compression_score * 0.2
-            
-            # 3. 基於文字品質的分數 (30%)
-            text = segment.get("text", "").strip()
-            text_score = self.evaluate_text_quality(text, language)
-            segment_score += text_score * 0.3
-            
-            # 4. 基於時間一致性的分數 (10%)
-            duration = segment.get("end", 0) - segment.get("start", 0)
-            if duration > 0 and len(text) > 0:
-                # 理想的語速約為每秒 2-8 個字符
-                chars_per_second = len(text) / duration
-                if 2 <= chars_per_second <= 8:
-                    timing_score = 1.0
-                elif chars_per_second < 2:
-                    timing_score = chars_per_second / 2
-                else:
-                    timing_score = max(0, 1 - (chars_per_second - 8) / 8)
-                segment_score += timing_score * 0.1
-            
-            total_score += segment_score
+            total_score += self.segment_quality_score(segment, language)
         
         return total_score / total_segments if total_segments > 0 else 0.0
     
+    def segment_quality_score(self, segment: Dict[str, Any], language: str) -> float:
+        """單一片段的加權品質分數 (0-1)，calculate_quality_score 為所有片段的平均"""
+        components = self.segment_quality_components(segment, language)
+        return (components.get("logprob", 0.0) * 0.4
+                + components.get("compression", 0.0) * 0.2
+                + components["text"] * 0.3
+                + components.get("timing", 0.0) * 0.1)
+    
+    def segment_quality_components(self, segment: Dict[str, Any], language: str) -> Dict[str, float]:
+        """
+        單一片段的各項品質分數 (0-1)，缺少對應資料的項目不會出現
+        
+        Returns:
+            logprob (權重 40%)、compression (20%)、text (30%)、timing (10%)
+        """
+        components = {}
+        
+        # 1. 基於平均對數機率的分數
+        if "avg_logprob" in segment:
+            # 將對數機率轉換為 0-1 分數
+            components["logprob"] = max(0, min(1, (segment["avg_logprob"] + 3) / 3))
+        
+        # 2. 基於壓縮比的分數
+        if "compression_ratio" in segment:
+            # 理想的壓縮比在 1.5-2.5 之間
+            compression_ratio = segment["compression_ratio"]
+            if 1.5 <= compression_ratio <= 2.5:
+                components["compression"] = 1.0
+            elif compression_ratio < 1.5:
+                components["compression"] = compression_ratio / 1.5
+            else:
+                components["compression"] = max(0, 1 - (compression_ratio - 2.5) / 2.5)
+        
+        # 3. 基於文字品質的分數
+        text = segment.get("text", "").strip()
+        components["text"] = self.evaluate_text_quality(text, language)
+        
+        # 4. 基於時間一致性的分數
+        duration = segment.get("end", 0) - segment.get("start", 0)
+        if duration > 0 and len(text) > 0:
+            # 理想的語速約為每秒 2-8 個字符
+            chars_per_second = len(text) / duration
+            if 2 <= chars_per_second <= 8:
+                components["timing"] = 1.0
+            elif chars_per_second < 2:
+                components["timing"] = chars_per_second / 2
+            else:
+                components["timing"] = max(0, 1 - (chars_per_second - 8) / 8)
+        
+        return components
+    
     def evaluate_text_quality(self, text: str, language: str) -> float:
         """
         評估文字品質
@@ -377,7 +1016,9 @@ class WhisperAccuracyOptimizer:
                              segments: List[Dict[str, Any]], 
                              language: str = "auto",
                              filter_repetitive: bool = True,
-                             merge_short_segments: bool = True) -> List[Dict[str, Any]]:
+                             merge_short_segments: bool = True,
+                             context_segments: Optional[List[Dict[str, Any]]] = None,
+                             word_aligner: Optional[Callable[[List[Dict[str, Any]]], None]] = None) -> List[Dict[str, Any]]:
         """
         後處理轉錄片段
         
@@ -386,6 +1027,8 @@ class WhisperAccuracyOptimizer:
             language: 語言代碼
             filter_repetitive: 是否過濾重複內容
             merge_short_segments: 是否合併短片段
+            context_segments: 已輸出的前文片段（串流輸出時用於跨區塊的重複過濾，不會出現在結果中）
+            word_aligner: 為片段補上字詞時間戳的函數（延遲字詞時間戳時只對會被合併的片段呼叫）
         
         Returns:
             處理後的片段列表
@@ -422,12 +1065,26 @@ class WhisperAccuracyOptimizer:
         
         # 2. 過濾重複內容
         if filter_repetitive:
-            cleaned_segments = self.filter_repetitive_segments(cleaned_segments)
+            if context_segments:
+                context_ids = {id(segment) for segment in context_segments}
+                cleaned_segments = [
+                    segment for segment in self.filter_repetitive_segments(list(context_segments) + cleaned_segments)
+                    if id(segment) not in context_ids
+                ]
+            else:
+                cleaned_segments = self.filter_repetitive_segments(cleaned_segments)
             print(f"   過濾重複後剩餘: {len(cleaned_segments)} 個片段")
         
         # 3. 合併短片段
         if merge_short_segments:
-            cleaned_segments = self.merge_short_segments(cleaned_segments)
+            if word_aligner is not None:
+                touched = self.find_segments_to_merge(cleaned_segments)
+                if touched:
+                    word_aligner(touched)
+                    print(f"   對齊字詞時間戳: {len(touched)}/{len(cleaned_segments)} 個片段")
+            # 只有延遲字詞時間戳模式以字詞時間修正合併片段的起訖時間（維持原本的合併時間）
+            cleaned_segments = self.merge_short_segments(cleaned_segments,
+                                                         use_word_times=word_aligner is not None)
             print(f"   合併短片段後剩餘: {len(cleaned_segments)} 個片段")
         
         # 4. 最終品質檢查
@@ -440,9 +1097,9 @@ class WhisperAccuracyOptimizer:
         print(f"✅ 最終保留: {len(final_segments)} 個高品質片段")
         return final_segments
     
-    def filter_music_metadata(self, text: str) -> str:
+    def remove_metadata_patterns(self, text: str) -> str:
         """
-        過濾音樂元數據和製作資訊
+        刪除音樂製作資訊的關鍵詞和其後的內容
         """
         # 音樂製作相關的詞彙
         music_metadata_patterns = [
@@ -458,9 +1115,33 @@ class WhisperAccuracyOptimizer:
             r"Lyrics by.*",
         ]
         
-        import re
         for pattern in music_metadata_patterns:
             text = re.sub(pattern, "", text, flags=re.IGNORECASE)
+        return text
+    
+    def strip_truncated_metadata(self, text: str) -> str:
+        """
+        刪除片段結尾被截斷的製作資訊片語
+        
+        解碼時禁止產生的片語會在輸出到最後一個 token 前結束片段，留下「初音ミ」、「Music」
+        這類前綴；完整的片語連同其後內容本來就會被刪除，因此結尾的前綴也一律刪除。
+        
+        Args:
+            text: 片段文字
+        
+        Returns:
+            刪除截斷前綴後的文字
+        """
+        from decoding_guard import strip_truncated_phrases
+        return strip_truncated_phrases(text, self.blocked_metadata_phrases())
+    
+    def filter_music_metadata(self, text: str) -> str:
+        """
+        過濾音樂元數據和製作資訊
+        """
+        text = self.remove_metadata_patterns(text)
+        # 解碼時在製作資訊片語完成前結束的片段
+        text = self.strip_truncated_metadata(text)
         
         # 移除過多的重複字符
         text = re.sub(r"(.)\1{4,}", r"\1", text)  # 超過4個重複字符縮減為1個
@@ -545,9 +1226,41 @@ class WhisperAccuracyOptimizer:
         
         return filtered
     
+    def find_segments_to_merge(self, segments: List[Dict[str, Any]],
+                               min_duration: Optional[float] = None,
+                               max_gap: Optional[float] = None) -> List[Dict[str, Any]]:
+        """
+        找出 merge_short_segments 會合併的片段（與其判斷邏輯一致）
+        
+        Returns:
+            會被合併的片段（原物件，依出現順序）
+        """
+        config = self.optimization_config["word_alignment"]
+        min_duration = config["merge_min_duration"] if min_duration is None else min_duration
+        max_gap = config["merge_max_gap"] if max_gap is None else max_gap
+        if len(segments) <= 1:
+            return []
+        
+        touched = []
+        group = [segments[0]]
+        group_start, group_end = segments[0]["start"], segments[0]["end"]
+        for next_segment in segments[1:]:
+            if group_end - group_start < min_duration and next_segment["start"] - group_end <= max_gap:
+                group.append(next_segment)
+                group_end = next_segment["end"]
+            else:
+                if len(group) > 1:
+                    touched.extend(group)
+                group = [next_segment]
+                group_start, group_end = next_segment["start"], next_segment["end"]
+        if len(group) > 1:
+            touched.extend(group)
+        return touched
+    
     def merge_short_segments(self, segments: List[Dict[str, Any]], 
                            min_duration: float = 1.0,
-                           max_gap: float = 2.0) -> List[Dict[str, Any]]:
+                           max_gap: float = 2.0,
+                           use_word_times: bool = False) -> List[Dict[str, Any]]:
         """
         合併過短的片段
         
@@ -555,6 +1268,7 @@ class WhisperAccuracyOptimizer:
             segments: 片段列表
             min_duration: 最小持續時間（秒）
             max_gap: 最大間隔時間（秒）
+            use_word_times: 組成片段都有字詞時間戳時，合併後的起訖時間以字詞時間為準
         
         Returns:
             合併後的片段列表
@@ -564,6 +1278,8 @@ class WhisperAccuracyOptimizer:
         
         merged = []
         current_segment = segments[0].copy()
+        current_merged = False
+        all_words = use_word_times and bool(current_segment.get("words"))
         
         for next_segment in segments[1:]:
             current_duration = current_segment["end"] - current_segment["start"]
@@ -574,6 +1290,9 @@ class WhisperAccuracyOptimizer:
                 # 合併文字和時間
                 current_segment["text"] += " " + next_segment["text"]
                 current_segment["end"] = next_segment["end"]
+                current_segment["words"] = current_segment.get("words", []) + next_segment.get("words", [])
+                current_merged = True
+                all_words = all_words and bool(next_segment.get("words"))
                 
                 # 合併其他屬性（如果存在）
                 if "avg_logprob" in current_segment and "avg_logprob" in next_segment:
@@ -588,19 +1307,30 @@ class WhisperAccuracyOptimizer:
                         ) / total_weight
             else:
                 # 不合併，保存當前片段並開始新的片段
-                merged.append(current_segment)
+                merged.append(self.tighten_to_words(current_segment) if current_merged and all_words else current_segment)
                 current_segment = next_segment.copy()
+                current_merged = False
+                all_words = use_word_times and bool(current_segment.get("words"))
         
         # 添加最後一個片段
-        merged.append(current_segment)
+        merged.append(self.tighten_to_words(current_segment) if current_merged and all_words else current_segment)
         
         return merged
     
+    def tighten_to_words(self, segment: Dict[str, Any]) -> Dict[str, Any]:
+        """以字詞時間戳修正合併片段的起訖時間（片段層級的時間常包含前後的靜音，只在所有組成片段都有字詞時使用）"""
+        words = segment.get("words")
+        if words:
+            segment["start"] = max(segment["start"], words[0]["start"])
+            segment["end"] = max(segment["start"], min(segment["end"], words[-1]["end"]))
+        return segment
+    
     def generate_optimized_srt(self, 
                               result: Dict[str, Any], 
                               language: str = "auto",
                               filter_repetitive: bool = True,
-                              merge_short_segments: bool = True) -> str:
+                              merge_short_segments: bool = True,
+                              word_aligner: Optional[Callable[[List[Dict[str, Any]]], None]] = None) -> str:
         """
         生成優化的 SRT 字幕
         
@@ -609,6 +1339,7 @@ class WhisperAccuracyOptimizer:
             language: 語言代碼
             filter_repetitive: 是否過濾重複內容
             merge_short_segments: 是否合併短片段
+            word_aligner: 為片段補上字詞時間戳的函數（見 post_process_segments）
         
         Returns:
             SRT 格式字幕內容
@@ -621,7 +1352,8 @@ class WhisperAccuracyOptimizer:
             result["segments"],
             language=language,
             filter_repetitive=filter_repetitive,
-            merge_short_segments=merge_short_segments
+            merge_short_segments=merge_short_segments,
+            word_aligner=word_aligner
         )
         
         # 生成 SRT 內容
@@ -650,8 +1382,9 @@ class WhisperAccuracyOptimizer:
                                 original_segments: int,
                                 final_segments: int,
                                 quality_scores: List[float],
-                                output_path: str):
-        """保存優化報告"""
+                                output_path: str,
+                                extra: Optional[Dict[str, Any]] = None):
+        """保存優化報告（extra 為附加的統計區塊，例如字詞對齊）"""
         report = {
             "optimization_summary": {
                 "original_segments": original_segments,
@@ -663,6 +1396,8 @@ class WhisperAccuracyOptimizer:
             },
             "recommendations": self.generate_recommendations(original_segments, final_segments, quality_scores)
         }
+        if extra:
+            report.update(extra)
         
         report_path = output_path.replace(".srt", "_optimization_report.json")
         with open(report_path, 'w', encoding='utf-8') as f:
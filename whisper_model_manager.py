@@ -0,0 +1,324 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Whisper 模型管理器
+在同一個程序內共用已載入的 Whisper 模型，避免每次轉錄都重新載入
+"""
+
+import time
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Dict, List, Tuple, Optional, Any, Callable
+
+# 各模型的檢查點大小（MB），與 GUI 顯示的模型資訊一致
+MODEL_SIZES_MB = {
+    "tiny": 39,
+    "base": 74,
+    "small": 244,
+    "medium": 769,
+    "large": 1550,
+    "large-v3": 1550,
+    "turbo": 809,
+}
+
+# 預設的模型記憶體預算（MB）
+DEFAULT_MEMORY_BUDGET_MB = 6144
+
+
+class WhisperModelRegistry:
+    """
+    程序內共用的 Whisper 模型登錄表
+
+    以 (模型名稱, 設備, 模型目錄) 為鍵保留已載入的模型，
+    超過記憶體預算時依最近最少使用 (LRU) 順序釋放模型。
+    同一個模型同時只載入一次，其他執行緒等待載入完成後重用。
+    載入本身不持有鎖，載入中的模型不會阻擋其他模型的取得和載入。
+    """
+
+    def __init__(self, max_memory_mb: float = DEFAULT_MEMORY_BUDGET_MB,
+                 log: Optional[Callable[[str], None]] = None):
+        self.max_memory_mb = max_memory_mb
+        # 沒有傳入日誌函數時（例如釋放模型）使用的日誌函數
+        self.log = log or print
+        self._models: "OrderedDict[Tuple[str, str, Optional[str]], Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.RLock()
+        # 載入中的模型：鍵 -> 載入完成時得到模型（或載入錯誤）的 Future
+        self._loading: Dict[Tuple[str, str, Optional[str]], Future] = {}
+        self.stats = {
+            "hits": 0,
+            "misses": 0,
+            "waits": 0,
+            "preloads": 0,
+            "evictions": 0,
+            "total_load_time": 0.0,
+            "load_history": [],
+        }
+
+    @staticmethod
+    def make_key(name: str, device: str, download_root: Optional[str] = None) -> Tuple[str, str, Optional[str]]:
+        """建立模型快取鍵"""
+        return (name, device or "cpu", download_root or None)
+
+    def set_memory_budget(self, max_memory_mb: float, log: Optional[Callable[[str], None]] = None):
+        """設定記憶體預算，並立即釋放超出預算的模型"""
+        with self._lock:
+            self.max_memory_mb = max_memory_mb
+            self._evict_to_fit(0.0, log=log)
+
+    def get_model(self,
+                  name: str,
+                  device: str = "cpu",
+                  download_root: Optional[str] = None,
+                  log: Optional[Callable[[str], None]] = None,
+                  quantize: bool = False):
+        """
+        取得 Whisper 模型，已載入則直接重用，正在載入時等待載入完成
+
+        Args:
+            name: 模型名稱 (例如 "medium")
+            device: 設備 ("cpu" 或 "cuda")
+            download_root: 模型目錄，None 表示使用 Whisper 預設位置
+            log: 日誌函數
+            quantize: 使用 int8 動態量化版本（只適用於 CPU）
+
+        Returns:
+            已載入的 Whisper 模型
+        """
+        log = log or self.log
+        quantize = quantize and (device or "cpu") == "cpu"
+        # 量化模型與 fp32 模型分開常駐
+        key = self.make_key(name, "cpu-int8" if quantize else device, download_root)
+
+        while True:
+            with self._lock:
+                entry = self._models.get(key)
+                if entry is not None:
+                    self._models.move_to_end(key)
+                    entry["last_used"] = time.time()
+                    entry["hits"] += 1
+                    self.stats["hits"] += 1
+                    log(f"♻️ 重用已載入的模型 {name} (設備: {key[1]})")
+                    return entry["model"]
+
+                loading = self._loading.get(key)
+                if loading is None:
+                    # 由本執行緒載入；其他要求同一個模型的執行緒等待這個 Future
+                    loading = Future()
+                    self._loading[key] = loading
+                    self.stats["misses"] += 1
+                    # 載入前先依預估大小騰出空間，避免新舊模型同時佔用記憶體
+                    self._evict_to_fit(self.estimate_load_memory_mb(name), log=log)
+                    break
+                self.stats["waits"] += 1
+
+            # 模型正在其他執行緒（例如背景預先載入）載入中：等待完成後重用，載入失敗時改由本執行緒載入
+            log(f"⏳ 等待載入中的模型 {name} (設備: {key[1]})")
+            try:
+                return loading.result()
+            except Exception as e:
+                log(f"⚠️ 其他執行緒載入模型 {name} 失敗，重新載入: {e}")
+
+        try:
+            model, load_time = self._load(name, device, download_root, quantize, log)
+        except BaseException as e:
+            with self._lock:
+                self._loading.pop(key, None)
+            loading.set_exception(e)
+            raise
+
+        memory_mb = self.estimate_model_memory_mb(model)
+        if quantize:
+            # 量化後的權重不在 parameters() 中，以檢查點大小估算（int8 權重 + fp32 嵌入層）
+            memory_mb = max(memory_mb, MODEL_SIZES_MB.get(name, 0))
+        with self._lock:
+            self._models[key] = {
+                "model": model,
+                "memory_mb": memory_mb,
+                "load_time": load_time,
+                "loaded_at": time.time(),
+                "last_used": time.time(),
+                "hits": 0,
+            }
+            self.stats["total_load_time"] += load_time
+            self.stats["load_history"].append({
+                "model": name,
+                "device": key[1],
+                "load_time": round(load_time, 3),
+                "memory_mb": round(memory_mb, 1),
+            })
+            # 只保留最近的載入紀錄
+            self.stats["load_history"] = self.stats["load_history"][-20:]
+
+            log(f"⏱️ 模型載入耗時 {load_time:.1f} 秒，約佔用 {memory_mb:.0f} MB")
+
+            # 載入後以實際大小再檢查一次預算（保留剛載入的模型）
+            self._evict_to_fit(0.0, keep=key, log=log)
+            self._loading.pop(key, None)
+        # 登錄後才通知等待中的執行緒，它們直接取得這個模型
+        loading.set_result(model)
+        return model
+
+    def _load(self, name: str, device: str, download_root: Optional[str], quantize: bool,
+              log: Callable[[str], None]):
+        """實際載入模型（不持有登錄表的鎖，載入其他模型或重用已載入的模型不需要等待）"""
+        log(f"📥 正在載入模型: {name} (設備: {'cpu-int8' if quantize else device})")
+        start_time = time.time()
+        if quantize:
+            from model_quantization import load_quantized_model
+            model = load_quantized_model(name, download_root=download_root, log=log)
+        else:
+            from model_verification import load_verified_model
+            model = load_verified_model(name, device=device, download_root=download_root, log=log)
+        return model, time.time() - start_time
+
+    def preload(self,
+                name: str,
+                device: str = "cpu",
+                download_root: Optional[str] = None,
+                log: Optional[Callable[[str], None]] = None,
+                quantize: bool = False) -> Optional[threading.Thread]:
+        """
+        在背景執行緒載入模型，之後的 get_model 直接重用或等待載入完成
+
+        Returns:
+            載入用的執行緒，模型已載入或正在載入時為 None
+        """
+        log = log or self.log
+        quantize = quantize and (device or "cpu") == "cpu"
+        key = self.make_key(name, "cpu-int8" if quantize else device, download_root)
+        with self._lock:
+            if key in self._models or key in self._loading:
+                return None
+            self.stats["preloads"] += 1
+
+        def run():
+            try:
+                self.get_model(name, device=device, download_root=download_root, log=log, quantize=quantize)
+            except Exception as e:
+                log(f"⚠️ 背景載入模型 {name} 失敗: {e}")
+
+        thread = threading.Thread(target=run, name=f"whisper-preload-{name}", daemon=True)
+        thread.start()
+        return thread
+
+    def is_loading(self, name: str, device: str = "cpu", download_root: Optional[str] = None,
+                   quantize: bool = False) -> bool:
+        """模型是否正在載入中"""
+        quantize = quantize and (device or "cpu") == "cpu"
+        key = self.make_key(name, "cpu-int8" if quantize else device, download_root)
+        with self._lock:
+            return key in self._loading
+
+    def estimate_load_memory_mb(self, name: str) -> float:
+        """預估載入模型所需記憶體（檢查點為 fp16，載入後為 fp32）"""
+        return MODEL_SIZES_MB.get(name, 0) * 2.0
+
+    @staticmethod
+    def estimate_model_memory_mb(model) -> float:
+        """計算模型參數和緩衝區實際佔用的記憶體（MB）"""
+        try:
+            total_bytes = 0
+            for tensor in list(model.parameters()) + list(model.buffers()):
+                total_bytes += tensor.numel() * tensor.element_size()
+            return total_bytes / (1024 * 1024)
+        except Exception:
+            return 0.0
+
+    def _used_memory_mb(self) -> float:
+        return sum(entry["memory_mb"] for entry in self._models.values())
+
+    def _evict_to_fit(self, incoming_mb: float, keep: Optional[Tuple] = None,
+                      log: Optional[Callable[[str], None]] = None):
+        """依 LRU 順序釋放模型，直到符合記憶體預算"""
+        while self._models and self._used_memory_mb() + incoming_mb > self.max_memory_mb:
+            victim = next((k for k in self._models if k != keep), None)
+            if victim is None:
+                break
+            self.evict(victim, log=log)
+
+    def evict(self, key: Tuple[str, str, Optional[str]], log: Optional[Callable[[str], None]] = None) -> bool:
+        """釋放指定的模型"""
+        log = log or self.log
+        with self._lock:
+            entry = self._models.pop(key, None)
+            if entry is None:
+                return False
+            self.stats["evictions"] += 1
+            log(f"🗑️ 釋放模型 {key[0]} (設備: {key[1]})，約 {entry['memory_mb']:.0f} MB")
+            del entry
+            if key[1].startswith("cuda"):
+                try:
+                    import torch
+                    torch.cuda.empty_cache()
+                except Exception:
+                    pass
+            return True
+
+    def clear(self, log: Optional[Callable[[str], None]] = None):
+        """釋放所有模型"""
+        with self._lock:
+            for key in list(self._models.keys()):
+                self.evict(key, log=log)
+
+    def loaded_models(self) -> List[Dict[str, Any]]:
+        """列出目前常駐的模型（由舊到新）"""
+        with self._lock:
+            return [
+                {
+                    "model": key[0],
+                    "device": key[1],
+                    "download_root": key[2],
+                    "memory_mb": round(entry["memory_mb"], 1),
+                    "load_time": round(entry["load_time"], 3),
+                    "hits": entry["hits"],
+                }
+                for key, entry in self._models.items()
+            ]
+
+    def get_stats(self) -> Dict[str, Any]:
+        """取得命中、未命中和載入時間統計"""
+        with self._lock:
+            lookups = self.stats["hits"] + self.stats["misses"]
+            return {
+                "hits": self.stats["hits"],
+                "misses": self.stats["misses"],
+                "waits": self.stats["waits"],
+                "preloads": self.stats["preloads"],
+                "loading": [{"model": key[0], "device": key[1]} for key in self._loading],
+                "evictions": self.stats["evictions"],
+                "hit_rate": self.stats["hits"] / lookups if lookups > 0 else 0.0,
+                "total_load_time": round(self.stats["total_load_time"], 3),
+                "used_memory_mb": round(self._used_memory_mb(), 1),
+                "max_memory_mb": self.max_memory_mb,
+                "loaded_models": self.loaded_models(),
+                "load_history": list(self.stats["load_history"]),
+            }
+
+
+# 全域實例
+model_registry = WhisperModelRegistry()
+
+def get_whisper_model(name: str,
+                      device: str = "cpu",
+                      download_root: Optional[str] = None,
+                      log: Optional[Callable[[str], None]] = None,
+                      quantize: bool = False):
+    """
+    取得共用 Whisper 模型的便捷函數
+    """
+    return model_registry.get_model(name, device=device, download_root=download_root, log=log,
+                                    quantize=quantize)
+
+
+def preload_whisper_model(name: str,
+                          device: str = "cpu",
+                          download_root: Optional[str] = None,
+                          log: Optional[Callable[[str], None]] = None,
+                          quantize: bool = False) -> Optional[threading.Thread]:
+    """
+    在背景預先載入共用 Whisper 模型的便捷函數
+    """
+    return model_registry.preload(name, device=device, download_root=download_root, log=log,
+                                  quantize=quantize)
@@ -66,19 +66,55 @@ class WhisperSubtitleGUI:
         self.temperature = tk.DoubleVar(value=0.0)
         self.use_optimization = tk.BooleanVar(value=True)
         self.multi_pass_mode = tk.BooleanVar(value=False)
+        self.multi_pass_strategy = tk.StringVar(value="whole")  # whole: 整檔多溫度, window: 逐窗回退
         self.quality_level = tk.StringVar(value="auto")
         self.content_type = tk.StringVar(value="auto")
+        self.parallel_chunks = tk.BooleanVar(value=False)
+        self.parallel_workers = tk.IntVar(value=0)  # 0 表示自動
+        self.use_vad = tk.BooleanVar(value=False)
+        self.cpu_quantization = tk.BooleanVar(value=False)
+        self.stream_output = tk.BooleanVar(value=False)
+        self.partial_segments = []  # 串流輸出時已完成的字幕片段
+        self.model_cache_mb = 6144  # 常駐模型的記憶體預算（MB）
+        self.use_result_cache = True  # 重用相同音訊和解碼參數的轉錄結果
+        self.result_cache_mb = 512  # 轉錄結果快取的大小上限（MB）
+        self.cpu_threads = 0  # CPU 轉錄的 torch 執行緒數（0 表示依規劃自動決定）
+        self.audio_cache_mb = 8192  # 音訊擷取快取的大小上限（MB）
+        self.lazy_word_timestamps = False  # 只對合併短片段時需要的片段計算字詞時間戳
+        self.parallel_passes = False  # CPU 上多次通過轉錄的各溫度同時執行
+        self.batched_windows = 0  # 批次時間窗解碼的批次大小（0 表示逐窗解碼）
+        self.cascade_mode = False  # 先以快速模型轉錄，品質不足的片段再以所選模型重新轉錄
+        self.cascade_fast_model = "small"
+        self.checkpoint_long_files = False  # 長檔案逐窗保存進度，中斷後可從最後完成的時間窗繼續
+        self.checkpoint_min_seconds = 600
+        self.encoder_cache_mb = 512  # 溫度回退和多次通過共用同一時間窗的編碼器輸出
+        self.encoder_disk_cache = False  # 編碼器輸出另存到磁碟，調整解碼參數重新轉錄時不需要編碼
+        self.encoder_disk_cache_mb = 4096
+        self.loop_guard = True  # 音樂內容解碼時偵測重複迴圈並提前結束時間窗
+        self.phrase_suppression = True  # 解碼時禁止一定會被過濾掉的製作資訊片語
+        self.background_preload = True  # 啟動和切換模型或設備時在工作程序背景載入模型
+        self.preload_after_id = None
+        self.transcription_worker = None  # 常駐轉錄工作程序（第一次轉錄時啟動）
         self.is_processing = False
+        self.transcription_cancelled = False
         
         self.setup_ui()
         self.load_config()
+        
+        # 模型或設備變更時預先載入（載入設定後才開始追蹤，啟動時只載入一次）
+        for variable in (self.whisper_model, self.device, self.use_gpu, self.cpu_quantization):
+            variable.trace_add("write", lambda *args: self.schedule_model_preload())
+        self.schedule_model_preload()
     
     def check_essential_files(self):
         """檢查關鍵檔案是否存在"""
         script_dir = os.path.dirname(os.path.abspath(__file__))
         essential_files = [
             "video_processor.py",
-            "subtitle_editor.py"
+            "subtitle_editor.py",
+            "whisper_model_manager.py",
+            "transcription_pipeline.py",
+            "transcription_worker.py"
         ]
         
         # 檢查可選但重要的檔案
@@ -390,7 +426,14 @@ class WhisperSubtitleGUI:
         
         self.multi_pass_mode = tk.BooleanVar(value=False)
         ttk.Checkbutton(advanced_row, text="🔄 多次通過", 
-                       variable=self.multi_pass_mode).pack(side=tk.LEFT, padx=(0, 15))
+                       variable=self.multi_pass_mode).pack(side=tk.LEFT, padx=(0, 5))
+        
+        # 多次通過策略：整檔重跑或只重試低品質時間窗
+        self.multi_pass_strategy = tk.StringVar(value="whole")
+        strategy_combo = ttk.Combobox(advanced_row, textvariable=self.multi_pass_strategy,
+                                    values=["whole", "window"], 
+                                    state="readonly", width=7)
+        strategy_combo.pack(side=tk.LEFT, padx=(0, 15))
         
         # 品質等級
         ttk.Label(advanced_row, text="品質:").pack(side=tk.LEFT)
@@ -408,14 +451,33 @@ class WhisperSubtitleGUI:
                                    state="readonly", width=8)
         content_combo.pack(side=tk.LEFT, padx=5)
         
-        # 模型說明 - 移到第四行
+        # 效能選項（CPU 平行處理等）
+        perf_row = ttk.Frame(self.whisper_frame)
+        perf_row.grid(row=3, column=0, columnspan=6, sticky=(tk.W, tk.E), pady=(0, 5))
+        
+        ttk.Checkbutton(perf_row, text="🧩 CPU 分段平行", 
+                       variable=self.parallel_chunks).pack(side=tk.LEFT, padx=(0, 5))
+        ttk.Label(perf_row, text="程序數:").pack(side=tk.LEFT)
+        ttk.Spinbox(perf_row, from_=0, to=64, textvariable=self.parallel_workers, 
+                   width=4).pack(side=tk.LEFT, padx=(2, 15))
+        
+        ttk.Checkbutton(perf_row, text="🔇 跳過靜音 (VAD)", 
+                       variable=self.use_vad).pack(side=tk.LEFT, padx=(0, 15))
+        
+        ttk.Checkbutton(perf_row, text="📡 串流輸出", 
+                       variable=self.stream_output).pack(side=tk.LEFT, padx=(0, 15))
+        
+        ttk.Checkbutton(perf_row, text="⚡ CPU int8 量化", 
+                       variable=self.cpu_quantization).pack(side=tk.LEFT, padx=(0, 15))
+        
+        # 模型說明 - 移到第五行
         model_info = ttk.Label(self.whisper_frame, text="💡 模型: tiny(快) → base → small → medium(推薦) → large(準確)", 
                               font=("Arial", 8), foreground="gray")
-        model_info.grid(row=3, column=0, columnspan=6, sticky=tk.W, pady=(5, 0))
+        model_info.grid(row=4, column=0, columnspan=6, sticky=tk.W, pady=(5, 0))
         
-        # 第四行：模型位置設定 - 水平排列
+        # 第五行：模型位置設定 - 水平排列
         model_dir_row = ttk.Frame(self.whisper_frame)
-        model_dir_row.grid(row=4, column=0, columnspan=6, sticky=(tk.W, tk.E), pady=(5, 0))
+        model_dir_row.grid(row=5, column=0, columnspan=6, sticky=(tk.W, tk.E), pady=(5, 0))
         
         self.custom_model_check = ttk.Checkbutton(model_dir_row, text="自訂模型位置", 
                                                  variable=self.use_custom_model_dir, 
@@ -430,9 +492,9 @@ class WhisperSubtitleGUI:
         
 
         
-        # 第五行：工具按鈕 - 水平排列，更緊湊
+        # 第六行：工具按鈕 - 水平排列，更緊湊
         tools_row = ttk.Frame(self.whisper_frame)
-        tools_row.grid(row=5, column=0, columnspan=6, sticky=(tk.W, tk.E), pady=(8, 0))
+        tools_row.grid(row=6, column=0, columnspan=6, sticky=(tk.W, tk.E), pady=(8, 0))
         
         # 主要工具按鈕
         ttk.Button(tools_row, text="📁 模型", command=self.check_downloaded_models).pack(side=tk.LEFT, padx=(0, 5))
@@ -482,6 +544,11 @@ class WhisperSubtitleGUI:
                                   command=self.open_subtitle_editor, state="disabled")
         self.edit_btn.pack(side=tk.LEFT, padx=(5, 0), fill=tk.X, expand=True)
         
+        # 停止進行中的轉錄（終止常駐工作程序；切換模式重新排列按鈕時固定在右側）
+        self.stop_btn = ttk.Button(buttons_row, text="⏹ 停止", 
+                                  command=self.cancel_transcription, state="disabled")
+        self.stop_btn.pack(side=tk.RIGHT, padx=(5, 0))
+        
         # 進度條和狀態 - 更緊湊
         progress_frame = ttk.Frame(main_frame)
         progress_frame.grid(row=6, column=0, columnspan=3, sticky=(tk.W, tk.E), pady=(5, 8))
@@ -550,8 +617,32 @@ class WhisperSubtitleGUI:
                     self.device.set(config.get("device", "auto"))
                     self.use_optimization.set(config.get("use_optimization", True))
                     self.multi_pass_mode.set(config.get("multi_pass_mode", False))
+                    self.multi_pass_strategy.set(config.get("multi_pass_strategy", "whole"))
                     self.quality_level.set(config.get("quality_level", "auto"))
                     self.content_type.set(config.get("content_type", "auto"))
+                    self.parallel_chunks.set(config.get("parallel_chunks", False))
+                    self.parallel_workers.set(config.get("parallel_workers", 0))
+                    self.use_vad.set(config.get("use_vad", False))
+                    self.cpu_quantization.set(config.get("cpu_quantization", False))
+                    self.stream_output.set(config.get("stream_output", False))
+                    self.model_cache_mb = config.get("model_cache_mb", 6144)
+                    self.use_result_cache = config.get("use_result_cache", True)
+                    self.result_cache_mb = config.get("result_cache_mb", 512)
+                    self.cpu_threads = config.get("cpu_threads", 0)
+                    self.audio_cache_mb = config.get("audio_cache_mb", 8192)
+                    self.lazy_word_timestamps = config.get("lazy_word_timestamps", False)
+                    self.parallel_passes = config.get("parallel_passes", False)
+                    self.batched_windows = config.get("batched_windows", 0)
+                    self.cascade_mode = config.get("cascade_mode", False)
+                    self.cascade_fast_model = config.get("cascade_fast_model", "small")
+                    self.checkpoint_long_files = config.get("checkpoint_long_files", False)
+                    self.checkpoint_min_seconds = config.get("checkpoint_min_seconds", 600)
+                    self.encoder_cache_mb = config.get("encoder_cache_mb", 512)
+                    self.encoder_disk_cache = config.get("encoder_disk_cache", False)
+                    self.encoder_disk_cache_mb = config.get("encoder_disk_cache_mb", 4096)
+                    self.loop_guard = config.get("loop_guard", True)
+                    self.phrase_suppression = config.get("phrase_suppression", True)
+                    self.background_preload = config.get("background_preload", True)
                     self.toggle_audio_input()  # 更新界面狀態
                     self.toggle_custom_model_dir()  # 更新模型目錄界面狀態
                     self.toggle_gpu_settings()  # 更新 GPU 界面狀態
@@ -581,8 +672,32 @@ class WhisperSubtitleGUI:
                 "device": self.device.get(),
                 "use_optimization": self.use_optimization.get(),
                 "multi_pass_mode": self.multi_pass_mode.get(),
+                "multi_pass_strategy": self.multi_pass_strategy.get(),
                 "quality_level": self.quality_level.get(),
-                "content_type": self.content_type.get()
+                "content_type": self.content_type.get(),
+                "parallel_chunks": self.parallel_chunks.get(),
+                "parallel_workers": self.parallel_workers.get(),
+                "use_vad": self.use_vad.get(),
+                "cpu_quantization": self.cpu_quantization.get(),
+                "stream_output": self.stream_output.get(),
+                "model_cache_mb": self.model_cache_mb,
+                "use_result_cache": self.use_result_cache,
+                "result_cache_mb": self.result_cache_mb,
+                "cpu_threads": self.cpu_threads,
+                "audio_cache_mb": self.audio_cache_mb,
+                "lazy_word_timestamps": self.lazy_word_timestamps,
+                "parallel_passes": self.parallel_passes,
+                "batched_windows": self.batched_windows,
+                "cascade_mode": self.cascade_mode,
+                "cascade_fast_model": self.cascade_fast_model,
+                "checkpoint_long_files": self.checkpoint_long_files,
+                "checkpoint_min_seconds": self.checkpoint_min_seconds,
+                "encoder_cache_mb": self.encoder_cache_mb,
+                "encoder_disk_cache": self.encoder_disk_cache,
+                "encoder_disk_cache_mb": self.encoder_disk_cache_mb,
+                "loop_guard": self.loop_guard,
+                "phrase_suppression": self.phrase_suppression,
+                "background_preload": self.background_preload
             }
             config_path = os.path.join(os.path.dirname(__file__), "whisper_config.json")
             with open(config_path, 'w', encoding='utf-8') as f:
@@ -726,6 +841,20 @@ class WhisperSubtitleGUI:
         """顯示預設模型位置"""
         self.show_model_location()
     
+    def model_stamp_note(self, checkpoint: str) -> str:
+        """已驗證模型的標記說明（載入時略過 SHA256 檢查，並顯示平均載入時間）"""
+        try:
+            from model_verification import verified_model_stamps
+            stamp = verified_model_stamps.get_stamp(checkpoint)
+        except Exception:
+            return ""
+        if stamp is None:
+            return ""
+        loads = stamp.get("loads") or {}
+        if loads.get("count"):
+            return f" ✅ 已驗證, 載入 {loads['count']} 次, 平均 {loads['total_seconds'] / loads['count']:.1f} 秒"
+        return " ✅ 已驗證"
+    
     def check_downloaded_models(self):
         """檢查已下載的模型"""
         import os
@@ -747,7 +876,7 @@ class WhisperSubtitleGUI:
             if pt_models or bin_models:
                 for model in pt_models:
                     size = os.path.getsize(os.path.join(default_dir, model)) / (1024*1024)
-                    model_info += f"  • {model} ({size:.1f} MB) [新格式]\n"
+                    model_info += f"  • {model} ({size:.1f} MB) [新格式]{self.model_stamp_note(os.path.join(default_dir, model))}\n"
                 for model in bin_models:
                     size = os.path.getsize(os.path.join(default_dir, model)) / (1024*1024)
                     model_info += f"  • {model} ({size:.1f} MB) [舊格式]\n"
@@ -766,7 +895,7 @@ class WhisperSubtitleGUI:
             if pt_models or bin_models:
                 for model in pt_models:
                     size = os.path.getsize(os.path.join(custom_dir, model)) / (1024*1024)
-                    model_info += f"  • {model} ({size:.1f} MB) [新格式]\n"
+                    model_info += f"  • {model} ({size:.1f} MB) [新格式]{self.model_stamp_note(os.path.join(custom_dir, model))}\n"
                 for model in bin_models:
                     size = os.path.getsize(os.path.join(custom_dir, model)) / (1024*1024)
                     model_info += f"  • {model} ({size:.1f} MB) [舊格式]\n"
@@ -785,7 +914,7 @@ class WhisperSubtitleGUI:
                 if pt_models or bin_models:
                     for model in pt_models:
                         size = os.path.getsize(os.path.join(whisper_cache, model)) / (1024*1024)
-                        model_info += f"  • {model} ({size:.1f} MB) [新格式]\n"
+                        model_info += f"  • {model} ({size:.1f} MB) [新格式]{self.model_stamp_note(os.path.join(whisper_cache, model))}\n"
                     for model in bin_models:
                         size = os.path.getsize(os.path.join(whisper_cache, model)) / (1024*1024)
                         model_info += f"  • {model} ({size:.1f} MB) [舊格式]\n"
@@ -1079,11 +1208,13 @@ class WhisperSubtitleGUI:
         self.burn_only_btn.config(state="disabled")
         if hasattr(self, 'edit_btn'):
             self.edit_btn.config(state="disabled")
+        self.stop_btn.config(state="normal")
     
     def stop_progress(self):
         """停止進度條"""
         self.progress.stop()
         self.is_processing = False
+        self.stop_btn.config(state="disabled")
         
         # 恢復按鈕狀態
         mode = self.operation_mode.get()
@@ -1169,7 +1300,6 @@ class WhisperSubtitleGUI:
                 
                 # 顯示模型資訊
                 try:
-                    import whisper
                     model_info = {
                         'tiny': '39 MB, 最快速度',
                         'base': '74 MB, 快速',
@@ -1192,305 +1322,24 @@ class WhisperSubtitleGUI:
                 file_size = os.path.getsize(input_file) / (1024 * 1024)  # MB
                 self.log(f"📊 檔案大小: {file_size:.1f} MB")
                 
-                # 檢查路徑是否包含中文字符，如果是則直接使用 Python API
-                has_chinese_chars = any(ord(c) > 127 for c in input_file) or any(ord(c) > 127 for c in self.output_srt_path.get())
-                if has_chinese_chars and sys.platform.startswith('win'):
-                    self.log("🔧 偵測到中文路徑，直接使用 Python API 避免編碼問題")
-                    try:
-                        success = False
-                        if self.use_optimization.get():
-                            self.log("🧠 嘗試使用優化版 Python API...")
-                            success = self.run_whisper_python_api(input_file, self.output_srt_path.get())
-                        
-                        if not success:
-                            self.log("🔄 回退到基本版本...")
-                            success = self.run_basic_whisper_api(input_file, self.output_srt_path.get())
-                        
-                        if success:
-                            self.set_status("✅ 字幕生成完成！", "green")
-                            self.log("🎉 字幕生成成功完成！")
-                            # 啟用編輯按鈕
-                            if hasattr(self, 'edit_btn'):
-                                self.edit_btn.config(state="normal")
-                        else:
-                            self.set_status("❌ 字幕生成失敗", "red")
-                            self.log("❌ 字幕生成失敗")
-                        return
-                    except Exception as e:
-                        self.log(f"❌ Python API 失敗: {e}")
-                        self.log("🔄 回退到命令行模式...")
-                
-                # 設定環境變數（如果使用自訂模型位置）
-                env = os.environ.copy()
-                if self.use_custom_model_dir.get() and self.custom_model_dir.get():
-                    env['WHISPER_CACHE_DIR'] = self.custom_model_dir.get()
-                    self.log(f"🔧 使用自訂模型位置: {self.custom_model_dir.get()}")
-                
-                # 檢查 Whisper 是否安裝
+                # 檢查 Whisper 是否安裝（只查找模組，不在介面程序中載入 torch）
                 self.set_status("檢查 Whisper 安裝...", "blue")
-                try:
-                    # 先嘗試檢查 whisper 模組
-                    import whisper as whisper_module
-                    self.log("✅ Whisper Python 模組已安裝")
-                    
-                    # 再檢查命令行工具
-                    result = subprocess.run(["whisper", "--help"], capture_output=True, text=True, timeout=15, shell=True)
-                    if result.returncode == 0:
-                        self.log("✅ Whisper 命令行工具檢查通過")
-                    else:
-                        self.log("⚠️ Whisper 命令行工具可能有問題，但 Python 模組可用")
-                        self.log("   將嘗試使用 Python 模組直接調用")
-                        
-                except ImportError:
+                import importlib.util
+                if importlib.util.find_spec("whisper") is None:
                     self.log("❌ Whisper Python 模組未安裝")
                     raise FileNotFoundError("Whisper Python 模組未安裝")
-                except subprocess.TimeoutExpired:
-                    self.log("⚠️ Whisper 命令響應超時，但將繼續嘗試")
-                except FileNotFoundError:
-                    self.log("⚠️ 找不到 whisper 命令，嘗試使用 Python 模組")
-                except Exception as e:
-                    self.log(f"⚠️ Whisper 檢查時出現問題: {e}")
-                    self.log("   將嘗試繼續執行...")
-                
-                # 建立 Whisper 命令
-                self.set_status("準備 Whisper 命令...", "blue")
-                
-                # 處理包含中文字符的路徑
-                safe_input_file = input_file
-                safe_output_dir = str(Path(self.output_srt_path.get()).parent)
-                
-                # 在 Windows 上，如果路徑包含中文字符，使用短路徑名稱
-                if sys.platform.startswith('win'):
-                    try:
-                        import win32api
-                        if any(ord(c) > 127 for c in input_file):
-                            safe_input_file = win32api.GetShortPathName(input_file)
-                            self.log(f"🔧 使用短路徑名稱: {safe_input_file}")
-                        if any(ord(c) > 127 for c in safe_output_dir):
-                            safe_output_dir = win32api.GetShortPathName(safe_output_dir)
-                            self.log(f"🔧 使用短輸出目錄: {safe_output_dir}")
-                    except ImportError:
-                        self.log("⚠️ win32api 未安裝，無法使用短路徑名稱")
-                    except Exception as e:
-                        self.log(f"⚠️ 獲取短路徑名稱失敗: {e}")
-                
-                cmd = [
-                    "whisper",
-                    safe_input_file,
-                    "--model", self.whisper_model.get(),
-                    "--output_format", "srt",
-                    "--output_dir", safe_output_dir,
-                    "--verbose", "True"
-                ]
-                
-                # 添加設備參數 (GPU 加速)
-                if self.use_gpu.get():
-                    device = self.device.get()
-                    if device == "auto":
-                        # 自動偵測最佳設備
-                        try:
-                            import torch
-                            if torch.cuda.is_available():
-                                device = "cuda"
-                                self.log("🚀 偵測到 CUDA，使用 GPU 加速")
-                            else:
-                                device = "cpu"
-                                self.log("💻 未偵測到 CUDA，使用 CPU")
-                        except ImportError:
-                            device = "cpu"
-                            self.log("💻 PyTorch 未安裝，使用 CPU")
-                    
-                    cmd.extend(["--device", device])
-                    self.log(f"⚙️ 使用設備: {device}")
-                else:
-                    cmd.extend(["--device", "cpu"])
-                    self.log("💻 強制使用 CPU 模式")
-                
-                # 添加語言參數（如果不是自動偵測）
-                if self.language.get() != "auto":
-                    cmd.extend(["--language", self.language.get()])
                 
-                # 添加進階選項
-                cmd.extend([
-                    "--no_speech_threshold", str(self.no_speech_threshold.get()),
-                    "--temperature", str(self.temperature.get()),
-                    "--condition_on_previous_text", "False"  # 避免重複內容
-                ])
-                
-                # 音樂模式的特殊設定
-                if self.music_mode.get():
-                    cmd.extend([
-                        "--compression_ratio_threshold", "2.8",  # 放寬壓縮比限制
-                        "--logprob_threshold", "-1.5",  # 放寬機率閾值
-                        "--best_of", "3"  # 增加候選數量
-                    ])
-                    self.log("🎵 音樂模式：使用特殊參數優化歌曲識別")
-                
-                # 如果使用音訊檔案，添加額外的精確度選項
-                if self.use_audio_file.get():
-                    cmd.extend([
-                        "--word_timestamps", "True",  # 詞級時間戳
-                    ])
-                    self.log("🎵 使用音訊檔案模式，啟用高精度選項")
-                
-                self.log(f"🔧 靜音閾值: {self.no_speech_threshold.get()}")
-                self.log(f"🔧 溫度: {self.temperature.get()}")
-                self.log(f"🔧 過濾重複: {self.filter_repetitive.get()}")
-                
-                self.log(f"⚙️ 執行命令: {' '.join(cmd)}")
-                self.log("-" * 50)
+                if self.use_custom_model_dir.get() and self.custom_model_dir.get():
+                    self.log(f"🔧 使用自訂模型位置: {self.custom_model_dir.get()}")
                 
-                # 執行 Whisper
+                # 在常駐工作程序中轉錄（模型載入一次後持續重用）
                 self.set_status("正在執行 Whisper 語音識別...", "blue")
                 self.log("🚀 開始語音識別處理...")
-                
-                # 設定環境變數以解決編碼問題
-                env['PYTHONIOENCODING'] = 'utf-8'
-                env['PYTHONUTF8'] = '1'
-                
-                # 嘗試不同的執行方式和編碼
-                try:
-                    process = subprocess.Popen(
-                        cmd,
-                        stdout=subprocess.PIPE,
-                        stderr=subprocess.STDOUT,
-                        text=True,
-                        encoding='utf-8',
-                        errors='replace',  # 處理編碼錯誤
-                        env=env,
-                        bufsize=1,
-                        universal_newlines=True,
-                        shell=True  # 在 Windows 上使用 shell
-                    )
-                except Exception as e:
-                    self.log(f"⚠️ 使用 shell=True 執行失敗: {e}")
-                    # 嘗試不使用 shell，並使用不同的編碼策略
-                    try:
-                        process = subprocess.Popen(
-                            cmd,
-                            stdout=subprocess.PIPE,
-                            stderr=subprocess.STDOUT,
-                            text=True,
-                            encoding='utf-8',
-                            errors='replace',
-                            env=env,
-                            bufsize=1,
-                            universal_newlines=True,
-                            shell=False
-                        )
-                    except Exception as e2:
-                        self.log(f"⚠️ UTF-8 編碼失敗，嘗試系統預設編碼: {e2}")
-                        # 最後嘗試使用系統預設編碼
-                        process = subprocess.Popen(
-                            cmd,
-                            stdout=subprocess.PIPE,
-                            stderr=subprocess.STDOUT,
-                            text=True,
-                            encoding='cp950',  # Windows 繁體中文編碼
-                            errors='replace',
-                            env=env,
-                            bufsize=1,
-                            universal_newlines=True,
-                            shell=True
-                        )
-                
-                # 即時顯示輸出並解析進度
-                output_lines = []
-                last_progress_time = time.time()
-                
-                try:
-                    for line in iter(process.stdout.readline, ''):
-                        if line:
-                            try:
-                                line = line.strip()
-                                if line:  # 只記錄非空行
-                                    output_lines.append(line)
-                                    self.log(line)
-                                    
-                                    # 解析進度資訊
-                                    if "Loading model" in line:
-                                        self.set_status("正在載入 Whisper 模型...", "blue")
-                                    elif "Detecting language" in line:
-                                        self.set_status("正在偵測語言...", "blue")
-                                    elif "%" in line and ("transcribe" in line.lower() or "processing" in line.lower()):
-                                        self.set_status("正在轉錄音訊...", "blue")
-                                    elif "Writing" in line and ".srt" in line:
-                                        self.set_status("正在寫入字幕檔案...", "blue")
-                                    elif "100%" in line:
-                                        self.set_status("處理完成，正在生成字幕...", "blue")
-                                    elif "UnicodeEncodeError" in line:
-                                        self.log("⚠️ 偵測到編碼錯誤，但處理將繼續...")
-                                        self.log("💡 建議: 將檔案移至不含中文字符的路徑")
-                                    elif "Skipping" in line and "due to" in line:
-                                        self.log("⚠️ Whisper 跳過了某些內容，但處理將繼續...")
-                                    
-                                    last_progress_time = time.time()
-                            except UnicodeDecodeError as e:
-                                # 嘗試使用不同編碼解碼
-                                try:
-                                    line_bytes = line.encode('cp950', errors='ignore')
-                                    line = line_bytes.decode('utf-8', errors='replace')
-                                    output_lines.append(line)
-                                    self.log(f"🔧 編碼修正: {line}")
-                                except:
-                                    self.log(f"⚠️ 編碼錯誤，跳過此行: {e}")
-                                continue
-                            except Exception as e:
-                                self.log(f"⚠️ 處理輸出時出錯: {e}")
-                                continue
-                        
-                        # 檢查是否長時間沒有輸出
-                        if time.time() - last_progress_time > 30:  # 30秒沒有輸出
-                            self.log("⏰ 處理中，請耐心等待...")
-                            last_progress_time = time.time()
-                            
-                except Exception as e:
-                    self.log(f"⚠️ 讀取 Whisper 輸出時出錯: {e}")
-                    self.log("   程式將繼續等待 Whisper 完成...")
-                
-                process.wait()
-                
                 self.log("-" * 50)
-                self.log(f"🏁 Whisper 處理完成，返回碼: {process.returncode}")
-                
-                self.log(f"🏁 Whisper 命令行處理完成，返回碼: {process.returncode}")
-                
-                # 檢查是否生成了 SRT 檔案
-                input_name = Path(input_file).stem
-                possible_srt_files = [
-                    Path(self.output_srt_path.get()),
-                    Path(self.output_srt_path.get()).parent / f"{input_name}.srt",
-                    Path(input_file).parent / f"{input_name}.srt"
-                ]
-                
-                srt_found = False
-                for srt_file in possible_srt_files:
-                    if srt_file.exists():
-                        self.log(f"✅ 找到生成的字幕檔案: {srt_file}")
-                        if str(srt_file) != self.output_srt_path.get():
-                            # 移動到指定位置
-                            srt_file.rename(self.output_srt_path.get())
-                            self.log(f"📁 字幕檔案已移動至: {self.output_srt_path.get()}")
-                        srt_found = True
-                        process.returncode = 0  # 標記為成功
-                        break
-                
-                # 如果命令行沒有生成檔案，嘗試使用 Python API
-                if not srt_found:
-                    self.log("⚠️ 命令行未生成字幕檔案，嘗試使用 Python API...")
-                    try:
-                        if self.use_optimization.get():
-                            success = self.run_whisper_python_api(input_file, self.output_srt_path.get())
-                        else:
-                            success = self.run_basic_whisper_api(input_file, self.output_srt_path.get())
-                        
-                        if success:
-                            process.returncode = 0  # 標記為成功
-                            srt_found = True
-                    except Exception as e:
-                        self.log(f"❌ Python API 也失敗: {e}")
+                success = self.run_transcription(input_file, self.output_srt_path.get())
+                self.log("-" * 50)
                 
-                if srt_found and process.returncode == 0:
+                if success and os.path.exists(self.output_srt_path.get()):
                     # 檢查字幕內容
                     try:
                         # 嘗試不同的編碼方式讀取 SRT 檔案
@@ -1525,16 +1374,12 @@ class WhisperSubtitleGUI:
                             self.log("⚠️ 無法以任何編碼讀取字幕檔案")
                     except Exception as e:
                         self.log(f"⚠️ 無法讀取字幕內容: {e}")
+                elif self.transcription_cancelled:
+                    self.set_status("⏹ 已停止轉錄", "orange")
                 else:
                     self.set_status("❌ Whisper 執行失敗", "red")
-                    self.log(f"❌ Whisper 執行失敗，返回碼: {process.returncode}")
+                    self.log("❌ 字幕生成失敗")
                     self.log("💡 請檢查上方的錯誤訊息")
-                    
-                    # 顯示最後幾行輸出作為錯誤參考
-                    if output_lines:
-                        self.log("📋 最後的輸出訊息:")
-                        for line in output_lines[-5:]:
-                            self.log(f"   {line}")
                 
             except FileNotFoundError as e:
                 self.set_status("❌ 找不到 Whisper", "red")
@@ -1560,488 +1405,157 @@ class WhisperSubtitleGUI:
         thread = threading.Thread(target=run_whisper, daemon=True)
         thread.start()
     
-    def run_whisper_python_api(self, input_file: str, output_srt: str) -> bool:
-        """使用 Python API 直接調用 Whisper（優化版本）"""
-        try:
-            # 抑制 Whisper 警告
-            import warnings
-            warnings.filterwarnings("ignore", message=".*Failed to launch Triton kernels.*")
-            warnings.filterwarnings("ignore", message=".*falling back to a slower.*")
-            
-            import whisper
-            
-            # 檢查輸入檔案是否存在
-            if not os.path.exists(input_file):
-                raise FileNotFoundError(f"輸入檔案不存在: {input_file}")
-            
-            # 檢查輸出目錄是否存在，如果不存在則創建
-            output_dir = os.path.dirname(output_srt)
-            if output_dir and not os.path.exists(output_dir):
-                try:
-                    os.makedirs(output_dir, exist_ok=True)
-                    self.log(f"🔧 創建輸出目錄: {output_dir}")
-                except Exception as e:
-                    self.log(f"❌ 創建輸出目錄失敗: {e}")
-                    return False
-            
-            # 嘗試載入優化器，如果失敗則使用基本版本
-            try:
-                from whisper_accuracy_optimizer import WhisperAccuracyOptimizer
-                optimizer = WhisperAccuracyOptimizer()
-                self.log("🐍 使用優化版 Python API 調用 Whisper...")
-                use_optimizer = True
-            except ImportError as e:
-                self.log(f"⚠️ 優化器未找到: {e}")
-                self.log("⚠️ 使用基本版 Python API...")
-                optimizer = None
-                use_optimizer = False
-            except Exception as e:
-                self.log(f"⚠️ 載入優化器時出錯: {e}")
-                self.log("⚠️ 使用基本版 Python API...")
-                optimizer = None
-                use_optimizer = False
-            
-            # 決定內容類型
-            if self.content_type.get() == "auto":
-                content_type = "music" if self.music_mode.get() else "speech"
-            else:
-                content_type = self.content_type.get()
-            
-            # 智能語言偵測
-            language = self.language.get()
-            if language == "auto":
-                self.log("🔍 使用自動語言偵測...")
-                language = None  # Whisper 會自動偵測
-            else:
-                self.log(f"🌍 使用指定語言: {language}")
-            
-            # 決定品質等級
-            if self.quality_level.get() == "auto":
-                # 根據模型大小自動決定品質等級
-                quality_map = {
-                    "tiny": "fast",
-                    "base": "balanced", 
-                    "small": "balanced",
-                    "medium": "high",
-                    "large": "ultra"
-                }
-                quality_level = quality_map.get(self.whisper_model.get(), "high")
-            else:
-                quality_level = self.quality_level.get()
-            
-            self.log(f"🎯 內容類型: {content_type}, 語言: {language if language else 'auto'}, 品質等級: {quality_level}")
-            
-            # 獲取優化參數
-            if use_optimizer:
-                optimized_params = optimizer.optimize_whisper_params(
-                    content_type=content_type,
-                    language=language if language else "auto",
-                    quality_level=quality_level
-                )
-                
-                self.log("⚙️ 使用優化參數:")
-                for key, value in optimized_params.items():
-                    if key != "temperature":  # temperature 會特別處理
-                        self.log(f"   {key}: {value}")
-            else:
-                # 使用基本參數
-                optimized_params = {
-                    "language": language,  # None 表示自動偵測
-                    "temperature": [0.0],
-                    "no_speech_threshold": self.no_speech_threshold.get(),
-                    "condition_on_previous_text": False
-                }
-                self.log("⚙️ 使用基本參數（無優化器）")
-            
-            # 決定使用的設備
-            device = "cpu"
-            if self.use_gpu.get():
-                try:
-                    import torch
-                    if torch.cuda.is_available():
-                        device = "cuda"
-                        self.log("🚀 Python API 使用 GPU 加速")
-                        self.log("ℹ️ 注意: Windows 上可能會看到 Triton 警告，但 GPU 仍正常工作")
-                    else:
-                        self.log("💻 GPU 不可用，Python API 使用 CPU")
-                except ImportError:
-                    self.log("💻 PyTorch 未安裝，Python API 使用 CPU")
-            else:
-                self.log("💻 Python API 強制使用 CPU")
-            
-            # 載入模型
-            self.set_status("正在載入 Whisper 模型...", "blue")
-            try:
-                with warnings.catch_warnings():
-                    warnings.simplefilter("ignore")
-                    model = whisper.load_model(self.whisper_model.get(), device=device)
-                self.log(f"✅ 模型 {self.whisper_model.get()} 載入成功 (設備: {device})")
-            except Exception as e:
-                self.log(f"❌ 模型載入失敗: {e}")
-                import traceback
-                self.log(f"🔍 詳細錯誤:\n{traceback.format_exc()}")
-                return False
-            
-            # 根據設定決定是否使用多次通過轉錄
-            if self.multi_pass_mode.get() and use_optimizer:
-                self.set_status("正在執行多次通過轉錄...", "blue")
-                try:
-                    result = optimizer.multi_pass_transcription(
-                        model=model,
-                        audio_file=input_file,
-                        params=optimized_params,
-                        language=language
-                    )
-                    self.log("✅ 多次通過轉錄完成")
-                except Exception as e:
-                    self.log(f"❌ 多次通過轉錄失敗: {e}")
-                    import traceback
-                    self.log(f"🔍 詳細錯誤:\n{traceback.format_exc()}")
-                    return False
-            else:
-                self.set_status("正在執行單次轉錄...", "blue")
-                # 使用優化參數進行單次轉錄
-                try:
-                    whisper_params = {k: v for k, v in optimized_params.items() 
-                                    if k not in ["temperature"] and v is not None}
-                    temperature = optimized_params.get("temperature", [0.0])
-                    if isinstance(temperature, list):
-                        temperature = temperature[0]  # 使用第一個溫度值
-                    
-                    self.log(f"🔧 轉錄參數: {whisper_params}")
-                    self.log(f"🔧 溫度: {temperature}")
-                    
-                    with warnings.catch_warnings():
-                        warnings.simplefilter("ignore")
-                        result = model.transcribe(
-                            input_file,
-                            temperature=temperature,
-                            **whisper_params
-                        )
-                    self.log("✅ 單次轉錄完成")
-                except Exception as e:
-                    self.log(f"❌ 單次轉錄失敗: {e}")
-                    import traceback
-                    self.log(f"🔍 詳細錯誤:\n{traceback.format_exc()}")
-                    return False
-            
-            # 生成 SRT 字幕
-            if use_optimizer:
-                self.set_status("正在生成優化的 SRT 字幕...", "blue")
-                try:
-                    srt_content = optimizer.generate_optimized_srt(
-                        result=result,
-                        language=language,
-                        filter_repetitive=self.filter_repetitive.get(),
-                        merge_short_segments=True
-                    )
-                except Exception as e:
-                    self.log(f"❌ 生成優化 SRT 失敗: {e}")
-                    import traceback
-                    self.log(f"🔍 詳細錯誤:\n{traceback.format_exc()}")
-                    return False
-            else:
-                self.set_status("正在生成 SRT 字幕...", "blue")
-                srt_content = self.generate_basic_srt(result)
-            
-            # 寫入檔案
+    def collect_transcription_settings(self) -> dict:
+        """將介面上的轉錄設定整理成可傳給工作程序的字典"""
+        download_root = None
+        if self.use_custom_model_dir.get() and self.custom_model_dir.get():
+            download_root = self.custom_model_dir.get()
+        
+        return {
+            "model": self.whisper_model.get(),
+            "language": self.language.get(),
+            "use_gpu": self.use_gpu.get(),
+            "download_root": download_root,
+            "model_cache_mb": self.model_cache_mb,
+            "use_optimization": self.use_optimization.get(),
+            "content_type": self.content_type.get(),
+            "music_mode": self.music_mode.get(),
+            "quality_level": self.quality_level.get(),
+            "multi_pass_mode": self.multi_pass_mode.get(),
+            "multi_pass_strategy": self.multi_pass_strategy.get(),
+            "filter_repetitive": self.filter_repetitive.get(),
+            "no_speech_threshold": self.no_speech_threshold.get(),
+            "temperature": self.temperature.get(),
+            "parallel_chunks": self.parallel_chunks.get(),
+            "parallel_workers": self.parallel_workers.get(),
+            "use_vad": self.use_vad.get(),
+            "cpu_quantization": self.cpu_quantization.get(),
+            "stream_output": self.stream_output.get(),
+            "use_result_cache": self.use_result_cache,
+            "result_cache_mb": self.result_cache_mb,
+            "cpu_threads": self.cpu_threads,
+            "audio_cache_mb": self.audio_cache_mb,
+            "lazy_word_timestamps": self.lazy_word_timestamps,
+            "parallel_passes": self.parallel_passes,
+            "batched_windows": self.batched_windows,
+            "cascade_mode": self.cascade_mode,
+            "cascade_fast_model": self.cascade_fast_model,
+            "checkpoint_long_files": self.checkpoint_long_files,
+            "checkpoint_min_seconds": self.checkpoint_min_seconds,
+            "encoder_cache_mb": self.encoder_cache_mb,
+            "encoder_disk_cache": self.encoder_disk_cache,
+            "encoder_disk_cache_mb": self.encoder_disk_cache_mb,
+            "loop_guard": self.loop_guard,
+            "phrase_suppression": self.phrase_suppression,
+            # 轉錄影片時一併擷取編輯器播放和燒錄用的音軌，之後不需要再解碼
+            "extra_audio_tracks": [] if self.use_audio_file.get() else ["playback", "burn"],
+        }
+    
+    def create_transcription_pipeline(self):
+        """建立在本程序執行的轉錄流程（工作程序無法使用時的備用方案）"""
+        from transcription_pipeline import TranscriptionPipeline
+        return TranscriptionPipeline(
+            self.collect_transcription_settings(),
+            log=self.log,
+            set_status=self.set_status,
+            segment_callback=self.on_partial_segments
+        )
+    
+    def get_transcription_worker(self):
+        """取得常駐轉錄工作程序（第一次使用時啟動）"""
+        if self.transcription_worker is None:
+            from transcription_worker import TranscriptionWorker
+            self.transcription_worker = TranscriptionWorker()
+        return self.transcription_worker
+    
+    def schedule_model_preload(self, delay_ms: int = 800):
+        """延遲一段時間再預先載入模型（連續切換選項時只載入最後選擇的模型）"""
+        if not self.background_preload:
+            return
+        if self.preload_after_id is not None:
+            self.root.after_cancel(self.preload_after_id)
+        self.preload_after_id = self.root.after(delay_ms, self.preload_selected_model)
+    
+    def preload_selected_model(self):
+        """在常駐工作程序的背景執行緒載入目前選擇的模型，轉錄時直接使用或等待載入完成"""
+        self.preload_after_id = None
+        settings = self.collect_transcription_settings()
+        worker = self.get_transcription_worker()
+        
+        def run_preload():
             try:
-                with open(output_srt, 'w', encoding='utf-8') as f:
-                    f.write(srt_content)
-                self.log(f"✅ 檔案寫入成功: {output_srt}")
+                result = worker.preload(settings)
             except Exception as e:
-                self.log(f"❌ 檔案寫入失敗: {e}")
-                import traceback
-                self.log(f"🔍 詳細錯誤:\n{traceback.format_exc()}")
-                return False
-            
-            # 驗證檔案是否成功寫入
-            if os.path.exists(output_srt):
-                file_size = os.path.getsize(output_srt)
-                subtitle_count = srt_content.count('-->')
-                original_count = len(result.get("segments", []))
-                
-                self.log(f"✅ 優化的 SRT 檔案已生成: {output_srt}")
-                self.log(f"📊 檔案大小: {file_size} bytes")
-                self.log(f"📊 原始片段: {original_count}, 優化後: {subtitle_count}")
-                
-                if use_optimizer and original_count > 0:
-                    reduction_rate = (original_count - subtitle_count) / original_count * 100
-                    self.log(f"📊 優化率: {reduction_rate:.1f}% (移除了 {original_count - subtitle_count} 個低品質片段)")
-                
-                # 保存優化報告
-                if use_optimizer:
-                    try:
-                        quality_scores = []
-                        for segment in result.get("segments", []):
-                            if "avg_logprob" in segment:
-                                quality_scores.append(max(0, min(1, (segment["avg_logprob"] + 3) / 3)))
-                        
-                        optimizer.save_optimization_report(
-                            original_segments=original_count,
-                            final_segments=subtitle_count,
-                            quality_scores=quality_scores,
-                            output_path=output_srt
-                        )
-                    except Exception as e:
-                        self.log(f"⚠️ 保存優化報告失敗: {e}")
-                
-                if subtitle_count > 0:
-                    if use_optimizer:
-                        self.set_status("✅ 優化版 Python API 字幕生成完成！", "green")
-                    else:
-                        self.set_status("✅ Python API 字幕生成完成！", "green")
-                    return True
-                else:
-                    self.log("⚠️ 字幕檔案為空，可能需要調整參數")
-                    return False
-            else:
-                self.log("❌ 檔案寫入失敗")
-                return False
-            
-        except Exception as e:
-            import traceback
-            error_details = traceback.format_exc()
-            self.log(f"❌ 優化版 Python API 執行失敗: {e}")
-            self.log(f"� 詳細錯誤信息:\n{error_details}")
-            return False
-    
-    def generate_basic_srt(self, result):
-        """生成基本的 SRT 字幕（無優化器時使用）"""
-        srt_content = ""
-        segments = result.get("segments", [])
-        
-        for i, segment in enumerate(segments, 1):
-            start_time = segment["start"]
-            end_time = segment["end"]
-            text = segment["text"].strip()
-            
-            if not text:
-                continue
-            
-            # 格式化時間
-            start_str = self.seconds_to_srt_time(start_time)
-            end_str = self.seconds_to_srt_time(end_time)
-            
-            # 添加字幕片段
-            srt_content += f"{i}\n"
-            srt_content += f"{start_str} --> {end_str}\n"
-            srt_content += f"{text}\n\n"
+                self.log(f"⚠️ 無法預先載入模型: {e}")
+                return
+            if result.get("success") and (result.get("summary") or {}).get("started"):
+                self.log(f"📥 正在背景載入模型 {settings['model']}，轉錄時將直接使用")
         
-        return srt_content
+        threading.Thread(target=run_preload, daemon=True).start()
     
-    def seconds_to_srt_time(self, seconds):
-        """將秒數轉換為 SRT 時間格式"""
-        hours = int(seconds // 3600)
-        minutes = int((seconds % 3600) // 60)
-        secs = int(seconds % 60)
-        millisecs = int((seconds % 1) * 1000)
-        return f"{hours:02d}:{minutes:02d}:{secs:02d},{millisecs:03d}"
+    def cancel_transcription(self):
+        """停止進行中的轉錄：終止常駐工作程序（模型需要重新載入，因此之後立即在背景預先載入）"""
+        worker = self.transcription_worker
+        # 先設定旗標：轉錄執行緒收到取消結果時據此顯示狀態
+        self.transcription_cancelled = True
+        if worker is None or not worker.cancel():
+            self.transcription_cancelled = False
+            self.log("ℹ️ 目前沒有可停止的轉錄工作（燒錄和本程序內的備用轉錄無法中途停止）")
+            return
+        self.log("⏹ 已停止轉錄")
+        self.set_status("⏹ 已停止轉錄", "orange")
+        self.schedule_model_preload()
     
-    def run_basic_whisper_api(self, input_file: str, output_srt: str) -> bool:
-        """基本版本的 Whisper API（作為備用方案）"""
+    def on_worker_event(self, event):
+        """將工作程序的進度事件轉交給介面"""
+        if event["type"] == "log":
+            self.log(event["message"])
+        elif event["type"] == "status":
+            self.set_status(event["message"], event.get("color", "black"))
+        elif event["type"] == "segments":
+            self.on_partial_segments(event["segments"], event["progress"])
+    
+    def run_transcription(self, input_file: str, output_srt: str) -> bool:
+        """在常駐工作程序中轉錄，工作程序無法使用時改在本程序執行"""
+        self.partial_segments = []
+        self.transcription_cancelled = False
+        settings = self.collect_transcription_settings()
         try:
-            import warnings
-            warnings.filterwarnings("ignore", message=".*Failed to launch Triton kernels.*")
-            warnings.filterwarnings("ignore", message=".*falling back to a slower.*")
-            
-            import whisper
-            
-            self.log("🔄 使用基本版 Python API...")
-            
-            # 檢查輸入檔案是否存在
-            if not os.path.exists(input_file):
-                raise FileNotFoundError(f"輸入檔案不存在: {input_file}")
-                
-            # 檢查輸出目錄是否存在，如果不存在則創建
-            output_dir = os.path.dirname(output_srt)
-            if output_dir and not os.path.exists(output_dir):
-                try:
-                    os.makedirs(output_dir, exist_ok=True)
-                    self.log(f"🔧 創建輸出目錄: {output_dir}")
-                except Exception as e:
-                    self.log(f"❌ 創建輸出目錄失敗: {e}")
-                    return False
-            
-            # 決定使用的設備
-            device = "cpu"
-            if self.use_gpu.get():
-                try:
-                    import torch
-                    if torch.cuda.is_available():
-                        device = "cuda"
-                        self.log("🚀 基本API使用 GPU 加速")
-                    else:
-                        self.log("💻 GPU不可用，基本API使用 CPU")
-                except ImportError:
-                    self.log("💻 PyTorch未安裝，基本API使用 CPU")
-            else:
-                self.log("💻 基本API強制使用 CPU")
-            
-            # 載入模型
-            self.log(f"📥 正在載入模型: {self.whisper_model.get()} (設備: {device})")
-            with warnings.catch_warnings():
-                warnings.simplefilter("ignore")
-                try:
-                    model = whisper.load_model(self.whisper_model.get(), device=device)
-                    self.log(f"✅ 模型載入成功")
-                except Exception as e:
-                    self.log(f"❌ 模型載入失敗: {e}")
-                    return False
-            
-            # 基本轉錄選項
-            language = self.language.get()
-            options = {
-                "language": language if language != "auto" else None,
-                "task": "transcribe",
-                "no_speech_threshold": self.no_speech_threshold.get(),
-                "temperature": self.temperature.get(),
-                "condition_on_previous_text": False,
-            }
-            
-            if language == "auto":
-                self.log("🔍 基本API使用自動語言偵測...")
-            else:
-                self.log(f"🌍 基本API使用指定語言: {language}")
-            
-            # 執行轉錄
-            try:
-                self.log("🚀 開始轉錄...")
-                with warnings.catch_warnings():
-                    warnings.simplefilter("ignore")
-                    result = model.transcribe(input_file, **options)
-                self.log("✅ 轉錄完成")
-            except Exception as e:
-                self.log(f"❌ 轉錄失敗: {e}")
-                import traceback
-                self.log(f"🔍 詳細錯誤:\n{traceback.format_exc()}")
-                return False
-            
-            # 生成基本 SRT
-            try:
-                self.log("📝 生成 SRT 內容...")
-                srt_content = self.generate_srt_from_result(result)
-                self.log("✅ SRT 內容生成完成")
-            except Exception as e:
-                self.log(f"❌ SRT 生成失敗: {e}")
-                import traceback
-                self.log(f"🔍 詳細錯誤:\n{traceback.format_exc()}")
-                return False
-            
-            # 寫入檔案
-            try:
-                with open(output_srt, 'w', encoding='utf-8') as f:
-                    f.write(srt_content)
-                self.log(f"✅ 檔案寫入成功: {output_srt}")
-            except Exception as e:
-                self.log(f"❌ 檔案寫入失敗: {e}")
-                import traceback
-                self.log(f"🔍 詳細錯誤:\n{traceback.format_exc()}")
-                return False
-            
-            if os.path.exists(output_srt):
-                subtitle_count = srt_content.count('-->')
-                self.log(f"✅ 基本版 SRT 檔案已生成，字幕片段: {subtitle_count} 個")
-                return subtitle_count > 0
-            
-            return False
-            
+            worker = self.get_transcription_worker()
+            if not worker.is_alive():
+                self.set_status("正在啟動轉錄工作程序...", "blue")
+            result = worker.transcribe(input_file, output_srt, settings, on_event=self.on_worker_event)
         except Exception as e:
-            import traceback
-            error_details = traceback.format_exc()
-            self.log(f"❌ 基本版 API 也失敗: {e}")
-            self.log(f"🔍 詳細錯誤信息:\n{error_details}")
+            self.log(f"⚠️ 轉錄工作程序無法使用，改在本程序執行: {e}")
+            return self.create_transcription_pipeline().run(input_file, output_srt)
+        
+        if result.get("cancelled"):
             return False
+        if result.get("error"):
+            self.log(f"❌ 轉錄工作程序回報錯誤: {result['error']}")
+            if result.get("traceback"):
+                self.log(f"🔍 詳細錯誤:\n{result['traceback']}")
+        summary = result.get("summary") or {}
+        if summary:
+            self.log(f"📊 工作程序耗時 {result.get('elapsed', 0):.1f} 秒, "
+                     f"語言: {summary.get('language') or 'auto'}, 字幕片段: {summary.get('subtitle_count', 0)}")
+        return bool(result.get("success"))
     
-    def generate_srt_from_result(self, result) -> str:
-        """從 Whisper 結果生成 SRT 格式"""
-        srt_content = ""
-        filtered_segments = []
-        
-        # 過濾重複和無意義的內容
-        for segment in result["segments"]:
-            text = segment["text"].strip()
-            
-            # 跳過空白或太短的內容
-            if len(text) < 2:
-                continue
-            
-            # 過濾重複內容
-            if self.filter_repetitive.get():
-                # 檢查是否與前面的內容重複
-                is_repetitive = False
-                for prev_segment in filtered_segments[-3:]:  # 檢查最近3個片段
-                    if self.is_similar_text(text, prev_segment["text"]):
-                        is_repetitive = True
-                        break
-                
-                if is_repetitive:
-                    self.log(f"⚠️ 跳過重複內容: {text[:30]}...")
-                    continue
-            
-            # 使用增強版音樂內容過濾器
-            try:
-                from enhanced_music_filter import filter_music_content
-                should_keep, cleaned_text = filter_music_content(text)
-                
-                if not should_keep:
-                    continue
-                
-                # 使用清理後的文字
-                text = cleaned_text
-                
-            except ImportError:
-                # 如果增強版過濾器不可用，使用基本過濾
-                meaningless_patterns = [
-                    "作詞・作曲・編曲", "作詞", "作曲", "編曲",
-                    "初音ミク", "ボーカロイド", "VOCALOID",
-                    "♪", "♫", "♬", "♩"
-                ]
-                
-                is_meaningless = any(pattern in text for pattern in meaningless_patterns)
-                if is_meaningless and (len(text) < 50 or text.count("作詞") > 2):
-                    self.log(f"⚠️ 跳過無意義內容: {text[:30]}...")
-                    continue
-            
-            filtered_segments.append({
-                "start": segment["start"],
-                "end": segment["end"],
-                "text": text
-            })
-        
-        # 生成 SRT 內容
-        for i, segment in enumerate(filtered_segments, 1):
-            start_time = self.seconds_to_srt_time(segment["start"])
-            end_time = self.seconds_to_srt_time(segment["end"])
-            text = segment["text"]
-            
-            srt_content += f"{i}\n"
-            srt_content += f"{start_time} --> {end_time}\n"
-            srt_content += f"{text}\n\n"
-        
-        self.log(f"📊 原始片段: {len(result['segments'])}, 過濾後: {len(filtered_segments)}")
-        return srt_content
+    def run_whisper_python_api(self, input_file: str, output_srt: str) -> bool:
+        """使用 Python API 直接調用 Whisper（優化版本）"""
+        return self.create_transcription_pipeline().run_optimized(input_file, output_srt)
     
-    def is_similar_text(self, text1: str, text2: str, threshold: float = 0.8) -> bool:
-        """檢查兩個文字是否相似"""
-        # 簡單的相似度檢查
-        if text1 == text2:
-            return True
-        
-        # 檢查包含關係
-        if len(text1) > 10 and len(text2) > 10:
-            if text1 in text2 or text2 in text1:
-                return True
-        
-        # 檢查字符重疊度
-        set1 = set(text1.lower())
-        set2 = set(text2.lower())
-        if len(set1) > 0 and len(set2) > 0:
-            overlap = len(set1.intersection(set2))
-            similarity = overlap / max(len(set1), len(set2))
-            return similarity > threshold
-        
-        return False
+    def run_basic_whisper_api(self, input_file: str, output_srt: str) -> bool:
+        """基本版本的 Whisper API（作為備用方案）"""
+        return self.create_transcription_pipeline().run_basic(input_file, output_srt)
+    
+    def on_partial_segments(self, segments, progress: float):
+        """串流輸出的片段回呼：保存部分結果並更新狀態"""
+        self.partial_segments.extend(segments)
+        for segment in segments:
+            self.log(f"   [{self.seconds_to_srt_time(segment['start'])}] {segment['text'].strip()}")
+        self.set_status(f"正在串流轉錄... {progress * 100:.0f}% "
+                        f"(已輸出 {len(self.partial_segments)} 句)", "blue")
     
     def seconds_to_srt_time(self, seconds: float) -> str:
         """將秒數轉換為 SRT 時間格式"""
@@ -2308,6 +1822,8 @@ class WhisperSubtitleGUI:
 • 自動選擇品質最佳的結果
 • 提高準確度但增加處理時間
 • 適合重要內容的精確轉錄
+• 策略 whole: 每個溫度都重新轉錄整個檔案
+• 策略 window: 只重試品質不足的 30 秒時間窗（較快）
 
 📊 品質等級設定：
 • auto: 根據模型自動選擇
@@ -2352,6 +1868,8 @@ class WhisperSubtitleGUI:
     def on_closing(self):
         """關閉程式時的處理"""
         self.save_config()
+        if self.transcription_worker is not None:
+            self.transcription_worker.stop()
         self.root.destroy()
 
 if __name__ == "__main__":
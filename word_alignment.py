@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+延遲字詞時間戳
+轉錄時不計算字詞時間戳，後處理真正需要字詞時間的片段（合併短片段）才做交叉注意力對齊，
+其餘片段省下的對齊時間以實測的每片段成本估算
+"""
+
+import time
+import warnings
+from typing import Dict, List, Any, Optional, Callable
+
+# 對齊時在片段前後多取的音訊（秒），避免切掉第一個和最後一個字
+ALIGN_PADDING_SECONDS = 0.5
+
+
+class LazyWordAligner:
+    """
+    只為指定片段補上字詞時間戳
+
+    以 post_process_segments 的 word_aligner 參數傳入，後處理決定要合併的片段後
+    才呼叫，已經有 words 的片段不會重複對齊。
+    """
+
+    def __init__(self,
+                 model_loader: Callable[[], Any],
+                 audio,
+                 language: Optional[str] = None,
+                 prepend_punctuations: str = "\"'“¿([{-",
+                 append_punctuations: str = "\"'.。,，!！?？:：”)]}、",
+                 log: Optional[Callable[[str], None]] = None):
+        """
+        Args:
+            model_loader: 取得 Whisper 模型的函數（只在第一次對齊時呼叫，結果快取命中時不需要載入模型）
+            audio: 16kHz 單聲道 PCM
+            language: 語言代碼（None 表示使用多語言分詞器的預設值）
+            prepend_punctuations: 併入下一個字的標點
+            append_punctuations: 併入上一個字的標點
+            log: 日誌函數
+        """
+        self.model_loader = model_loader
+        self.audio = audio
+        self.language = language
+        self.prepend_punctuations = prepend_punctuations
+        self.append_punctuations = append_punctuations
+        self.log = log or print
+        self._model = None
+        self._tokenizer = None
+        self.aligned_segments = 0
+        self.align_seconds = 0.0
+
+    def _prepare(self):
+        """載入模型和分詞器"""
+        if self._model is not None:
+            return
+        from whisper.tokenizer import get_tokenizer
+
+        self._model = self.model_loader()
+        try:
+            self._tokenizer = get_tokenizer(self._model.is_multilingual,
+                                            num_languages=self._model.num_languages,
+                                            language=self.language, task="transcribe")
+        except (TypeError, AttributeError):
+            # 舊版 Whisper 的分詞器沒有 num_languages 參數
+            self._tokenizer = get_tokenizer(self._model.is_multilingual,
+                                            language=self.language, task="transcribe")
+
+    def align_segment(self, segment: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """對齊單一片段，返回字詞列表（時間為整段音訊的絕對時間）"""
+        from whisper.audio import HOP_LENGTH, N_FRAMES, N_SAMPLES, SAMPLE_RATE, log_mel_spectrogram, pad_or_trim
+        from whisper.timing import add_word_timestamps
+        import numpy as np
+
+        model = self._model
+        frames_per_second = SAMPLE_RATE // HOP_LENGTH
+        start = max(0.0, segment["start"] - ALIGN_PADDING_SECONDS)
+        seek = int(start * frames_per_second)
+        clip = np.asarray(self.audio[seek * HOP_LENGTH:seek * HOP_LENGTH + N_SAMPLES], dtype=np.float32)
+        if len(clip) == 0:
+            return []
+
+        mel = log_mel_spectrogram(clip, model.dims.n_mels)
+        num_frames = min(mel.shape[-1], N_FRAMES)
+        mel = pad_or_trim(mel, N_FRAMES).to(model.device)
+
+        # add_word_timestamps 以 seek 換算片段的時間偏移，並會修改傳入片段的起訖時間，因此使用副本
+        aligned = {
+            "seek": seek,
+            "start": segment["start"],
+            "end": segment["end"],
+            "text": segment.get("text", ""),
+            "tokens": segment["tokens"],
+        }
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            add_word_timestamps(
+                segments=[aligned],
+                model=model,
+                tokenizer=self._tokenizer,
+                mel=mel,
+                num_frames=num_frames,
+                prepend_punctuations=self.prepend_punctuations,
+                append_punctuations=self.append_punctuations,
+                last_speech_timestamp=start,
+            )
+        return aligned.get("words", [])
+
+    def __call__(self, segments: List[Dict[str, Any]]):
+        """為沒有字詞時間戳的片段補上 words（原地修改）"""
+        pending = [segment for segment in segments if not segment.get("words") and segment.get("tokens")]
+        if not pending or isinstance(self.audio, str):
+            return
+
+        start_time = time.time()
+        try:
+            self._prepare()
+            for segment in pending:
+                segment["words"] = self.align_segment(segment)
+                self.aligned_segments += 1
+        except Exception as e:
+            # 沒有字詞時間時合併仍可進行，只是沿用片段層級的時間
+            self.log(f"⚠️ 字詞時間戳對齊失敗，使用片段時間: {e}")
+        finally:
+            self.align_seconds += time.time() - start_time
+
+    def get_stats(self, total_segments: int) -> Dict[str, Any]:
+        """
+        對齊統計
+
+        Args:
+            total_segments: 轉錄結果的片段總數（全部計算字詞時間戳時需要對齊的數量）
+
+        Returns:
+            對齊的片段數、耗時和估算省下的時間（以實測的每片段對齊成本乘上跳過的片段數）
+        """
+        per_segment = self.align_seconds / self.aligned_segments if self.aligned_segments else 0.0
+        skipped = max(0, total_segments - self.aligned_segments)
+        return {
+            "mode": "lazy",
+            "total_segments": total_segments,
+            "aligned_segments": self.aligned_segments,
+            "align_seconds": round(self.align_seconds, 3),
+            "estimated_saved_seconds": round(per_segment * skipped, 3),
+        }